@@ -8,6 +8,7 @@ from aiohttp.web import AppRunner, TCPSite
 from loguru import logger
 from sentry_sdk.integrations.loguru import LoggingLevels, LoguruIntegration
 
+from bot.cache.local import cache_invalidator
 from bot.core.config import settings
 from bot.core.loader import app, bot, dp
 from bot.handlers import get_handlers_router
@@ -16,6 +17,12 @@ from bot.keyboards.default_commands import remove_default_commands, set_default_
 from bot.middlewares import register_middlewares
 from bot.middlewares.prometheus import prometheus_middleware_factory
 from bot.services.admins import send_to_admins
+from bot.services.analytics import analytics_queue
+from bot.services.digest import digest_scheduler
+from bot.services.http_client import close_http_session, setup_http_session
+from bot.services.notifications import notification_dispatcher
+from bot.services.scheduler import sync_scheduler
+from bot.services.watch import watch_scheduler
 
 # from aiogram.utils.i18n import gettext as _
 
@@ -23,6 +30,11 @@ from bot.services.admins import send_to_admins
 async def on_startup() -> None:
     logger.info("bot starting...")
 
+    await setup_http_session()
+    cache_invalidator.start()
+    if analytics_queue is not None:
+        analytics_queue.start()
+
     register_middlewares(dp)
 
     dp.include_router(get_handlers_router())
@@ -49,6 +61,14 @@ async def on_startup() -> None:
     logger.info(f"Privacy Mode - {states[not bot_info.can_read_all_group_messages]}")
     logger.info(f"Inline Mode  - {states[bot_info.supports_inline_queries]}")
 
+    if settings.SYNC_ENABLED:
+        sync_scheduler.start()
+        watch_scheduler.start()
+    if settings.NOTIFY_ENABLED:
+        notification_dispatcher.start(bot)
+    if settings.DIGEST_ENABLED:
+        digest_scheduler.start()
+
     logger.info("bot started")
 
     await send_to_admins(bot, "bot started")
@@ -57,6 +77,11 @@ async def on_startup() -> None:
 async def on_shutdown() -> None:
     logger.info("bot stopping...")
 
+    await sync_scheduler.stop()
+    await watch_scheduler.stop()
+    await digest_scheduler.stop()
+    await notification_dispatcher.stop()
+
     await remove_default_commands(bot)
 
     await dp.storage.close()
@@ -65,6 +90,12 @@ async def on_shutdown() -> None:
     await bot.delete_webhook()
     await bot.session.close()
 
+    if analytics_queue is not None:
+        await analytics_queue.stop()
+
+    await close_http_session()
+    await cache_invalidator.stop()
+
     logger.info("bot stopped")
 
 
@@ -1,12 +1,18 @@
 from __future__ import annotations
+from typing import TYPE_CHECKING
 
 import orjson
 from aiohttp import ClientSession, ClientTimeout
 from loguru import logger
 
-from bot.analytics.types import AbstractAnalyticsLogger, BaseEvent
+from bot.analytics.types import AbstractAnalyticsLogger, AnalyticsPartialError, AnalyticsRejectedError, BaseEvent
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
 
 AMPLITUDE_ENDPOINT = "https://api2.amplitude.com/2/httpapi"
+# HTTP V2 API limit of events per request
+AMPLITUDE_MAX_BATCH = 2000
 
 
 class AmplitudeTelegramLogger(AbstractAnalyticsLogger):
@@ -15,24 +21,24 @@ class AmplitudeTelegramLogger(AbstractAnalyticsLogger):
         self._base_url: str = base_url
         self._headers = {"Content-Type": "application/json", "Accept": "*/*"}
         self._timeout = ClientTimeout(total=15)
+        self._session: ClientSession | None = None
         self.SUCCESS_STATUS_CODE = 200
 
     async def _send_request(
         self,
-        event: BaseEvent,
+        events: Sequence[BaseEvent],
     ) -> None:
         """Implementation of interaction with Amplitude API."""
-        data = {"api_key": self._api_token, "events": [event.to_dict()]}
-
-        async with (
-            ClientSession() as session,
-            session.post(
-                self._base_url,
-                headers=self._headers,
-                data=orjson.dumps(data),
-                timeout=self._timeout,
-            ) as response,
-        ):
+        data = {"api_key": self._api_token, "events": [event.to_dict() for event in events]}
+
+        if self._session is None or self._session.closed:
+            self._session = ClientSession()
+        async with self._session.post(
+            self._base_url,
+            headers=self._headers,
+            data=orjson.dumps(data),
+            timeout=self._timeout,
+        ) as response:
             json_response = await response.json(content_type="application/json")
 
         self._validate_response(json_response)
@@ -45,7 +51,8 @@ class AmplitudeTelegramLogger(AbstractAnalyticsLogger):
 
             logger.error(f"get error from amplitude api | error: {error} | code: {code}")
             msg = f"Error in amplitude api call | error: {error} | code: {code}"
-            raise ValueError(msg)
+            status = int(code) if isinstance(code, (int, str)) and str(code).isdigit() else None
+            raise AnalyticsRejectedError(msg, status=status)
 
         logger.info(f"successfully send to Amplitude | server_upload_time: {response['server_upload_time']}")
 
@@ -54,4 +61,25 @@ class AmplitudeTelegramLogger(AbstractAnalyticsLogger):
         event: BaseEvent,
     ) -> None:
         """Use this method to sends event to Amplitude."""
-        await self._send_request(event)
+        await self._send_request([event])
+
+    async def log_events(
+        self,
+        events: Sequence[BaseEvent],
+    ) -> None:
+        """Send events to Amplitude in as few requests as the API allows (see `AbstractAnalyticsLogger.log_events`)."""
+        delivered = 0
+        try:
+            for start in range(0, len(events), AMPLITUDE_MAX_BATCH):
+                chunk = events[start : start + AMPLITUDE_MAX_BATCH]
+                await self._send_request(chunk)
+                delivered += len(chunk)
+        except Exception as e:
+            if not delivered:
+                raise
+            raise AnalyticsPartialError(events[delivered:], delivered=delivered) from e
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
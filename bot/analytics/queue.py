@@ -0,0 +1,217 @@
+from __future__ import annotations
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import suppress
+from typing import TYPE_CHECKING, Literal
+
+import aiohttp
+import prometheus_client
+from loguru import logger
+
+from bot.analytics.types import AbstractAnalyticsLogger, AnalyticsPartialError, AnalyticsRejectedError, BaseEvent
+from bot.core.config import METRICS_PREFIX
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from bot.analytics.spill import SegmentSpill
+
+OverflowPolicy = Literal["drop_oldest", "drop_newest", "spill"]
+
+HTTP_TOO_MANY_REQUESTS = 429
+HTTP_SERVER_ERROR = 500
+
+ANALYTICS_EVENTS = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_analytics_events",
+    documentation="Total analytics events by outcome (queued, sent, dropped, failed, rejected, spilled, replayed).",
+    labelnames=["result"],
+)
+ANALYTICS_QUEUE_SIZE = prometheus_client.Gauge(
+    name=f"{METRICS_PREFIX}_analytics_queue_size",
+    documentation="Analytics events waiting in memory to be sent.",
+)
+ANALYTICS_BATCH_SIZE = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_analytics_batch_size",
+    documentation="Histogram of events per analytics batch request.",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed batch may succeed later: network errors, timeouts, 429 and 5xx. Anything else is final."""
+    if isinstance(error, (AnalyticsRejectedError, aiohttp.ClientResponseError)):
+        status = error.status
+        return status is not None and (status == HTTP_TOO_MANY_REQUESTS or status >= HTTP_SERVER_ERROR)
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, OSError))
+
+
+class AnalyticsQueue(AbstractAnalyticsLogger):
+    """In-process buffer in front of an analytics logger.
+
+    `log_event` only enqueues, so handlers never wait for the analytics backend. A background task
+    sends the events with `log_events` once `batch_size` of them are queued or every `flush_interval`
+    seconds. At most `max_size` events are kept; `overflow` decides which ones are dropped (or spilled)
+    beyond that.
+
+    With a `spill`, batches that fail with a temporary error (see `is_retryable`) are written to disk
+    instead of being lost. Sending then pauses with exponential backoff (`retry_base` doubling up to
+    `retry_max` seconds, with jitter): meanwhile new batches go straight to the spill, and once the
+    backend answers again the spilled batches are replayed oldest first. Batches the backend rejects
+    for good (a 4xx other than 429, a malformed response) are dropped and counted as rejected, so they
+    never block the replay of later ones. A batch delivered only in part (`AnalyticsPartialError`) is
+    retried or dropped from where it stopped.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        backend: AbstractAnalyticsLogger,
+        max_size: int = 10_000,
+        batch_size: int = 100,
+        flush_interval: float = 5.0,
+        overflow: OverflowPolicy = "drop_oldest",
+        spill: SegmentSpill | None = None,
+        retry_base: float = 1.0,
+        retry_max: float = 300.0,
+    ) -> None:
+        self.backend = backend
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow if overflow != "spill" or spill is not None else "drop_oldest"
+        self.spill = spill
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+        self._retry_delay = 0.0
+        self._retry_at = 0.0
+
+        self._events: deque[BaseEvent] = deque()
+        self._wakeup = asyncio.Event()
+        self._flusher: asyncio.Task[None] | None = None
+        self._results = {
+            result: ANALYTICS_EVENTS.labels(result=result)
+            for result in ("queued", "sent", "dropped", "failed", "rejected", "spilled", "replayed")
+        }
+        ANALYTICS_QUEUE_SIZE.set_function(lambda: len(self._events))
+
+    async def log_event(self, event: BaseEvent) -> None:
+        self.put(event)
+
+    async def log_events(self, events: Sequence[BaseEvent]) -> None:
+        for event in events:
+            self.put(event)
+
+    def put(self, event: BaseEvent) -> None:
+        if len(self._events) >= self.max_size:
+            if self.overflow == "spill":
+                self._to_spill([self._events.popleft() for _ in range(min(self.batch_size, len(self._events)))])
+            elif self.overflow == "drop_newest":
+                self._results["dropped"].inc()
+                return
+            else:
+                self._results["dropped"].inc()
+                self._events.popleft()
+
+        self._events.append(event)
+        self._results["queued"].inc()
+        if len(self._events) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Stop the background flusher and send what is still queued (for at most `timeout` seconds)."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._flusher
+            self._flusher = None
+
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"analytics queue not drained on shutdown | lost: {len(self._events)}")
+        await self.backend.close()
+
+    @property
+    def backing_off(self) -> bool:
+        return time.monotonic() < self._retry_at
+
+    async def flush(self) -> None:
+        """Send every queued event in batches of `batch_size` (to the spill while backing off)."""
+        while self._events:
+            batch = [self._events.popleft() for _ in range(min(self.batch_size, len(self._events)))]
+            # While backing off the backend is not tried at all, the batch goes to disk right away
+            failed = batch if self.spill is not None and self.backing_off else await self._send(batch)
+            if failed:
+                self._to_spill(failed)
+
+    async def replay(self) -> None:
+        """Deliver spilled batches, oldest first, until the spill is empty or the backend fails again."""
+        while self.spill and not self.backing_off:
+            taken = self.spill.take_oldest()
+            if taken is None:
+                return
+            path, batches = taken
+            for index, batch in enumerate(batches):
+                failed = await self._send(batch)
+                self._results["replayed"].inc(len(batch) - len(failed))
+                if failed:
+                    self.spill.give_back(path, [failed, *batches[index + 1 :]])
+                    return
+            self.spill.done(path)
+
+    async def _send(self, batch: list[BaseEvent]) -> list[BaseEvent]:
+        """Deliver a batch; returns the events that failed temporarily and should be retried later."""
+        ANALYTICS_BATCH_SIZE.observe(len(batch))
+        try:
+            await self.backend.log_events(batch)
+        except Exception as e:  # noqa: BLE001
+            failed: list[BaseEvent] = batch
+            error: BaseException = e
+            if isinstance(e, AnalyticsPartialError):
+                # The delivered head must not be sent again: only the tail is retried or dropped
+                self._results["sent"].inc(e.delivered)
+                failed, error = e.undelivered, e.__cause__ or e
+            if not is_retryable(error):
+                self._results["rejected"].inc(len(failed))
+                logger.warning(f"analytics batch rejected, dropped | events: {len(failed)} | error: {error!r}")
+                return []
+            self._results["failed"].inc(len(failed))
+            self._back_off()
+            logger.warning(
+                f"analytics batch failed | events: {len(failed)} | retry in: {self._retry_delay:.0f}s"
+                f" | error: {error!r}"
+            )
+            return failed
+        self._results["sent"].inc(len(batch))
+        self._retry_delay = 0.0
+        return []
+
+    def _back_off(self) -> None:
+        self._retry_delay = min(self.retry_max, self._retry_delay * 2 or self.retry_base)
+        self._retry_at = time.monotonic() + self._retry_delay * random.uniform(0.5, 1)  # noqa: S311
+
+    def _to_spill(self, batch: list[BaseEvent]) -> None:
+        try:
+            spilled = self.spill is not None and self.spill.append(batch)
+        except OSError as e:
+            logger.warning(f"analytics spill write failed | events: {len(batch)} | error: {e!r}")
+            spilled = False
+        self._results["spilled" if spilled else "dropped"].inc(len(batch))
+
+    async def _run(self) -> None:
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            self._wakeup.clear()
+            # A broken spill directory must not kill the flusher: events keep going to the backend
+            try:
+                await self.flush()
+                await self.replay()
+            except Exception:  # noqa: BLE001
+                logger.exception("analytics flush failed")
@@ -0,0 +1,118 @@
+from __future__ import annotations
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import orjson
+import prometheus_client
+from loguru import logger
+
+from bot.analytics.types import BaseEvent
+from bot.core.config import METRICS_PREFIX
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+SEGMENT_SUFFIX = ".jsonl"
+REPLAY_SUFFIX = ".replay"
+SEGMENT_MAX_BYTES = 1024 * 1024
+
+ANALYTICS_SPILL_BYTES = prometheus_client.Gauge(
+    name=f"{METRICS_PREFIX}_analytics_spill_bytes",
+    documentation="Bytes of undelivered analytics events waiting on disk.",
+)
+ANALYTICS_SPILL_SEGMENTS = prometheus_client.Gauge(
+    name=f"{METRICS_PREFIX}_analytics_spill_segments",
+    documentation="Segment files of undelivered analytics events waiting on disk.",
+)
+
+
+def _encode(events: Sequence[BaseEvent]) -> bytes:
+    return orjson.dumps([event.model_dump(mode="json", exclude_none=True) for event in events]) + b"\n"
+
+
+def _decode(line: bytes, segment: str) -> list[BaseEvent] | None:
+    try:
+        return [BaseEvent.model_validate(event) for event in orjson.loads(line)]
+    except ValueError as e:
+        logger.warning(f"skip corrupted analytics spill line | segment: {segment} | error: {e!r}")
+        return None
+
+
+class SegmentSpill:
+    """Append-only segment files for analytics batches that could not be delivered.
+
+    Every line is one batch (a JSON array of events). New batches are appended to the newest
+    segment until it reaches `segment_bytes`; replay takes the oldest segment out of the write
+    path by renaming it, and either deletes it once delivered or puts the undelivered rest back.
+    Nothing is written beyond `max_bytes`, so an outage cannot fill the disk.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        max_bytes: int = 100 * 1024 * 1024,
+        segment_bytes: int = SEGMENT_MAX_BYTES,
+    ) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # A replay interrupted by a restart: deliver that segment again (at least once)
+        for path in self.directory.glob(f"*{REPLAY_SUFFIX}"):
+            path.rename(path.with_suffix(SEGMENT_SUFFIX))
+
+        self._bytes = sum(path.stat().st_size for path in self._segments())
+        ANALYTICS_SPILL_BYTES.set_function(lambda: self._bytes)
+        ANALYTICS_SPILL_SEGMENTS.set_function(lambda: len(self._segments()))
+
+    def _segments(self) -> list[Path]:
+        # Names are creation timestamps, so the lexical order is the write order
+        return sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}"))
+
+    def __bool__(self) -> bool:
+        return self._bytes > 0
+
+    def append(self, events: Sequence[BaseEvent]) -> bool:
+        """Persist a batch; False when the spill is full and the batch was not written."""
+        line = _encode(events)
+        if self._bytes + len(line) > self.max_bytes:
+            return False
+
+        segments = self._segments()
+        if segments and segments[-1].stat().st_size + len(line) <= self.segment_bytes:
+            path = segments[-1]
+        else:
+            path = self.directory / f"{time.time_ns():020d}{SEGMENT_SUFFIX}"
+        with path.open("ab") as segment:
+            segment.write(line)
+        self._bytes += len(line)
+        return True
+
+    def take_oldest(self) -> tuple[Path, list[list[BaseEvent]]] | None:
+        """Detach the oldest segment for replay and return its batches."""
+        segments = self._segments()
+        if not segments:
+            return None
+
+        path = segments[0].rename(segments[0].with_suffix(REPLAY_SUFFIX))
+        decoded = (_decode(line, path.name) for line in path.read_bytes().splitlines())
+        return path, [batch for batch in decoded if batch]
+
+    def done(self, path: Path) -> None:
+        """The replayed segment was delivered completely."""
+        self._bytes -= path.stat().st_size
+        path.unlink()
+
+    def give_back(self, path: Path, batches: Sequence[Sequence[BaseEvent]]) -> None:
+        """Return the undelivered batches of a replayed segment; it keeps its place in the order."""
+        if not batches:
+            self.done(path)
+            return
+        size = path.stat().st_size
+        lines = b"".join(_encode(batch) for batch in batches)
+        segment = path.with_suffix(SEGMENT_SUFFIX)
+        segment.write_bytes(lines)
+        path.unlink()
+        self._bytes += len(lines) - size
@@ -1,6 +1,7 @@
 # ruff: noqa: N815, TC003
 from __future__ import annotations
 from abc import ABC, abstractmethod
+from collections.abc import Sequence
 from decimal import Decimal
 from typing import Any, Literal
 
@@ -71,7 +72,46 @@ class BaseEvent(BaseModel):
         return {key: value for key, value in self.model_dump(exclude_none=True).items() if value}
 
 
+class AnalyticsRejectedError(ValueError):
+    """The analytics API answered with an error; `status` is the HTTP code it reported, if any."""
+
+    def __init__(self, message: str, status: int | None = None) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class AnalyticsPartialError(Exception):
+    """Only the first `delivered` events of a batch were sent; `undelivered` is the tail to retry.
+
+    The error that stopped the delivery is chained as `__cause__`.
+    """
+
+    def __init__(self, undelivered: Sequence[BaseEvent], delivered: int) -> None:
+        super().__init__(f"{delivered} events delivered, {len(undelivered)} not")
+        self.undelivered = list(undelivered)
+        self.delivered = delivered
+
+
 class AbstractAnalyticsLogger(ABC):
     @abstractmethod
     async def log_event(self, event: BaseEvent) -> None:
         pass
+
+    async def log_events(self, events: Sequence[BaseEvent]) -> None:
+        """Send several events; loggers whose API accepts batches override this with a single request.
+
+        If sending stops after some events were delivered, AnalyticsPartialError carries the rest,
+        so a retry does not send the delivered ones again.
+        """
+        delivered = 0
+        try:
+            for event in events:
+                await self.log_event(event)
+                delivered += 1
+        except Exception as e:
+            if not delivered:
+                raise
+            raise AnalyticsPartialError(events[delivered:], delivered=delivered) from e
+
+    async def close(self) -> None:  # noqa: B027
+        """Release network resources held by the logger."""
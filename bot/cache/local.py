@@ -0,0 +1,100 @@
+from __future__ import annotations
+import asyncio
+from contextlib import suppress
+from typing import TYPE_CHECKING, Any, Protocol
+
+from cachetools import TTLCache
+from loguru import logger
+from redis.exceptions import RedisError
+
+from bot.core.config import settings
+from bot.core.loader import redis_client
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    from redis.asyncio import Redis
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+RECONNECT_DELAY = 1
+
+# Every in-process (L1) cache created by @cached(local=True), by function cache prefix
+_local_caches: dict[str, TTLCache[str, Any]] = {}
+
+
+def get_local_cache(prefix: str, ttl: float, maxsize: int = settings.CACHE_L1_MAXSIZE) -> TTLCache[str, Any]:
+    """Return the L1 cache of a cached function, creating it on first use.
+
+    TTLCache evicts expired entries first and then the least recently used ones once `maxsize` is reached.
+    """
+    cache = _local_caches.get(prefix)
+    if cache is None:
+        cache = _local_caches[prefix] = TTLCache(maxsize=maxsize, ttl=ttl)
+    return cache
+
+
+def evict_local(key: str) -> None:
+    """Drop a key from every L1 cache of this process."""
+    for cache in _local_caches.values():
+        cache.pop(key, None)
+
+
+def clear_local() -> None:
+    """Drop all L1 entries of this process."""
+    for cache in _local_caches.values():
+        cache.clear()
+
+
+class _PubSub(Protocol):
+    """The part of redis' PubSub the listener uses; redis leaves `aclose` unannotated."""
+
+    async def subscribe(self, *channels: str) -> Any: ...
+
+    def listen(self) -> AsyncIterator[dict[str, Any]]: ...
+
+    async def aclose(self) -> None: ...
+
+
+class CacheInvalidator:
+    """Propagates cache invalidations to the L1 caches of every bot replica over Redis pub/sub."""
+
+    def __init__(self, redis: Redis = redis_client, channel: str = INVALIDATION_CHANNEL) -> None:
+        self.redis = redis
+        self.channel = channel
+        self._listener: asyncio.Task[None] | None = None
+
+    async def publish(self, key: str) -> None:
+        """Evict the key locally and ask the other replicas to do the same."""
+        evict_local(key)
+        await self.redis.publish(self.channel, key)
+
+    def start(self) -> None:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._listener
+            self._listener = None
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub: _PubSub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                # Invalidations published while we were not subscribed are lost
+                clear_local()
+                async for message in pubsub.listen():
+                    data = message["data"]
+                    evict_local(data.decode() if isinstance(data, bytes) else str(data))
+            except (RedisError, OSError) as e:
+                logger.warning(f"cache invalidation listener disconnected | error: {e!r}")
+                clear_local()
+                await asyncio.sleep(RECONNECT_DELAY)
+            finally:
+                await pubsub.aclose()
+
+
+cache_invalidator = CacheInvalidator()
@@ -1,22 +1,46 @@
 from __future__ import annotations
+import asyncio
+import math
+import time
+from contextlib import suppress
+from datetime import timedelta
 from functools import wraps
-from typing import TYPE_CHECKING, Any, TypeVar
+from typing import TYPE_CHECKING, Any, TypeVar, cast
 
-from bot.cache.serialization import AbstractSerializer, PickleSerializer
+import prometheus_client
+from loguru import logger
+from redis.exceptions import LockError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.cache.local import cache_invalidator, get_local_cache
+from bot.cache.serialization import AbstractSerializer, PickleSerializer, SerializationMismatchError
+from bot.core.config import METRICS_PREFIX, settings
 from bot.core.loader import redis_client
+from bot.database.database import sessionmaker
 
 if TYPE_CHECKING:
-    from collections.abc import Awaitable, Callable
-    from datetime import timedelta
+    from collections.abc import Awaitable, Callable, Mapping, Sequence
+    from contextlib import AbstractAsyncContextManager
 
     from redis.asyncio import Redis
 
 
 DEFAULT_TTL = 10
+DEFAULT_LOCK_TIMEOUT = 5
+LOCK_POLL_INTERVAL = 0.05
+
+_MISSING = object()
+
+CACHE_REQUESTS = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_cache_requests",
+    documentation="Total @cached calls by function and result (local_hit, hit, stale, coalesced, miss).",
+    labelnames=["function", "result"],
+)
 
 _Func = TypeVar("_Func")
 Args = str | int  # basically only user_id is used as identifier
 Kwargs = Any
+_Item = TypeVar("_Item", bound=Args)
 
 
 def build_key(*args: Args, **kwargs: Kwargs) -> str:
@@ -30,23 +54,268 @@ async def set_redis_value(
     key: bytes | str,
     value: bytes | str,
     ttl: int | timedelta | None = DEFAULT_TTL,
-    is_transaction: bool = False,
+    cache: Redis = redis_client,
 ) -> None:
-    """Set a value in Redis with an optional time-to-live (TTL)."""
-    async with redis_client.pipeline(transaction=is_transaction) as pipeline:
-        await pipeline.set(key, value)
-        if ttl:
-            await pipeline.expire(key, ttl)
+    """Set a value in Redis with an optional time-to-live (TTL) in a single SET ... EX command."""
+    await cache.set(key, value, ex=ttl or None)
+
+
+async def get_redis_value(key: str, cache: Redis = redis_client) -> bytes | None:
+    """Get a value from Redis; the client does not decode responses, so it is bytes or None."""
+    return cast("bytes | None", await cache.get(key))
+
 
+async def get_many(keys: Sequence[str], cache: Redis = redis_client) -> list[bytes | None]:
+    """Get several values with one MGET. Missing keys are returned as None."""
+    if not keys:
+        return []
+    return cast("list[bytes | None]", await cache.mget(keys))
+
+
+async def set_many(
+    items: Mapping[str, bytes | str],
+    ttl: int | timedelta | None = DEFAULT_TTL,
+    cache: Redis = redis_client,
+) -> None:
+    """Set several values with their TTL in one pipelined round trip."""
+    if not items:
+        return
+    async with cache.pipeline(transaction=False) as pipeline:
+        for key, value in items.items():
+            pipeline.set(key, value, ex=ttl or None)
         await pipeline.execute()
 
 
-def cached(
+def _seconds(ttl: float | timedelta) -> float:
+    return ttl.total_seconds() if isinstance(ttl, timedelta) else float(ttl)
+
+
+def _with_session(
+    args: tuple[Any, ...], kwargs: dict[str, Any], session: Any
+) -> tuple[tuple[Any, ...], dict[str, Any]]:
+    """Replace the session argument (keyword `session` or the first positional one) of a cached call."""
+    if "session" in kwargs:
+        return args, {**kwargs, "session": session}
+    return (session, *args[1:]), kwargs
+
+
+def _takes_session(args: tuple[Any, ...], kwargs: dict[str, Any]) -> bool:
+    return isinstance(kwargs.get("session", args[0] if args else None), AsyncSession)
+
+
+class CachedFunction:
+    """Cache logic of one @cached function: L1, Redis, single-flight, Redis lock and stale-while-revalidate."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        func: Callable[..., Awaitable[Any]],
+        *,
+        ttl: int | timedelta,
+        namespace: str,
+        cache: Redis,
+        key_builder: Callable[..., str],
+        serializer: AbstractSerializer,
+        local: bool,
+        local_ttl: int | timedelta | None,
+        single_flight: bool,
+        lock: bool,
+        lock_timeout: float,
+        stale_ttl: int | timedelta | None,
+        session_factory: Callable[[], AbstractAsyncContextManager[Any]],
+    ) -> None:
+        self.func = func
+        self.ttl = ttl
+        self.cache = cache
+        self.key_builder = key_builder
+        self.serializer = serializer
+        self.single_flight = single_flight
+        self.lock = lock
+        self.lock_timeout = lock_timeout
+        self.stale_ttl = stale_ttl
+        self.session_factory = session_factory
+
+        self.prefix = f"{namespace}:{func.__module__}:{func.__name__}"
+        self.l1 = None
+        if local and settings.CACHE_L1_ENABLED:
+            self.l1 = get_local_cache(self.prefix, _seconds(local_ttl if local_ttl is not None else ttl))
+
+        self.requests = {
+            result: CACHE_REQUESTS.labels(function=f"{func.__module__}.{func.__name__}", result=result)
+            for result in ("local_hit", "hit", "stale", "coalesced", "miss")
+        }
+        self._inflight: dict[str, asyncio.Task[Any]] = {}
+
+    async def __call__(self, *args: Args, **kwargs: Kwargs) -> Any:
+        key = self.key(*args, **kwargs)
+
+        if self.l1 is not None:
+            value = self.l1.get(key, _MISSING)
+            if value is not _MISSING:
+                self.requests["local_hit"].inc()
+                return value
+
+        # Check if the key is in the cache
+        unpacked = self._unpack(await get_redis_value(key, self.cache))
+        if unpacked is not None:
+            fresh_until, value = unpacked
+            if time.time() < fresh_until:
+                self.requests["hit"].inc()
+                if self.l1 is not None:
+                    self.l1[key] = value
+                return value
+
+            # Stale: answer right away, refresh once in the background
+            self.requests["stale"].inc()
+            if key not in self._inflight:
+                self._flight(key, lambda: self._load_shared(key, args, kwargs)).add_done_callback(self._log_failure)
+            return value
+
+        # If not in cache, call the original function (once per key at a time)
+        self.requests["miss"].inc()
+        if not self.single_flight:
+            return await self._load(key, args, kwargs)
+        return await asyncio.shield(self._flight(key, lambda: self._load_shared(key, args, kwargs)))
+
+    def _unpack(self, raw: bytes | None) -> tuple[float, Any] | None:
+        """(fresh until, value); values without stale_ttl are always fresh. None is a miss."""
+        if raw is None:
+            return None
+        try:
+            data = self.serializer.deserialize(raw)
+        except SerializationMismatchError:
+            # Written by another serializer or schema version (e.g. during a deploy) - recompute
+            return None
+        if self.stale_ttl is None:
+            return math.inf, data
+        if not (isinstance(data, tuple) and len(data) == 2):  # noqa: PLR2004
+            # Written before stale_ttl was enabled for the function - serve it once and refresh
+            return 0.0, data
+        fresh_until, value = data
+        return fresh_until, value
+
+    def key(self, *args: Args, **kwargs: Kwargs) -> str:
+        """Redis key of a call with these arguments."""
+        return f"{self.prefix}:{self.key_builder(*args, **kwargs)}"
+
+    def _encode(self, result: Any) -> tuple[bytes, int | timedelta]:
+        """Serialized value and its Redis TTL."""
+        if self.stale_ttl is None:
+            return self.serializer.serialize(result), self.ttl
+        # Redis keeps the value for the stale period too, the freshness border is stored next to it
+        fresh_until = time.time() + _seconds(self.ttl)
+        return self.serializer.serialize((fresh_until, result)), int(_seconds(self.ttl) + _seconds(self.stale_ttl))
+
+    async def _store(self, key: str, result: Any) -> None:
+        value, ttl = self._encode(result)
+        await set_redis_value(key=key, value=value, ttl=ttl, cache=self.cache)
+        if self.l1 is not None:
+            self.l1[key] = result
+
+    async def get_many(self, keys: Sequence[str]) -> dict[str, Any]:
+        """Cached values of several keys (L1, then one MGET). Missing keys are left out."""
+        found: dict[str, Any] = {}
+        remote_keys = []
+        for key in keys:
+            value = self.l1.get(key, _MISSING) if self.l1 is not None else _MISSING
+            if value is _MISSING:
+                remote_keys.append(key)
+            else:
+                self.requests["local_hit"].inc()
+                found[key] = value
+
+        for key, raw in zip(remote_keys, await get_many(remote_keys, cache=self.cache), strict=True):
+            unpacked = self._unpack(raw)
+            if unpacked is None:
+                self.requests["miss"].inc()
+                continue
+            # Stale values are fine here: the caller recomputes only what is missing
+            self.requests["hit"].inc()
+            found[key] = value = unpacked[1]
+            if self.l1 is not None:
+                self.l1[key] = value
+        return found
+
+    async def set_many(self, results: Mapping[str, Any]) -> None:
+        """Store several computed values with one pipelined write."""
+        if not results:
+            return
+        async with self.cache.pipeline(transaction=False) as pipeline:
+            for key, result in results.items():
+                value, ttl = self._encode(result)
+                pipeline.set(key, value, ex=ttl)
+            await pipeline.execute()
+        if self.l1 is not None:
+            self.l1.update(results)
+
+    async def _compute(self, key: str, args: tuple[Any, ...], kwargs: dict[str, Any]) -> Any:
+        result = await self.func(*args, **kwargs)
+        await self._store(key, result)
+        return result
+
+    async def _load(self, key: str, args: tuple[Any, ...], kwargs: dict[str, Any]) -> Any:
+        if not self.lock:
+            return await self._compute(key, args, kwargs)
+
+        redis_lock = self.cache.lock(f"lock:{key}", timeout=self.lock_timeout)
+        if await redis_lock.acquire(blocking=False):
+            try:
+                return await self._compute(key, args, kwargs)
+            finally:
+                with suppress(LockError):
+                    await redis_lock.release()
+
+        # Another replica is computing the value - wait for it instead of repeating the work
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            unpacked = self._unpack(await get_redis_value(key, self.cache))
+            if unpacked is not None:
+                self.requests["coalesced"].inc()
+                return unpacked[1]
+
+        return await self._compute(key, args, kwargs)
+
+    async def _load_shared(self, key: str, args: tuple[Any, ...], kwargs: dict[str, Any]) -> Any:
+        """Load in a task that may outlive its caller (single flight, background refresh) with an own session."""
+        if not _takes_session(args, kwargs):
+            return await self._load(key, args, kwargs)
+        async with self.session_factory() as session:
+            return await self._load(key, *_with_session(args, kwargs, session))
+
+    def _flight(self, key: str, factory: Callable[[], Awaitable[Any]]) -> asyncio.Task[Any]:
+        """The in-flight computation of the key, started by `factory` if there is none."""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.requests["coalesced"].inc()
+            return task
+
+        task = asyncio.ensure_future(factory())
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return task
+
+    def _forget(self, key: str, task: asyncio.Task[Any]) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def _log_failure(self, task: asyncio.Task[Any]) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.opt(exception=task.exception()).warning(f"background cache refresh failed | key: {self.prefix}")
+
+
+def cached(  # noqa: PLR0913
     ttl: int | timedelta = DEFAULT_TTL,
     namespace: str = "main",
     cache: Redis = redis_client,
     key_builder: Callable[..., str] = build_key,
     serializer: AbstractSerializer | None = None,
+    local: bool = False,
+    local_ttl: int | timedelta | None = None,
+    single_flight: bool = True,
+    lock: bool = False,
+    lock_timeout: float = DEFAULT_LOCK_TIMEOUT,
+    stale_ttl: int | timedelta | None = None,
+    session_factory: Callable[[], AbstractAsyncContextManager[Any]] = sessionmaker,
 ) -> Callable[[Callable[..., Awaitable[_Func]]], Callable[..., Awaitable[_Func]]]:
     """Caches the function's return value into a key generated with module_name, function_name, and args.
 
@@ -56,6 +325,18 @@ def cached(
         cache (Redis): Redis instance for storing cached data.
         key_builder (Callable[..., str]): Function to build cache keys.
         serializer (AbstractSerializer | None): Serializer for cache data.
+        local (bool): Keep values in an in-process LRU (L1) in front of Redis, for very hot keys.
+            `clear_cache` evicts L1 entries on every replica via pub/sub. Disabled by CACHE_L1_ENABLED=False.
+        local_ttl (int | timedelta | None): Time-to-live of L1 entries, defaults to `ttl`.
+        single_flight (bool): Concurrent misses of one key in this process share a single computation.
+        lock (bool): Coalesce misses across replicas with a Redis lock: replicas that did not get the lock
+            wait up to `lock_timeout` seconds for the value instead of computing it too.
+        lock_timeout (float): Redis lock lifetime and the longest wait for another replica's result.
+        stale_ttl (int | timedelta | None): Serve values up to `stale_ttl` past `ttl` while they are
+            refreshed in the background (stale-while-revalidate), so readers never wait for a refresh.
+        session_factory (Callable): Opens the database session for shared loads (single flight) and background
+            refreshes when the function takes a session (keyword `session` or first positional argument):
+            such a load may outlive the caller, whose session is closed or busy with its own update by then.
 
     Returns:
         Callable: A decorator that wraps the original function with caching logic.
@@ -65,26 +346,64 @@ def cached(
         serializer = PickleSerializer()
 
     def decorator(func: Callable[..., Awaitable[_Func]]) -> Callable[..., Awaitable[_Func]]:
+        cached_function = CachedFunction(
+            func,
+            ttl=ttl,
+            namespace=namespace,
+            cache=cache,
+            key_builder=key_builder,
+            serializer=serializer,
+            local=local,
+            local_ttl=local_ttl,
+            single_flight=single_flight,
+            lock=lock,
+            lock_timeout=lock_timeout,
+            stale_ttl=stale_ttl,
+            session_factory=session_factory,
+        )
+
         @wraps(func)
         async def wrapper(*args: Args, **kwargs: Kwargs) -> Any:
-            key = key_builder(*args, **kwargs)
-            key = f"{namespace}:{func.__module__}:{func.__name__}:{key}"
+            return await cached_function(*args, **kwargs)
+
+        wrapper.cached_function = cached_function  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
+
 
-            # Check if the key is in the cache
-            cached_value = await cache.get(key)
-            if cached_value is not None:
-                return serializer.deserialize(cached_value)
+def cached_many(
+    single: Callable[..., Awaitable[Any]],
+) -> Callable[
+    [Callable[[Any, list[_Item]], Awaitable[dict[_Item, Any]]]],
+    Callable[[Any, Sequence[_Item]], Awaitable[dict[_Item, Any]]],
+]:
+    """Batch version of a @cached function of (session, item) that shares its cache entries.
 
-            # If not in cache, call the original function
-            result = await func(*args, **kwargs)
+    The decorated function takes (session, items) and returns {item: value} for the items it was asked for.
+    A call resolves every cached item with one MGET, computes only the missing items in a single call
+    and writes them back in one pipelined round trip.
+
+    Args:
+        single (Callable): The @cached function whose keys, serializer and TTL are reused.
 
-            # Store the result in Redis
-            await set_redis_value(
-                key=key,
-                value=serializer.serialize(result),
-                ttl=ttl,
-            )
+    """
+    cached_function: CachedFunction = single.cached_function  # type: ignore[attr-defined]
+
+    def decorator(
+        func: Callable[[Any, list[_Item]], Awaitable[dict[_Item, Any]]],
+    ) -> Callable[[Any, Sequence[_Item]], Awaitable[dict[_Item, Any]]]:
+        @wraps(func)
+        async def wrapper(session: Any, items: Sequence[_Item]) -> dict[_Item, Any]:
+            keys = {item: cached_function.key(session, item) for item in items}
+            found = await cached_function.get_many(list(keys.values()))
 
+            result = {item: found[key] for item, key in keys.items() if key in found}
+            missing = [item for item in keys if item not in result]
+            if missing:
+                computed = await func(session, missing)
+                await cached_function.set_many({keys[item]: computed[item] for item in missing if item in computed})
+                result.update(computed)
             return result
 
         return wrapper
@@ -115,3 +434,4 @@ async def clear_cache(
     key = f"{namespace}:{func.__module__}:{func.__name__}:{key}"
 
     await redis_client.delete(key)
+    await cache_invalidator.publish(key)
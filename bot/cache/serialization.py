@@ -1,10 +1,46 @@
 # ruff: noqa: S301
+from __future__ import annotations
+import datetime
 import pickle
+import typing
+import zlib
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import TYPE_CHECKING, Any, Literal, NamedTuple, cast
 
 import orjson
 
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+try:
+    import zstandard
+except ImportError:  # optional, falls back to zlib
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:  # optional, falls back to zlib
+    lz4 = None
+
+Codec = Literal["zstd", "lz4", "zlib", "none"]
+
+_CODEC_IDS: dict[str, bytes] = {"none": b"n", "zlib": b"z", "zstd": b"s", "lz4": b"l"}
+
+_ROW, _ROWS, _NONE = 0, 1, 2
+
+# Cached values are written on every miss: favour speed over the last few percent of size
+ZLIB_LEVEL = 1
+
+# What a foreign, truncated or corrupt value raises while decoding: lz4 reports broken frames as RuntimeError
+_DECODE_ERRORS: tuple[type[Exception], ...] = (
+    orjson.JSONDecodeError,
+    ValueError,
+    TypeError,
+    zlib.error,
+    *((zstandard.ZstdError,) if zstandard is not None else ()),
+    *((RuntimeError,) if lz4 is not None else ()),
+)
+
 
 class AbstractSerializer(ABC):
     @abstractmethod
@@ -16,6 +52,10 @@ class AbstractSerializer(ABC):
         """Support for deserializing objects stored in Redis."""
 
 
+class SerializationMismatchError(ValueError):
+    """The stored value was written in another format or schema version; treat it as a cache miss."""
+
+
 class PickleSerializer(AbstractSerializer):
     """Serialize values using pickle."""
 
@@ -36,3 +76,113 @@ class JSONSerializer(AbstractSerializer):
     def deserialize(self, obj: str) -> Any:
         """Deserialize values using JSON."""
         return orjson.loads(obj)
+
+
+def _compress(codec: Codec, data: bytes) -> bytes:
+    if codec == "zstd":
+        return cast("bytes", zstandard.ZstdCompressor().compress(data))
+    if codec == "lz4":
+        return cast("bytes", lz4.frame.compress(data))
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def _decompress(codec_id: bytes, data: bytes) -> bytes:
+    if codec_id == b"z":
+        return zlib.decompress(data)
+    if codec_id == b"s" and zstandard is not None:
+        return cast("bytes", zstandard.ZstdDecompressor().decompress(data))
+    if codec_id == b"l" and lz4 is not None:
+        return cast("bytes", lz4.frame.decompress(data))
+    msg = f"unsupported cache codec {codec_id!r}"
+    raise SerializationMismatchError(msg)
+
+
+def available_codec(codec: Codec) -> Codec:
+    """The requested codec, or zlib when its optional library is not installed."""
+    if (codec == "zstd" and zstandard is None) or (codec == "lz4" and lz4 is None):
+        return "zlib"
+    return codec
+
+
+def _field_decoder(annotation: Any) -> Callable[[str], Any] | None:
+    """orjson writes dates and times as ISO strings; everything else round-trips as is."""
+    for candidate in typing.get_args(annotation) or (annotation,):
+        if candidate in {datetime.datetime, datetime.date, datetime.time}:
+            decoder: Callable[[str], Any] = candidate.fromisoformat
+            return decoder
+    return None
+
+
+class RowSerializer(AbstractSerializer):
+    """Compact serializer for row projections described by a NamedTuple.
+
+    A value is one row, a list of rows or None (optionally inside the `(fresh_until, value)` envelope
+    of stale-while-revalidate). Rows are stored as positional orjson arrays tagged with the schema
+    name, version and a fingerprint of the field names, so a value written for another schema is
+    reported as SerializationMismatchError instead of being decoded into the wrong fields.
+    Payloads of at least `compress_threshold` bytes are compressed with `codec`.
+    """
+
+    def __init__(
+        self,
+        row_type: type[NamedTuple],
+        version: int = 1,
+        codec: Codec = "zstd",
+        compress_threshold: int = 4096,
+    ) -> None:
+        self.row_type = row_type
+        fields: tuple[str, ...] = row_type._fields
+        self.tag = f"{row_type.__name__}/{version}/{zlib.crc32(','.join(fields).encode()):08x}"
+        self.codec = available_codec(codec)
+        self.compress_threshold = compress_threshold
+
+        hints = typing.get_type_hints(row_type)
+        decoders = ((index, _field_decoder(hints[name])) for index, name in enumerate(fields))
+        self._decoders = [(index, decode) for index, decode in decoders if decode is not None]
+
+    def serialize(self, obj: Any) -> bytes:
+        fresh_until = None
+        data: tuple[Any, ...] | list[tuple[Any, ...]] | None
+        if isinstance(obj, tuple) and not isinstance(obj, self.row_type):
+            fresh_until, obj = obj
+
+        if obj is None:
+            kind, data = _NONE, None
+        elif isinstance(obj, self.row_type):
+            kind, data = _ROW, tuple(obj)
+        else:
+            kind, data = _ROWS, [tuple(row) for row in obj]
+
+        payload = orjson.dumps([self.tag, fresh_until, kind, data])
+        if self.codec == "none" or len(payload) < self.compress_threshold:
+            return _CODEC_IDS["none"] + payload
+        return _CODEC_IDS[self.codec] + _compress(self.codec, payload)
+
+    def deserialize(self, obj: bytes) -> Any:
+        codec_id, body = obj[:1], obj[1:]
+        try:
+            if codec_id != _CODEC_IDS["none"]:
+                body = _decompress(codec_id, body)
+            tag, fresh_until, kind, data = orjson.loads(body)
+        except SerializationMismatchError:
+            raise
+        except _DECODE_ERRORS as e:
+            msg = "not a RowSerializer value"
+            raise SerializationMismatchError(msg) from e
+        if tag != self.tag:
+            msg = f"cached schema {tag} does not match {self.tag}"
+            raise SerializationMismatchError(msg)
+
+        if kind == _NONE:
+            value = None
+        elif kind == _ROW:
+            value = self._row(data)
+        else:
+            value = [self._row(row) for row in data]
+        return value if fresh_until is None else (fresh_until, value)
+
+    def _row(self, values: list[Any]) -> Any:
+        for index, decode in self._decoders:
+            if values[index] is not None:
+                values[index] = decode(values[index])
+        return self.row_type._make(values)
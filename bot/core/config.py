@@ -1,7 +1,7 @@
 from __future__ import annotations
 import os
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Literal
 
 from cryptography.fernet import Fernet
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -21,6 +21,8 @@ FP_URL = f"{BASE_URL}/api/UserInfo/Devices/RandomIdentity"
 JOURNALS_URL = f"{BASE_URL}/api/Journals/JournalList"
 JOURNAL_URL = f"{BASE_URL}/api/Journals/Journal"
 
+METRICS_PREFIX = "tgbot"
+
 
 class EnvBaseSettings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
@@ -44,7 +46,68 @@ class WebhookSettings(EnvBaseSettings):
 class BotSettings(WebhookSettings):
     BOT_TOKEN: str
     SUPPORT_URL: str | None = None
-    RATE_LIMIT: int | float = 0.5  # for throttling control
+    RATE_LIMIT: int | float = 0.5  # for throttling control: seconds between messages of a chat
+    RATE_LIMIT_BURST: int = 1  # messages of a chat allowed back to back
+    RATE_LIMIT_LOCAL_LEASE: int = 2  # spare tokens a replica may reserve in Redis and spend without asking it
+
+
+class EduSettings(EnvBaseSettings):
+    EDU_CONCURRENCY: int = 4  # parallel journal requests per sync
+    EDU_RATE_LIMIT: float = 5.0  # requests per second to edu-tpi for the whole process
+    EDU_RATE_BURST: int = 5
+
+    EDU_TOKEN_TTL: int = 3600  # used when the access token carries no `exp` claim
+
+    EDU_HTTP_TIMEOUT: float = 60
+    EDU_HTTP_POOL_SIZE: int = 100  # total connections of the shared session
+    EDU_HTTP_POOL_PER_HOST: int = 20  # connections to edu-tpi.donstu.ru
+    EDU_HTTP_DNS_TTL: int = 300
+    EDU_HTTP_KEEPALIVE: float = 30
+
+    EDU_REQUEST_DEADLINE: float = 30  # seconds for a request with all of its retries
+    EDU_ATTEMPT_TIMEOUT: float = 15  # seconds for one attempt
+    EDU_RETRY_MAX: int = 2  # retries of a failed request (5xx, 429, connection errors, timeouts)
+    EDU_RETRY_BUDGET: float = 0.2  # retries allowed per request across the process
+    EDU_BREAKER_FAILURES: int = 5  # failures in a row that open the circuit of an endpoint
+    EDU_BREAKER_RESET: float = 30  # seconds an open circuit waits before letting a probe through
+    EDU_LIMIT_INITIAL: int = 10  # starting concurrency limit of an endpoint (adapted by AIMD)
+    EDU_LIMIT_MIN: int = 1
+    EDU_LIMIT_MAX: int = 20  # keep within EDU_HTTP_POOL_PER_HOST
+    EDU_LATENCY_TARGET: float = 2.0  # seconds; slower responses shrink the concurrency limit
+
+
+class SyncSettings(EnvBaseSettings):
+    SYNC_ENABLED: bool = True  # run the scheduler inside the bot process (disable when using `python -m bot.worker`)
+    SYNC_INTERVAL: int = 3600  # seconds between automatic syncs of one user
+    SYNC_FULL_INTERVAL: int = 24 * 3600  # seconds between full syncs (both semesters, all dates) of one user
+    SYNC_INCREMENTAL_OVERLAP_DAYS: int = 7  # incremental syncs re-read this many days before each journal's watermark
+    SYNC_WATCH_INTERVAL: int = 300  # seconds between polls of a user in watch mode
+    SYNC_WATCH_TICK: int = 15  # seconds between watch mode scheduler passes
+    SYNC_WATCH_CONCURRENCY: int = 5  # watch mode polls at the same time, separate from SYNC_CONCURRENCY
+    SYNC_WATCH_DAYS: int = 14  # watch mode polls only grades of the current semester from the last days
+    SYNC_WATCH_DURATION: int = 6 * 3600  # seconds before watch mode turns itself off
+    SYNC_WATCH_LIST_TTL: int = 3600  # seconds the semester journal list is reused between watch mode polls
+    SYNC_TICK: int = 30  # seconds between scheduler passes
+    SYNC_CONCURRENCY: int = 10  # users synced at the same time
+    SYNC_BATCH_SIZE: int = 100  # due users picked per pass
+    SYNC_METRICS_PORT: int = 9101  # prometheus port of the standalone worker
+    SYNC_HASH_TTL: int = 7 * 24 * 3600  # unchanged journals are fully re-parsed at least this often
+    SYNC_GROUP_SHARING: bool = True  # download each group journal once for all due members of the group
+
+
+class NotificationSettings(EnvBaseSettings):
+    NOTIFY_ENABLED: bool = True  # send the notification outbox from the bot process
+    NOTIFY_GLOBAL_RATE: float = (
+        25  # messages per second for the whole bot, shared by all replicas (Telegram allows ~30)
+    )
+    NOTIFY_CHAT_INTERVAL: float = 1.0  # seconds between messages to one chat
+    NOTIFY_CONCURRENCY: int = 30  # sendMessage requests in flight
+    NOTIFY_BATCH_SIZE: int = 200  # outbox rows claimed at a time
+    NOTIFY_POLL_INTERVAL: float = 2.0  # seconds between outbox polls when it is empty
+    NOTIFY_MAX_ATTEMPTS: int = 5  # failed sends before a message is given up
+    DIGEST_ENABLED: bool = True  # queue morning digests at each user's morning_notification_time
+    DIGEST_TIMEZONE: str = "Europe/Moscow"  # timezone of morning_notification_time
+    DIGEST_PAGE_SIZE: int = 500  # users of one minute cohort loaded (and aggregated) at a time
 
 
 class DBSettings(EnvBaseSettings):
@@ -53,6 +116,14 @@ class DBSettings(EnvBaseSettings):
     DB_USER: str = "postgres"
     DB_PASS: str | None = None
     DB_NAME: str = "postgres"
+    # direct - straight to postgres; pgbouncer_transaction - no prepared statement cache (statements don't
+    # survive a transaction); pgbouncer_session - server connection is pinned, statement cache is on
+    DB_POOL_MODE: Literal["direct", "pgbouncer_transaction", "pgbouncer_session"] = "pgbouncer_session"
+    DB_POOL_SIZE: int = 10  # connections kept open per process
+    DB_MAX_OVERFLOW: int = 10  # extra connections opened under load and closed when returned
+    DB_POOL_TIMEOUT: int = 30  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # seconds before a connection is reopened
+    DB_STATEMENT_CACHE_SIZE: int = 256  # prepared statements cached per connection (when the mode allows it)
 
     @property
     def database_url(self) -> URL | str:
@@ -72,6 +143,11 @@ class CacheSettings(EnvBaseSettings):
     REDIS_PORT: int = 6379
     REDIS_PASS: str | None = None
 
+    CACHE_L1_ENABLED: bool = True  # in-process cache in front of Redis for @cached(local=True) functions
+    CACHE_L1_MAXSIZE: int = 10_000  # entries per cached function, least recently used are evicted
+    CACHE_COMPRESSION: Literal["zstd", "lz4", "zlib", "none"] = "zstd"  # zlib if zstandard/lz4 is not installed
+    CACHE_COMPRESS_THRESHOLD: int = 4096  # compress RowSerializer payloads of at least this many bytes
+
     # REDIS_DATABASE: int = 1
     # REDIS_USERNAME: int | None = None
     # REDIS_TTL_STATE: int | None = None
@@ -98,7 +174,7 @@ class CelerySettings(EnvBaseSettings):
     CELERY_WORKER_CONCURRENCY: int = 4
 
 
-class Settings(BotSettings, DBSettings, CacheSettings, CelerySettings):
+class Settings(BotSettings, EduSettings, SyncSettings, NotificationSettings, DBSettings, CacheSettings, CelerySettings):
     DEBUG: bool = False
 
     SENTRY_DSN: str | None = None
@@ -106,6 +182,14 @@ class Settings(BotSettings, DBSettings, CacheSettings, CelerySettings):
     AMPLITUDE_API_KEY: str | None = None
     POSTHOG_API_KEY: str | None = None
 
+    ANALYTICS_QUEUE_MAXSIZE: int = 10_000  # events buffered in memory before the overflow policy applies
+    ANALYTICS_BATCH_SIZE: int = 100  # events per request, a full batch is sent right away
+    ANALYTICS_FLUSH_INTERVAL: float = 5.0  # seconds between flushes of a partial batch
+    ANALYTICS_OVERFLOW: Literal["drop_oldest", "drop_newest", "spill"] = "spill"  # spill needs ANALYTICS_SPILL_DIR
+    ANALYTICS_SPILL_DIR: str | None = "data/analytics"  # undelivered batches are kept here, empty to disable
+    ANALYTICS_SPILL_MAX_MB: int = 100  # batches beyond this size are dropped
+    ANALYTICS_RETRY_MAX: float = 300.0  # longest pause (seconds) between delivery attempts during an outage
+
     ENCRYPTION_KEY: str = os.getenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
 
 
@@ -1,14 +1,40 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+import time
+from typing import TYPE_CHECKING, Any, Literal, cast
 from uuid import uuid4
 
+import prometheus_client
 from asyncpg import Connection
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-from bot.core.config import settings
+from bot.core.config import METRICS_PREFIX, settings
 
 if TYPE_CHECKING:
     from sqlalchemy.engine.url import URL
+    from sqlalchemy.pool import QueuePool
+    from sqlalchemy.pool.base import ConnectionPoolEntry
+
+PoolMode = Literal["direct", "pgbouncer_transaction", "pgbouncer_session"]
+
+DB_POOL_SIZE = prometheus_client.Gauge(
+    name=f"{METRICS_PREFIX}_db_pool_size",
+    documentation="Configured number of persistent connections in the database pool.",
+)
+DB_POOL_CHECKED_OUT = prometheus_client.Gauge(
+    name=f"{METRICS_PREFIX}_db_pool_checked_out",
+    documentation="Database connections currently checked out of the pool.",
+)
+DB_POOL_OVERFLOW = prometheus_client.Gauge(
+    name=f"{METRICS_PREFIX}_db_pool_overflow",
+    documentation="Overflow connections currently open above the pool size (negative while the pool is warming up).",
+)
+DB_POOL_WAIT = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_db_pool_wait",
+    documentation="Histogram of time spent waiting for a connection from the pool (in seconds).",
+    unit="seconds",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
 
 
 class CConnection(Connection):  # type: ignore
@@ -16,15 +42,58 @@ class CConnection(Connection):  # type: ignore
         return f"__asyncpg_{prefix}_{uuid4()}__"
 
 
-def get_engine(url: URL | str = settings.database_url) -> AsyncEngine:
-    return create_async_engine(
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that reports checkout wait time to Prometheus."""
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started_at)
+
+
+def _connect_args(mode: PoolMode) -> dict[str, Any]:
+    if mode == "pgbouncer_transaction":
+        # Consecutive transactions may run on different server connections, so prepared statements
+        # must be neither cached nor reused under a stable name.
+        return {
+            "connection_class": CConnection,
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+        }
+    # Direct connections and pgbouncer session mode keep one server connection per client connection.
+    return {
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+
+
+def instrument_pool(engine: AsyncEngine) -> None:
+    """Export pool occupancy of the engine as Prometheus gauges (read on scrape)."""
+
+    def pool() -> QueuePool:
+        # engine.dispose() replaces the pool object, so it is looked up on every scrape
+        return cast("QueuePool", engine.pool)
+
+    DB_POOL_SIZE.set_function(lambda: pool().size())
+    DB_POOL_CHECKED_OUT.set_function(lambda: pool().checkedout())
+    DB_POOL_OVERFLOW.set_function(lambda: pool().overflow())
+
+
+def get_engine(url: URL | str = settings.database_url, mode: PoolMode = settings.DB_POOL_MODE) -> AsyncEngine:
+    engine = create_async_engine(
         url=url,
         echo=settings.DEBUG,
-        pool_size=0,
-        connect_args={
-            "connection_class": CConnection,
-        },
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        connect_args=_connect_args(mode),
     )
+    instrument_pool(engine)
+    return engine
 
 
 def get_sessionmaker(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
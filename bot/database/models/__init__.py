@@ -1,7 +1,8 @@
 from .base import Base
 from .grade import Grade
 from .journal import Journal
+from .notification import Notification
 from .sync_log import SyncLog
 from .user import User
 
-__all__ = ["Base", "Grade", "Journal", "SyncLog", "User"]
+__all__ = ["Base", "Grade", "Journal", "Notification", "SyncLog", "User"]
@@ -17,10 +17,11 @@ if TYPE_CHECKING:
 class Grade(Base):
     __tablename__ = "grades"
 
-    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False, unique=True)
-    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"), index=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)  # dateID занятия в edu-tpi
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"), primary_key=True, index=True)
     journal_id: Mapped[int] = mapped_column(ForeignKey("journals.id"), index=True)
     date: Mapped[datatime.date] = mapped_column(Date, nullable=False)
+    hour_number: Mapped[int] = mapped_column(SmallInteger, nullable=False)
     value: Mapped[str] = mapped_column(String(2), nullable=False)
     number_value: Mapped[int | None] = mapped_column(SmallInteger, nullable=True)
     is_mark: Mapped[bool]
@@ -33,6 +34,7 @@ class Grade(Base):
         Index("idx_user_lesson", "id", "user_id"),
         Index("idx_user_journal_date", "user_id", "journal_id", "date"),
         UniqueConstraint("id", "user_id", "journal_id", name="uq_user_lesson_journal"),
+        UniqueConstraint("user_id", "journal_id", "date", "hour_number", name="uq_user_journal_date_hour"),
     )
 
     # Relationships
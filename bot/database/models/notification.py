@@ -0,0 +1,45 @@
+from __future__ import annotations
+import datetime  # noqa: TC003 - resolved by SQLAlchemy at runtime
+from enum import Enum
+
+from sqlalchemy import BigInteger, ForeignKey, Index, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from bot.database.models.base import Base, created_at
+
+
+class NotificationKind(Enum):
+    GRADES = "grades"
+    DIGEST = "digest"
+
+
+class NotificationStatus(Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class Notification(Base):
+    """Исходящее сообщение пользователю (outbox). Отправляется `NotificationDispatcher`."""
+
+    __tablename__ = "notifications"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"), index=True)
+    kind: Mapped[NotificationKind] = mapped_column(nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[NotificationStatus] = mapped_column(nullable=False, default=NotificationStatus.PENDING)
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0)
+    # Не отправлять раньше: время повтора после ошибки или окончание аренды отправляющей реплики
+    send_after: Mapped[datetime.datetime] = mapped_column(nullable=False)
+    error: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    created_at: Mapped[created_at] = mapped_column()
+    sent_at: Mapped[datetime.datetime | None] = mapped_column(nullable=True)
+
+
+# Только ожидающие сообщения: индекс остается маленьким, сколько бы уже отправленных ни накопилось
+Index(
+    "idx_notifications_pending",
+    Notification.send_after,
+    postgresql_where=Notification.status == NotificationStatus.PENDING,
+)
@@ -2,7 +2,7 @@ from __future__ import annotations
 import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import BigInteger, Index, String
+from sqlalchemy import BigInteger, Index, String, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 if TYPE_CHECKING:
@@ -30,6 +30,8 @@ class User(Base):
     morning_notification_time: Mapped[datetime.time | None] = mapped_column(default=datetime.time(8, 0))
     watch_mode_expires_at: Mapped[datetime.datetime | None] = mapped_column(nullable=True)
     watch_mode_last_sync_at: Mapped[datetime.datetime | None] = mapped_column(nullable=True)
+    last_sync: Mapped[datetime.datetime | None] = mapped_column(nullable=True)
+    last_full_sync: Mapped[datetime.datetime | None] = mapped_column(nullable=True)
     created_at: Mapped[created_at]
     updated_at: Mapped[updated_at]
 
@@ -43,6 +45,12 @@ class User(Base):
         Index("idx_telegram_id", "id"),
         Index("idx_group_id", "group_id"),
         Index("idx_group_edu_user", "id", "group_id"),
+        Index("idx_last_sync", "last_sync"),
+        Index(
+            "idx_morning_notification_time",
+            "morning_notification_time",
+            postgresql_where=text("morning_notification_enabled"),
+        ),
     )
 
     def __str__(self) -> str:
@@ -2,16 +2,18 @@ from aiogram.filters import BaseFilter
 from aiogram.types import Message
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from bot.services.users import is_admin
+from bot.services.users import UserContext, is_admin
 
 
 class AdminFilter(BaseFilter):
     """Allows only administrators (whose database column is_admin=True)."""
 
-    async def __call__(self, message: Message, session: AsyncSession) -> bool:
+    async def __call__(self, message: Message, session: AsyncSession, user_context: UserContext | None = None) -> bool:
         if not message.from_user:
             return False
 
         user_id = message.from_user.id
+        if user_context is not None and user_context.user_id == user_id:
+            return user_context.is_admin
 
         return await is_admin(session=session, user_id=user_id)
@@ -1,11 +1,12 @@
 from aiogram import Router
 
-from . import auth, info
+from . import auth, info, watch
 
 
 def get_callback_handlers_router() -> Router:
     router = Router()
     router.include_router(info.router)
     router.include_router(auth.router)
+    router.include_router(watch.router)
 
     return router
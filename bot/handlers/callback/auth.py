@@ -2,11 +2,10 @@ from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message
 from aiogram.utils.i18n import gettext as _
-from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.handlers.message.auth import FormAuth
 from bot.keyboards.reply import get_cancel_keyboard
-from bot.services.users import is_authorized
+from bot.services.users import UserContext
 
 router = Router()
 
@@ -14,13 +13,12 @@ router = Router()
 @router.callback_query(F.data == "auth_start")
 async def auth_start(
     callback: CallbackQuery,
-    session: AsyncSession,
+    user_context: UserContext,
     state: FSMContext,
 ) -> None:
     if not isinstance(callback.message, Message):
         return
-    user_id = callback.from_user.id
-    if await is_authorized(session, user_id):
+    if user_context.is_authenticated:
         await callback.answer("Вы уже авторизованы.")
         return
 
@@ -0,0 +1,37 @@
+from __future__ import annotations
+from datetime import timedelta
+from typing import TYPE_CHECKING
+
+from aiogram import F, Router
+from aiogram.utils.i18n import gettext as _
+from sqlalchemy import select
+
+from bot.core.config import settings
+from bot.database.models import User
+from bot.services.watch import set_watch_mode
+from bot.utils.misc import utcnow
+
+if TYPE_CHECKING:
+    from aiogram.types import CallbackQuery
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from bot.services.users import UserContext
+
+router = Router(name="watch")
+
+
+@router.callback_query(F.data == "watch")
+async def watch_handler(callback: CallbackQuery, user_context: UserContext, session: AsyncSession) -> None:
+    """Включить режим наблюдения на SYNC_WATCH_DURATION или выключить, если он уже включен."""
+    if not user_context.is_authenticated:
+        await callback.answer()
+        return
+
+    expires_at = await session.scalar(select(User.watch_mode_expires_at).where(User.id == user_context.user_id))
+    if expires_at is not None and expires_at > utcnow():
+        await set_watch_mode(session, user_context.user_id, None)
+        await callback.answer(_("watch.disabled"))
+        return
+
+    await set_watch_mode(session, user_context.user_id, timedelta(seconds=settings.SYNC_WATCH_DURATION))
+    await callback.answer(_("watch.enabled").format(hours=settings.SYNC_WATCH_DURATION // 3600), show_alert=True)
@@ -1,7 +1,9 @@
 from __future__ import annotations
+import asyncio
 import re
 from typing import TYPE_CHECKING, Any
 
+import aiohttp
 from aiogram import Router
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.state import State, StatesGroup
@@ -11,8 +13,8 @@ from aiogram.utils.i18n import gettext as _
 from bot.keyboards.inline.menu import get_main_menu_keyboard
 from bot.keyboards.reply import get_cancel_keyboard
 from bot.services.api_client import get_auth_data
-from bot.services.auth import authenticate_user
-from bot.services.users import set_edu_credentials, set_user_data
+from bot.services.auth import EduUnavailableError, authenticate_user
+from bot.services.users import UserContext, get_user_context, set_edu_credentials, set_user_data
 from bot.utils.main_menu import get_main_menu
 
 if TYPE_CHECKING:
@@ -31,7 +33,7 @@ class FormAuth(StatesGroup):
 @router.message(lambda message: message.text == _("cancel_btn"))
 async def cancel_handler(
     message: Message,
-    session: AsyncSession,
+    user_context: UserContext,
     state: FSMContext,
 ) -> None:
     if not message.from_user:
@@ -39,8 +41,8 @@ async def cancel_handler(
 
     await state.clear()
     await message.answer(_("cancelled"), reply_markup=ReplyKeyboardRemove())
-    kb = await get_main_menu_keyboard(session, message.from_user.id)
-    text = await get_main_menu(session, message.from_user.id)
+    kb = await get_main_menu_keyboard(user_context)
+    text = await get_main_menu(user_context)
     await message.answer(text, reply_markup=kb)
 
 
@@ -81,26 +83,27 @@ async def process_password(
     if not message.from_user:
         return
 
-    if not message.text:
+    password = (message.text or "").strip()
+    if not password:
         await message.answer(
             _("auth.enter_pass_invalid"),
             reply_markup=get_cancel_keyboard(),
         )
         return
 
-    password = message.text.strip()
-    if len(password) == 0:
+    data = await state.get_data()
+    login = data["login"]
+
+    try:
+        access_token = await authenticate_user(login, password)
+    except EduUnavailableError:
+        # Остаемся на вводе пароля: логин уже сохранен в состоянии
         await message.answer(
-            _("auth.enter_pass_invalid"),
+            _("auth.unavailable"),
             reply_markup=get_cancel_keyboard(),
         )
         return
 
-    data = await state.get_data()
-    login = data["login"]
-
-    access_token = await authenticate_user(login, password)
-
     if not access_token:
         await message.answer(
             _("auth.failed"),
@@ -114,7 +117,11 @@ async def process_password(
 
     await set_edu_credentials(session, message.from_user.id, login, password)
 
-    auth_data = await get_auth_data(access_token)
+    try:
+        auth_data = await get_auth_data(access_token)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        await message.answer(_("auth.unavailable"), reply_markup=get_cancel_keyboard())
+        return
     user_data_raw = auth_data.get("user")
     if user_data_raw is None:
         await message.answer(_("auth.failed"), reply_markup=ReplyKeyboardRemove())
@@ -133,6 +140,8 @@ async def process_password(
     )
 
     await state.clear()
-    kb = await get_main_menu_keyboard(session, message.from_user.id)
-    text = await get_main_menu(session, message.from_user.id)
+    # set_user_data сбросил кэш, контекст апдейта устарел
+    user_context = await get_user_context(session, message.from_user.id)
+    kb = await get_main_menu_keyboard(user_context)
+    text = await get_main_menu(user_context)
     await message.answer(text, reply_markup=kb)
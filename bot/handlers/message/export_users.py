@@ -2,28 +2,25 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 from aiogram import Router
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.utils.i18n import gettext as _
 
 from bot.filters.admin import AdminFilter
-from bot.services.users import get_all_users, get_user_count
-from bot.utils.users_export import convert_users_to_csv
+from bot.utils.users_export import export_users, parse_export_format, spooled_export_file
 
 if TYPE_CHECKING:
-    from aiogram.types import BufferedInputFile, Message
+    from aiogram.types import Message
     from sqlalchemy.ext.asyncio import AsyncSession
 
-    from bot.database.models import User
-
 
 router = Router(name="export_users")
 
 
-@router.message(Command(commands="export_users"), AdminFilter())
-async def export_users_handler(message: Message, session: AsyncSession) -> None:
-    """Export all users in csv file."""
-    all_users: list[User] = await get_all_users(session)
-    document: BufferedInputFile = await convert_users_to_csv(all_users)
-    count: int = await get_user_count(session)
+@router.message(Command(commands="export_users"), AdminFilter(), flags={"throttling_key": "export"})
+async def export_users_handler(message: Message, command: CommandObject, session: AsyncSession) -> None:
+    """Export all users in a gzip-compressed csv (or jsonl: /export_users jsonl) file."""
+    export_format = parse_export_format(command.args)
 
-    await message.answer_document(document=document, caption=_("user counter").format(count=count))
+    with spooled_export_file() as spool:
+        document, count = await export_users(session, spool, export_format)
+        await message.answer_document(document=document, caption=_("user counter").format(count=count))
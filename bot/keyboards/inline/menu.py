@@ -1,18 +1,15 @@
 from aiogram.types import InlineKeyboardMarkup
 from aiogram.utils.i18n import gettext as _
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from bot.services.users import is_authorized
+from bot.services.users import UserContext
 
 
-async def get_main_menu_keyboard(session: AsyncSession, user_id: int) -> InlineKeyboardMarkup:
+async def get_main_menu_keyboard(user: UserContext) -> InlineKeyboardMarkup:
     """Главное меню с проверкой авторизации."""
     builder = InlineKeyboardBuilder()
 
-    authorized = await is_authorized(session, user_id)
-
-    if authorized:
+    if user.is_authenticated:
         builder.button(text=_("menu.grades_btn"), callback_data="grades")
         builder.button(text=_("menu.stats_btn"), callback_data="stats")
 
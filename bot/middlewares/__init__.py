@@ -2,22 +2,27 @@ from aiogram import Dispatcher
 
 # from aiogram.utils.callback_answer import CallbackAnswerMiddleware
 from .auth import AuthMiddleware
-from .database import DatabaseMiddleware
+from .database import DatabaseMiddleware, DatabaseUsageMiddleware
 from .i18n import ACLMiddleware
 from .logging import LoggingMiddleware
 from .throttling import ThrottlingMiddleware
+from .user_context import UserContextMiddleware
 from bot.core.loader import i18n as _i18n
 
 
 def register_middlewares(dp: Dispatcher) -> None:
-    dp.message.outer_middleware(ThrottlingMiddleware())
-
     dp.update.outer_middleware(LoggingMiddleware())
+    dp.update.outer_middleware(ThrottlingMiddleware())
 
     dp.update.outer_middleware(DatabaseMiddleware())
+    dp.update.outer_middleware(UserContextMiddleware())
 
+    dp.message.middleware(ThrottlingMiddleware(per_handler=True))
     dp.message.middleware(AuthMiddleware())
 
+    dp.message.middleware(DatabaseUsageMiddleware())
+    dp.callback_query.middleware(DatabaseUsageMiddleware())
+
     ACLMiddleware(i18n=_i18n).setup(dp)
 
     # dp.callback_query.middleware(CallbackAnswerMiddleware(True))
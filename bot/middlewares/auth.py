@@ -5,7 +5,7 @@ from aiogram import BaseMiddleware
 from aiogram.types import Message
 from loguru import logger
 
-from bot.services.users import add_user, user_exists
+from bot.services.users import UserContext, add_user, user_exists
 
 if TYPE_CHECKING:
     from collections.abc import Awaitable, Callable
@@ -31,7 +31,8 @@ class AuthMiddleware(BaseMiddleware):
         if not user:
             return await handler(event, data)
 
-        if await user_exists(session, user.id):
+        user_context: UserContext | None = data.get("user_context")
+        if user_context.exists if user_context is not None else await user_exists(session, user.id):
             return await handler(event, data)
 
         logger.info(f"new user registration | user_id: {user.id} | message: {message.text}")
@@ -39,5 +40,6 @@ class AuthMiddleware(BaseMiddleware):
         await add_user(session=session, user=user)
 
         data["new_user"] = True
+        data["user_context"] = UserContext(user_id=user.id, exists=True, language_code=user.language_code)
 
         return await handler(event, data)
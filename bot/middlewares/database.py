@@ -1,23 +1,92 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING, Any
 
+import prometheus_client
 from aiogram import BaseMiddleware
 
+from bot.core.config import METRICS_PREFIX
 from bot.database.database import sessionmaker
 
 if TYPE_CHECKING:
     from collections.abc import Awaitable, Callable
 
+    from aiogram.dispatcher.event.handler import HandlerObject
     from aiogram.types import TelegramObject
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+DB_SESSIONS = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_db_sessions",
+    documentation="Total updates by whether their lazy database session was actually opened.",
+    labelnames=["used"],
+)
+HANDLER_DB_USAGE = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_handler_db_usage",
+    documentation="Total handler calls by handler and whether the update used the database.",
+    labelnames=["handler", "used"],
+)
+
+
+class LazySession:
+    """AsyncSession proxy that creates the real session on first use.
+
+    The session itself checks out a pool connection only on the first query, so updates
+    that never touch the database cost neither a session nor a connection.
+    """
+
+    __slots__ = ("_factory", "_session")
+
+    def __init__(self, factory: async_sessionmaker[AsyncSession]) -> None:
+        self._factory = factory
+        self._session: AsyncSession | None = None
+
+    @property
+    def used(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name: str) -> Any:
+        if self._session is None:
+            self._session = self._factory()
+        return getattr(self._session, name)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
 
 
 class DatabaseMiddleware(BaseMiddleware):
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession] = sessionmaker) -> None:
+        self.session_factory = session_factory
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        session = LazySession(self.session_factory)
+        data["session"] = session
+        try:
+            return await handler(event, data)
+        finally:
+            DB_SESSIONS.labels(used=str(session.used).lower()).inc()
+            await session.close()
+
+
+class DatabaseUsageMiddleware(BaseMiddleware):
+    """Inner middleware that records which handlers needed the database for their update."""
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
         event: TelegramObject,
         data: dict[str, Any],
     ) -> Any:
-        async with sessionmaker() as session:
-            data["session"] = session
+        try:
             return await handler(event, data)
+        finally:
+            session = data.get("session")
+            handler_object: HandlerObject | None = data.get("handler")
+            if isinstance(session, LazySession) and handler_object is not None:
+                callback = handler_object.callback
+                name = f"{callback.__module__}.{getattr(callback, '__qualname__', repr(callback))}"
+                HANDLER_DB_USAGE.labels(handler=name, used=str(session.used).lower()).inc()
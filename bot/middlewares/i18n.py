@@ -18,7 +18,7 @@ from typing import TYPE_CHECKING, Any
 from aiogram.utils.i18n.middleware import I18nMiddleware
 
 from bot.core.config import DEFAULT_LOCALE
-from bot.services.users import get_language_code
+from bot.services.users import UserContext, get_language_code
 
 if TYPE_CHECKING:
     from aiogram.types import TelegramObject, User
@@ -38,6 +38,10 @@ class ACLMiddleware(I18nMiddleware):
         if not user:
             return self.DEFAULT_LANGUAGE_CODE
 
-        language_code: str | None = await get_language_code(session=session, user_id=user.id)
+        user_context: UserContext | None = data.get("user_context")
+        if user_context is not None and user_context.user_id == user.id:
+            language_code = user_context.language_code
+        else:
+            language_code = await get_language_code(session=session, user_id=user.id)
 
         return language_code or self.DEFAULT_LANGUAGE_CODE
@@ -6,13 +6,13 @@ import prometheus_client
 from aiohttp.web_exceptions import HTTPException
 from aiohttp.web_middlewares import middleware
 
+from bot.core.config import METRICS_PREFIX
+
 if TYPE_CHECKING:
     from aiohttp.typedefs import Handler, Middleware
     from aiohttp.web_request import Request
     from aiohttp.web_response import StreamResponse
 
-METRICS_PREFIX = "tgbot"
-
 
 def prometheus_middleware_factory(
     metrics_prefix: str = METRICS_PREFIX,
@@ -1,22 +1,62 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING, Any
 
+import prometheus_client
 from aiogram import BaseMiddleware
-from cachetools import TTLCache
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Update
+from loguru import logger
+from redis.exceptions import RedisError
 
-from bot.core.config import settings
+from bot.core.config import METRICS_PREFIX, settings
+from bot.core.loader import redis_client
+from bot.utils.rate_limit import GCRALimiter, RateLimit
 
 if TYPE_CHECKING:
     from collections.abc import Awaitable, Callable
 
     from aiogram.types import Chat, TelegramObject
 
+DEFAULT_KEY = "default"
+
+# Limits of handler groups, selected with flags={"throttling_key": ...}; handlers without the flag share "default"
+THROTTLING_LIMITS: dict[str, RateLimit] = {
+    DEFAULT_KEY: RateLimit(interval=settings.RATE_LIMIT, burst=settings.RATE_LIMIT_BURST),
+    "export": RateLimit(interval=30),
+}
+
+THROTTLED_UPDATES = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_throttled_updates",
+    documentation="Total updates rejected by throttling, by throttling key and where it was decided (local, redis).",
+    labelnames=["key", "source"],
+)
+THROTTLING_CHECKS = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_throttling_checks",
+    documentation="Total throttling checks by where they were decided (local, redis, redis_error).",
+    labelnames=["source"],
+)
+
 
 class ThrottlingMiddleware(BaseMiddleware):
-    cache: TTLCache[int, Any]
+    """Per chat and handler group rate limit, shared by every bot replica through Redis.
 
-    def __init__(self, rate_limit: float = settings.RATE_LIMIT) -> None:
-        self.cache = TTLCache(maxsize=10_000, ttl=rate_limit)
+    Used twice. As an update outer middleware it applies the "default" limit to every message before
+    the database session and user context are set up, so throttled messages cost neither filters nor
+    database lookups. With per_handler=True it is an inner message middleware, where the throttling_key
+    flag of the matched handler is known, and applies only the stricter limits of flagged handlers.
+    If Redis is unavailable, updates are let through rather than dropped.
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, RateLimit] | None = None,
+        limiter: GCRALimiter | None = None,
+        *,
+        per_handler: bool = False,
+    ) -> None:
+        self.limits = limits or THROTTLING_LIMITS
+        self.limiter = limiter or GCRALimiter(redis_client, lease=settings.RATE_LIMIT_LOCAL_LEASE)
+        self.per_handler = per_handler
 
     async def __call__(
         self,
@@ -24,11 +64,25 @@ class ThrottlingMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: dict[str, Any],
     ) -> Any:
-        chat: Chat | None = getattr(event, "chat", None)
-        if not chat:
+        chat: Chat | None = data.get("event_chat")
+        if not chat or (isinstance(event, Update) and event.message is None):
+            return await handler(event, data)
+
+        throttling_key: str = get_flag(data, "throttling_key", default=DEFAULT_KEY) if self.per_handler else DEFAULT_KEY
+        if self.per_handler and throttling_key == DEFAULT_KEY:
+            # The default limit was already applied by the outer middleware
+            return await handler(event, data)
+        limit = self.limits.get(throttling_key, self.limits[DEFAULT_KEY])
+
+        try:
+            allowed, source = await self.limiter.acquire(f"throttling:{throttling_key}:{chat.id}", limit)
+        except RedisError as e:
+            THROTTLING_CHECKS.labels(source="redis_error").inc()
+            logger.warning(f"throttling skipped, redis unavailable | chat_id: {chat.id} | error: {e!r}")
             return await handler(event, data)
 
-        if chat.id in self.cache:
+        THROTTLING_CHECKS.labels(source=source).inc()
+        if not allowed:
+            THROTTLED_UPDATES.labels(key=throttling_key, source=source).inc()
             return None
-        self.cache[chat.id] = None
         return await handler(event, data)
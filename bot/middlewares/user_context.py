@@ -0,0 +1,29 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any
+
+from aiogram import BaseMiddleware
+
+from bot.services.users import get_user_context
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+    from aiogram.types import TelegramObject, User
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """Loads the sender's UserContext once per update and stores it in data["user_context"].
+
+    Auth, i18n, filters and handlers read it instead of querying the database or Redis one by one.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get("event_from_user")
+        if user is not None:
+            data["user_context"] = await get_user_context(data["session"], user.id)
+        return await handler(event, data)
@@ -5,6 +5,8 @@ from typing import TYPE_CHECKING, Any, TypeVar
 from aiogram.types import CallbackQuery, Message
 
 from bot.analytics.amplitude import AmplitudeTelegramLogger
+from bot.analytics.queue import AnalyticsQueue
+from bot.analytics.spill import SegmentSpill
 from bot.analytics.types import AbstractAnalyticsLogger, BaseEvent, EventProperties, EventType, UserProperties
 from bot.core.config import settings
 from bot.utils.singleton import SingletonMeta
@@ -104,4 +106,21 @@ class AnalyticsService(metaclass=SingletonMeta):
 
 logger = AmplitudeTelegramLogger(api_token=settings.AMPLITUDE_API_KEY) if settings.AMPLITUDE_API_KEY else None
 
-analytics = AnalyticsService(logger)
+# Handlers only enqueue events, the queue sends them in batches in the background
+analytics_queue = (
+    AnalyticsQueue(
+        logger,
+        max_size=settings.ANALYTICS_QUEUE_MAXSIZE,
+        batch_size=settings.ANALYTICS_BATCH_SIZE,
+        flush_interval=settings.ANALYTICS_FLUSH_INTERVAL,
+        overflow=settings.ANALYTICS_OVERFLOW,
+        spill=SegmentSpill(settings.ANALYTICS_SPILL_DIR, max_bytes=settings.ANALYTICS_SPILL_MAX_MB * 1024 * 1024)
+        if settings.ANALYTICS_SPILL_DIR
+        else None,
+        retry_max=settings.ANALYTICS_RETRY_MAX,
+    )
+    if logger
+    else None
+)
+
+analytics = AnalyticsService(analytics_queue)
@@ -1,17 +1,19 @@
-import json
 from typing import Any
 
-import aiohttp
+import orjson
 
 from bot.core.config import AUTH_URL, FP_URL
-
-timeout = aiohttp.ClientTimeout(total=60)
+from bot.services.upstream import RETRYABLE_STATUSES, edu_client
 
 
 class InvalidCredsError(Exception):
     """Ошибка неверных учетных данных."""
 
 
+class TokenExpiredError(InvalidCredsError):
+    """Access token отклонен API (401) - нужна повторная авторизация."""
+
+
 class ParseError(Exception):
     """Ошибка парсинга данных журнала."""
 
@@ -20,10 +22,10 @@ async def get_fingerprint() -> str:
     """
     Получение рандомного идентификатора пользователя.
     """
-    async with aiohttp.ClientSession(timeout=timeout) as session, session.get(FP_URL) as resp:
-        resp.raise_for_status()
-        fp_json = await resp.json()
-        return str(fp_json["data"]["randomIdentity"])
+    resp = await edu_client.request("fingerprint", "GET", FP_URL)
+    resp.raise_for_status()
+    fp_json = orjson.loads(resp.body)
+    return str(fp_json["data"]["randomIdentity"])
 
 
 async def auth_post(username: str, password: str, fingerprint: str) -> dict[str, Any]:
@@ -33,28 +35,32 @@ async def auth_post(username: str, password: str, fingerprint: str) -> dict[str,
         "password": password,
     }
 
-    async with aiohttp.ClientSession(timeout=timeout) as session, session.post(AUTH_URL, json=token_data) as resp:
-        if not resp.ok:
-            msg = f"Auth failed: status {resp.status}"
-            raise InvalidCredsError(msg)
-        try:
-            token_json = await resp.json()
-        except json.JSONDecodeError as e:
-            msg = "Invalid auth response"
-            raise InvalidCredsError(msg) from e
-        if "data" not in token_json or "accessToken" not in token_json["data"]:
-            msg = "No accessToken in auth response"
-            raise InvalidCredsError(msg)
-        return dict(token_json["data"])
+    resp = await edu_client.request("auth", "POST", AUTH_URL, json=token_data)
+    if resp.status in RETRYABLE_STATUSES:
+        # edu-tpi перегружен или лежит - это не ответ о неверном пароле
+        resp.raise_for_status()
+    http_bad_request = 400
+    if resp.status >= http_bad_request:
+        msg = f"Auth failed: status {resp.status}"
+        raise InvalidCredsError(msg)
+    try:
+        token_json = orjson.loads(resp.body)
+    except orjson.JSONDecodeError as e:
+        msg = "Invalid auth response"
+        raise InvalidCredsError(msg) from e
+    if "data" not in token_json or "accessToken" not in token_json["data"]:
+        msg = "No accessToken in auth response"
+        raise InvalidCredsError(msg)
+    return dict(token_json["data"])
 
 
 async def get_auth_data(access_token: str) -> dict[str, Any]:
     headers = {"Authorization": f"Bearer {access_token}"}
-    async with aiohttp.ClientSession(timeout=timeout) as session, session.get(AUTH_URL, headers=headers) as resp:
-        resp.raise_for_status()
-        try:
-            user_data = await resp.json()
-        except json.JSONDecodeError as e:
-            msg = "Invalid user data response"
-            raise ParseError(msg) from e
-        return dict(user_data.get("data"))
+    resp = await edu_client.request("user_info", "GET", AUTH_URL, headers=headers)
+    resp.raise_for_status()
+    try:
+        user_data = orjson.loads(resp.body)
+    except orjson.JSONDecodeError as e:
+        msg = "Invalid user data response"
+        raise ParseError(msg) from e
+    return dict(user_data.get("data"))
@@ -1,16 +1,24 @@
-from aiohttp.client_exceptions import ClientResponseError
+import asyncio
 
-from bot.services.api_client import InvalidCredsError, auth_post, get_fingerprint
+import aiohttp
+
+from bot.services.api_client import InvalidCredsError
+from bot.services.tokens import token_store
+
+
+class EduUnavailableError(Exception):
+    """edu-tpi не ответил (сеть, таймаут, 5xx или открытый circuit breaker) - учетные данные не проверены."""
 
 
 async def authenticate_user(username: str, password: str) -> str:
     """Авторизация пользователя с его edu credentials.
-    Возвращает access token пользователя
+    Возвращает access token пользователя или пустую строку, если данные неверны.
+    Если edu-tpi недоступен, поднимает EduUnavailableError.
     """
     try:
-        fingerprint = await get_fingerprint()
-
-        auth_data = await auth_post(username, password, fingerprint)
-        return str(auth_data.get("accessToken"))
-    except (InvalidCredsError, ClientResponseError):
+        token = await token_store.get_token(username, password)
+    except InvalidCredsError:
         return ""
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise EduUnavailableError(repr(e)) from e
+    return token.access_token
@@ -0,0 +1,216 @@
+from __future__ import annotations
+import asyncio
+import html
+from contextlib import suppress
+from datetime import datetime, time, timedelta
+from typing import TYPE_CHECKING
+from zoneinfo import ZoneInfo
+
+import prometheus_client
+from loguru import logger
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from bot.core.config import METRICS_PREFIX, settings
+from bot.core.loader import i18n, redis_client
+from bot.database.database import sessionmaker
+from bot.database.models import Grade, Journal, User
+from bot.database.models.notification import NotificationKind
+from bot.services.notifications import enqueue
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from redis.asyncio import Redis
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+DIGESTS_QUEUED = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_digests_queued",
+    documentation="Total morning digests put into the notification outbox.",
+)
+DIGEST_COHORT_SIZE = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_digest_cohort_size",
+    documentation="Histogram of users whose morning notification time falls on one minute.",
+    buckets=(0, 10, 50, 100, 500, 1000, 5000, 10000, 50000),
+)
+
+# Сколько пропущенных минут догонять после простоя или перезапуска
+MAX_CATCH_UP = timedelta(minutes=15)
+CLAIM_TTL = 2 * 24 * 3600
+
+
+def digest_text(journals: Sequence[tuple[str, list[str], float | None]], locale: str | None) -> str:
+    """Текст утренней сводки: (журнал, оценки по порядку, средний балл) на строку."""
+    lines = [
+        f"• {html.escape(name)}: <b>{html.escape(', '.join(values))}</b>"
+        + (f" ({average:.2f})" if average is not None else "")
+        for name, values, average in journals
+    ]
+    return "\n".join([i18n.gettext("notification.digest", locale=locale or None), *lines])
+
+
+class DigestScheduler:
+    """Утренние сводки оценок в выбранное пользователем время.
+
+    Каждую минуту (по `DIGEST_TIMEZONE`) выбирается только когорта пользователей с этим
+    morning_notification_time - по частичному индексу idx_morning_notification_time, страницами
+    по `page_size` в порядке id. Оценки за последние сутки для всей страницы собираются одним
+    агрегирующим запросом, готовые сводки уходят в outbox одной транзакцией на когорту. Минута
+    забирается через SET NX в Redis, поэтому при нескольких репликах каждая когорта обрабатывается
+    один раз; если обработка упала, минута отпускается, и ее повторит следующий проход.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = sessionmaker,
+        redis: Redis = redis_client,
+        *,
+        timezone: str = settings.DIGEST_TIMEZONE,
+        page_size: int = settings.DIGEST_PAGE_SIZE,
+    ) -> None:
+        self.session_factory = session_factory
+        self.redis = redis
+        self.timezone = ZoneInfo(timezone)
+        self.page_size = page_size
+
+        self._last_minute: datetime | None = None
+        self._runner: asyncio.Task[None] | None = None
+        self._stopping = asyncio.Event()
+
+    def start(self) -> None:
+        if self._runner is None or self._runner.done():
+            self._stopping.clear()
+            self._runner = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._runner is not None:
+            self._runner.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._runner
+            self._runner = None
+
+    async def run_forever(self) -> None:
+        logger.info("digest scheduler started")
+        while not self._stopping.is_set():
+            try:
+                await self.tick()
+            except Exception:  # noqa: BLE001
+                logger.exception("digest scheduler tick failed")
+            # Проснуться в начале следующей минуты
+            now = datetime.now(self.timezone)
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stopping.wait(), timeout=60 - now.second - now.microsecond / 1e6)
+        logger.info("digest scheduler stopped")
+
+    async def tick(self) -> int:
+        """Обработать текущую минуту и пропущенные с прошлого прохода. Возвращает число поставленных сводок."""
+        minute = datetime.now(self.timezone).replace(second=0, microsecond=0)
+        start = minute if self._last_minute is None else max(self._last_minute, minute - MAX_CATCH_UP)
+        queued = 0
+        while start <= minute:
+            if await self._claim(start):
+                try:
+                    queued += await self.send_cohort(start)
+                except BaseException:
+                    # Отпустить минуту, иначе ее когорта не получит сводку ни здесь, ни на другой реплике
+                    await self._release(start)
+                    raise
+            start += timedelta(minutes=1)
+        self._last_minute = minute + timedelta(minutes=1)
+        return queued
+
+    @staticmethod
+    def _claim_key(minute: datetime) -> str:
+        return f"digest:{minute:%Y-%m-%dT%H:%M}"
+
+    async def _claim(self, minute: datetime) -> bool:
+        return bool(await self.redis.set(self._claim_key(minute), 1, nx=True, ex=CLAIM_TTL))
+
+    async def _release(self, minute: datetime) -> None:
+        await asyncio.shield(self.redis.delete(self._claim_key(minute)))
+
+    async def send_cohort(self, minute: datetime) -> int:
+        """Поставить сводки всем пользователям, выбравшим это время."""
+        cohort = 0
+        queued = 0
+        last_id = 0
+        async with self.session_factory() as session:
+            while True:
+                page = await self.fetch_cohort(session, minute.time(), last_id)
+                if not page:
+                    break
+                cohort += len(page)
+                last_id = page[-1][0]
+
+                digests = await self.fetch_digests(session, [user_id for user_id, _ in page])
+                languages = dict(page)
+                queued += await enqueue(
+                    session,
+                    (
+                        (user_id, NotificationKind.DIGEST, digest_text(journals, languages[user_id]))
+                        for user_id, journals in digests.items()
+                    ),
+                )
+                if len(page) < self.page_size:
+                    break
+            # Одна транзакция на когорту: если отправка упадет, минута отпускается и повторяется без дублей
+            await session.commit()
+
+        DIGEST_COHORT_SIZE.observe(cohort)
+        DIGESTS_QUEUED.inc(queued)
+        if cohort:
+            logger.info(f"morning digests queued | minute: {minute:%H:%M} | users: {cohort} | digests: {queued}")
+        return queued
+
+    async def fetch_cohort(self, session: AsyncSession, at: time, after_id: int) -> list[tuple[int, str | None]]:
+        """Страница когорты (user_id, language_code) с id больше `after_id`."""
+        query = (
+            select(User.id, User.language_code)
+            .where(
+                # Само поле, а не IS TRUE: иначе планировщик не применит частичный индекс (WHERE enabled)
+                User.morning_notification_enabled,
+                User.morning_notification_time == at,
+                User.is_authenticated.is_(True),
+                User.id > after_id,
+            )
+            .order_by(User.id)
+            .limit(self.page_size)
+        )
+        result = await session.execute(query)
+        return list(result.tuples())
+
+    async def fetch_digests(
+        self,
+        session: AsyncSession,
+        user_ids: list[int],
+    ) -> dict[int, list[tuple[str, list[str], float | None]]]:
+        """Оценки за последние сутки, сгруппированные по пользователям и журналам, - одним запросом на страницу."""
+        query = (
+            select(
+                Grade.user_id,
+                Journal.name,
+                func.array_agg(aggregate_order_by(Grade.value, Grade.date, Grade.hour_number)),
+                func.avg(Grade.number_value),
+            )
+            .join(Journal, Journal.id == Grade.journal_id)
+            .where(
+                Grade.user_id.in_(user_ids),
+                # updated_at ставит сама БД (TIMEZONE('utc+3', now())), сравнение тоже на ее стороне
+                Grade.updated_at >= text("TIMEZONE('utc+3', now()) - interval '1 day'"),
+                Grade.value != "",
+            )
+            .group_by(Grade.user_id, Journal.name)
+            .order_by(Grade.user_id, Journal.name)
+        )
+        result = await session.execute(query)
+
+        digests: dict[int, list[tuple[str, list[str], float | None]]] = {}
+        for user_id, name, values, average in result.tuples():
+            digests.setdefault(user_id, []).append(
+                (name, list(values), float(average) if average is not None else None)
+            )
+        return digests
+
+
+digest_scheduler = DigestScheduler()
@@ -1,7 +1,10 @@
 from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import date
 from typing import TYPE_CHECKING, Any
 
-from sqlalchemy import Float, select
+from sqlalchemy import Float, delete, select, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import func
 
@@ -12,6 +15,103 @@ if TYPE_CHECKING:
 
     from sqlalchemy.ext.asyncio import AsyncSession
 
+GRADE_VALUE_MAX_LENGTH = 2
+# 10 параметров на строку: 1000 строк укладываются в лимит asyncpg в 32767 параметров
+BULK_BATCH_SIZE = 1000
+
+# Сохраненная оценка: id -> (journal_id, date, hour_number, value, is_mark, is_pass)
+StoredGrade = tuple[int, date, int, str, bool, bool]
+
+
+def grade_number_value(value: str) -> int | None:
+    """Числовое значение оценки, если оно есть ("5" -> 5, "н" -> None)."""
+    return int(value) if value.isdigit() else None
+
+
+def grade_row(user_id: int, journal_id: int, grade: dict[str, Any]) -> dict[str, Any]:
+    """Строка таблицы grades из оценки в формате `JournalParser.parse_grades`."""
+    value = str(grade["value"])[:GRADE_VALUE_MAX_LENGTH]
+    return {
+        "id": int(grade["lesson_id"]),
+        "user_id": user_id,
+        "journal_id": journal_id,
+        "date": date.fromisoformat(grade["date"]),
+        "hour_number": int(grade["hour"]),
+        "value": value,
+        "number_value": grade_number_value(value),
+        "is_mark": bool(grade["is_mark"]),
+        "is_pass": bool(grade["is_pass"]),
+        "is_valid_pass": False,
+    }
+
+
+def _parsed_since(parsed_data: list[dict[str, Any]]) -> dict[int, date]:
+    """С какой даты разобран каждый журнал: journal_id -> 'since' (самая ранняя, если журнал пришел дважды)."""
+    covered: dict[int, date] = {}
+    for item in parsed_data:
+        if item.get("since"):
+            journal_id = int(item["journal"]["code"])
+            since = date.fromisoformat(item["since"])
+            covered[journal_id] = min(since, covered.get(journal_id, since))
+    return covered
+
+
+@dataclass(slots=True)
+class GradesDiff:
+    """Что нужно записать, чтобы сохраненные оценки совпали с разобранными."""
+
+    rows: list[dict[str, Any]] = field(default_factory=list)  # новые и измененные строки для upsert
+    stale: list[int] = field(default_factory=list)  # id строк на удаление: занятие удалено или перенесено
+    notify: list[dict[str, Any]] = field(default_factory=list)  # строки с новым или измененным значением
+    new_count: int = 0
+    updated_count: int = 0
+
+
+def diff_grades(user_id: int, parsed_data: list[dict[str, Any]], existing: dict[int, StoredGrade]) -> GradesDiff:
+    """
+    Сравнить результат `JournalParser.parse_grades` с сохраненными оценками по id занятия (dateID).
+    Занятие, перенесенное на другую дату или пару, удаляется и вставляется заново: иначе оно могло бы
+    занять слот, который в той же пачке освобождает другое занятие. Сохраненные занятия, которых больше
+    нет в журнале, удаляются - но только с даты 'since' журнала, раньше парсер их не разбирал.
+    Удаленные и перенесенные оценки считаются измененными.
+    """
+    diff = GradesDiff()
+    seen: set[int] = set()
+    slots: set[tuple[int, date, int]] = set()
+    for item in parsed_data:
+        journal_id = int(item["journal"]["code"])
+        for grade in item["grades"]:
+            row = grade_row(user_id, journal_id, grade)
+            slot = (journal_id, row["date"], row["hour_number"])
+            # Один журнал может прийти в обоих семестрах: ON CONFLICT не обновит строку дважды за запрос
+            if row["id"] in seen or slot in slots:
+                continue
+            seen.add(row["id"])
+            slots.add(slot)
+
+            values = (row["value"], row["is_mark"], row["is_pass"])
+            stored = existing.get(row["id"])
+            if stored is None:
+                diff.new_count += 1
+            elif stored[:3] != slot:
+                diff.stale.append(row["id"])
+                diff.updated_count += 1
+            elif stored[3:] != values:
+                diff.updated_count += 1
+            else:
+                continue
+            diff.rows.append(row)
+            if stored is None or stored[3:] != values:
+                diff.notify.append(row)
+
+    covered = _parsed_since(parsed_data)
+    for grade_id, (journal_id, grade_date, *_) in existing.items():
+        since = covered.get(journal_id)
+        if grade_id not in seen and since is not None and grade_date >= since:
+            diff.stale.append(grade_id)
+            diff.updated_count += 1
+    return diff
+
 
 class GradesService:
     """Сервис для работы с оценками (Grades)."""
@@ -25,6 +125,7 @@ class GradesService:
         journal_id: int,
         date: datetime,
         value: str,
+        hour_number: int = 1,
         number_value: int | None = None,
         is_mark: bool = False,
         is_pass: bool = False,
@@ -36,6 +137,7 @@ class GradesService:
             user_id=user_id,
             journal_id=journal_id,
             date=date,
+            hour_number=hour_number,
             value=value,
             number_value=number_value,
             is_mark=is_mark,
@@ -47,6 +149,88 @@ class GradesService:
         await session.refresh(grade)
         return grade
 
+    @classmethod
+    async def sync_bulk(
+        cls,
+        session: AsyncSession,
+        user_id: int,
+        parsed_data: list[dict[str, Any]],
+        batch_size: int = BULK_BATCH_SIZE,
+        changes: list[dict[str, Any]] | None = None,
+    ) -> tuple[int, int]:
+        """
+        Сохранить результат `JournalParser.parse_grades` пачками `INSERT ... ON CONFLICT DO UPDATE`.
+        Сравнивает с уже сохраненными оценками по id занятия (см. `diff_grades`), удаляет удаленные
+        и перенесенные занятия и пишет только новые и измененные строки. Без commit.
+        Возвращает (новых, измененных) оценок. Если передан `changes`, в него добавляются строки
+        с новым или измененным значением (для уведомлений).
+        """
+        journal_ids = [int(item["journal"]["code"]) for item in parsed_data]
+        if not journal_ids:
+            return 0, 0
+
+        query = select(
+            Grade.id,
+            Grade.journal_id,
+            Grade.date,
+            Grade.hour_number,
+            Grade.value,
+            Grade.is_mark,
+            Grade.is_pass,
+        ).filter(Grade.user_id == user_id, Grade.journal_id.in_(journal_ids))
+        result = await session.execute(query)
+        existing: dict[int, StoredGrade] = {
+            grade_id: (journal_id, grade_date, hour, value, is_mark, is_pass)
+            for grade_id, journal_id, grade_date, hour, value, is_mark, is_pass in result.tuples()
+        }
+
+        diff = diff_grades(user_id, parsed_data, existing)
+        if changes is not None:
+            changes.extend(diff.notify)
+
+        # Сначала удаление: перенесенное занятие вставится заново, а его старый слот освободится
+        for start in range(0, len(diff.stale), batch_size):
+            stale = diff.stale[start : start + batch_size]
+            await session.execute(delete(Grade).where(Grade.user_id == user_id, Grade.id.in_(stale)))
+
+        for start in range(0, len(diff.rows), batch_size):
+            stmt = insert(Grade).values(diff.rows[start : start + batch_size])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Grade.id, Grade.user_id],
+                set_={
+                    # Занятие с тем же id в журнале, который сейчас не синхронизировался, переезжает целиком
+                    "journal_id": stmt.excluded.journal_id,
+                    "date": stmt.excluded.date,
+                    "hour_number": stmt.excluded.hour_number,
+                    "value": stmt.excluded.value,
+                    "number_value": stmt.excluded.number_value,
+                    "is_mark": stmt.excluded.is_mark,
+                    "is_pass": stmt.excluded.is_pass,
+                    "updated_at": text("TIMEZONE('utc+3', now())"),
+                },
+            )
+            await session.execute(stmt)
+
+        return diff.new_count, diff.updated_count
+
+    @classmethod
+    async def last_dates(
+        cls,
+        session: AsyncSession,
+        user_ids: list[int],
+    ) -> dict[int, dict[str, date]]:
+        """Дата последней сохраненной оценки в каждом журнале пользователей: user_id -> {journal code -> дата}."""
+        query = (
+            select(Grade.user_id, Grade.journal_id, func.max(Grade.date))
+            .filter(Grade.user_id.in_(user_ids))
+            .group_by(Grade.user_id, Grade.journal_id)
+        )
+        result = await session.execute(query)
+        last_dates: dict[int, dict[str, date]] = {user_id: {} for user_id in user_ids}
+        for user_id, journal_id, last_date in result.tuples():
+            last_dates[user_id][str(journal_id)] = last_date
+        return last_dates
+
     @classmethod
     async def get_by_journal(
         cls,
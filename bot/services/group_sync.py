@@ -0,0 +1,107 @@
+from __future__ import annotations
+from collections import defaultdict
+from typing import TYPE_CHECKING
+
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from bot.database.models import User
+from bot.database.models.sync_log import SyncStatus, SyncType
+from bot.services.journal_hash import journal_hashes
+from bot.services.journal_parser import GroupStudent, JournalParser
+from bot.services.sync import SyncResult, apply_parsed, error_result, record_sync, sync_windows
+from bot.services.users import get_edu_credentials_many
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+# Общая синхронизация имеет смысл, только если журналы группы нужны хотя бы двоим
+MIN_GROUP_SIZE = 2
+
+
+def plan_group_syncs(users: Iterable[tuple[int, int | None]], min_group_size: int = MIN_GROUP_SIZE) -> list[list[int]]:
+    """
+    Разбить пользователей на синхронизации. users - пары (user_id, group_id).
+    Пользователи одной группы синхронизируются вместе, пользователи без группы - по одному.
+    """
+    plan: list[list[int]] = []
+    groups: dict[int, list[int]] = defaultdict(list)
+    for user_id, group_id in users:
+        if group_id is None:
+            plan.append([user_id])
+        else:
+            groups[group_id].append(user_id)
+
+    for members in groups.values():
+        if len(members) >= min_group_size:
+            plan.append(members)
+        else:
+            plan.extend([user_id] for user_id in members)
+    return plan
+
+
+async def sync_group(
+    session: AsyncSession,
+    user_ids: list[int],
+    sync_type: SyncType = SyncType.AUTO,
+    parser: JournalParser | None = None,
+    *,
+    full: bool = True,
+) -> list[SyncResult]:
+    """
+    Синхронизировать оценки пользователей одной группы: каждый журнал группы загружается один раз
+    и раздается всем ее участникам. Результат и лог синхронизации у каждого пользователя свои.
+    full=False - инкрементальная синхронизация для тех, кто уже синхронизировался (см. `sync_windows`).
+    """
+    parser = parser or JournalParser()
+    windows = {} if full else await sync_windows(session, user_ids)
+
+    query = select(User.id, User.edu_user_id, User.full_name).where(User.id.in_(user_ids))
+    result = await session.execute(query)
+    profiles = {user_id: (edu_user_id, full_name) for user_id, edu_user_id, full_name in result.tuples()}
+
+    credentials = await get_edu_credentials_many(session, user_ids)
+
+    results: dict[int, SyncResult] = {}
+    ready: list[tuple[int, str, str]] = []
+    for user_id in user_ids:
+        username, password = credentials.get(user_id, (None, None))
+        if not username or not password or user_id not in profiles:
+            results[user_id] = SyncResult(user_id=user_id, status=SyncStatus.FAILED, message="No edu credentials")
+        else:
+            ready.append((user_id, username, password))
+
+    known_hashes = await journal_hashes.load_many([user_id for user_id, _, _ in ready])
+    students: list[GroupStudent] = []
+    for user_id, username, password in ready:
+        edu_user_id, full_name = profiles[user_id]
+        students.append(
+            GroupStudent(
+                user_id=user_id,
+                username=username,
+                password=password,
+                edu_user_id=edu_user_id,
+                full_name=full_name,
+                known_hashes=known_hashes[user_id],
+                window=windows.get(user_id),
+            )
+        )
+
+    parsed = await parser.parse_group_grades(students) if students else {}
+    for user_id, parsed_data in parsed.items():
+        if isinstance(parsed_data, Exception):
+            results[user_id] = error_result(user_id, parsed_data)
+            continue
+        # Ошибка записи одного участника не должна лишать остальных их оценок и лога синхронизации
+        try:
+            results[user_id] = await apply_parsed(session, user_id, parsed_data, full=windows.get(user_id) is None)
+        except (SQLAlchemyError, RedisError) as e:
+            await session.rollback()
+            results[user_id] = error_result(user_id, e)
+
+    for user_id in user_ids:
+        await record_sync(session, results[user_id], sync_type, full=windows.get(user_id) is None)
+    return [results[user_id] for user_id in user_ids]
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import aiohttp
+from loguru import logger
+
+from bot.core.config import settings
+
+_session: aiohttp.ClientSession | None = None
+
+
+def _create_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=settings.EDU_HTTP_POOL_SIZE,
+        limit_per_host=settings.EDU_HTTP_POOL_PER_HOST,
+        ttl_dns_cache=settings.EDU_HTTP_DNS_TTL,
+        keepalive_timeout=settings.EDU_HTTP_KEEPALIVE,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=settings.EDU_HTTP_TIMEOUT),
+    )
+
+
+async def setup_http_session() -> aiohttp.ClientSession:
+    """Create the process-wide HTTP session for edu-tpi traffic."""
+    global _session  # noqa: PLW0603
+    if _session is None or _session.closed:
+        _session = _create_session()
+        logger.info("edu-tpi http session created")
+    return _session
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the shared HTTP session, creating it on first use outside of the bot lifecycle (scripts)."""
+    global _session  # noqa: PLW0603
+    if _session is None or _session.closed:
+        _session = _create_session()
+    return _session
+
+
+async def close_http_session() -> None:
+    """Close the shared HTTP session and its connection pool."""
+    global _session  # noqa: PLW0603
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("edu-tpi http session closed")
+    _session = None
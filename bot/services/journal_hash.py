@@ -0,0 +1,81 @@
+from __future__ import annotations
+import hashlib
+from typing import TYPE_CHECKING, Any, cast
+
+import orjson
+import prometheus_client
+
+from bot.core.config import METRICS_PREFIX, settings
+from bot.core.loader import redis_client
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+    from redis.typing import EncodableT, FieldT
+
+JOURNAL_HASH_LOOKUPS = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_journal_hash_lookups",
+    documentation="Journal content hash checks during sync by result (hit - parsing and DB writes skipped).",
+    labelnames=["result"],
+)
+
+
+def journal_content_hash(data: dict[str, Any], student_row: dict[str, Any]) -> str:
+    """Стабильный хэш всего, что влияет на оценки студента в журнале: его строки, дат и справочника значений."""
+    payload = orjson.dumps(
+        [student_row, data.get("journalDates", []), data.get("journalVal", [])],
+        option=orjson.OPT_SORT_KEYS,
+    )
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+class JournalHashStore:
+    """Хэши содержимого журналов пользователя в Redis: journal_id -> хэш последней сохраненной версии."""
+
+    def __init__(
+        self,
+        redis: Redis = redis_client,
+        namespace: str = "journal_hash",
+        ttl: int = settings.SYNC_HASH_TTL,
+    ) -> None:
+        self.redis = redis
+        self.namespace = namespace
+        # TTL ограничивает срок, в течение которого журнал может не перечитываться полностью:
+        # через ttl после первой записи все хэши пользователя сбрасываются разом (Redis 7+, EXPIRE NX)
+        self.ttl = ttl
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.namespace}:{user_id}"
+
+    async def load(self, user_id: int) -> dict[str, str]:
+        raw = cast("dict[bytes, bytes]", await self.redis.hgetall(self._key(user_id)))
+        return _decode(raw)
+
+    async def load_many(self, user_ids: list[int]) -> dict[int, dict[str, str]]:
+        """Хэши нескольких пользователей за один round trip."""
+        if not user_ids:
+            return {}
+        async with self.redis.pipeline(transaction=False) as pipeline:
+            for user_id in user_ids:
+                pipeline.hgetall(self._key(user_id))
+            replies: list[dict[bytes, bytes]] = await pipeline.execute()
+        return {user_id: _decode(raw) for user_id, raw in zip(user_ids, replies, strict=True)}
+
+    async def save(self, user_id: int, hashes: dict[str, str]) -> None:
+        if not hashes:
+            return
+        key = self._key(user_id)
+        async with self.redis.pipeline(transaction=False) as pipeline:
+            pipeline.hset(key, mapping=cast("dict[FieldT, EncodableT]", hashes))
+            # Срок ставится только новому ключу: продление на каждом save не дало бы истечь ни одному хэшу
+            pipeline.expire(key, self.ttl, nx=True)
+            await pipeline.execute()
+
+    async def clear(self, user_id: int) -> None:
+        await self.redis.delete(self._key(user_id))
+
+
+def _decode(raw: dict[bytes, bytes]) -> dict[str, str]:
+    return {journal_id.decode(): digest.decode() for journal_id, digest in raw.items()}
+
+
+journal_hashes = JournalHashStore()
@@ -1,18 +1,108 @@
 from __future__ import annotations
 import asyncio
-import json
+from dataclasses import dataclass, field
 from datetime import date, datetime, timedelta, timezone
 from typing import Any
 
 import aiohttp
-
-
-class InvalidCredsError(Exception):
-    """Ошибка неверных учетных данных."""
-
-
-class ParseError(Exception):
-    """Ошибка парсинга данных журнала."""
+import orjson
+import prometheus_client
+from loguru import logger
+
+from bot.core.config import METRICS_PREFIX, settings
+from bot.services.api_client import InvalidCredsError, ParseError, TokenExpiredError
+from bot.services.journal_hash import JOURNAL_HASH_LOOKUPS, journal_content_hash
+from bot.services.journal_view import CompiledJournal, decode_journal, parse_journal_date
+from bot.services.tokens import token_store
+from bot.services.upstream import edu_client
+from bot.utils.rate_limit import TokenBucket
+
+# Общий для всего процесса лимит запросов к edu-tpi, независимо от количества пользователей
+edu_rate_limiter = TokenBucket(rate=settings.EDU_RATE_LIMIT, capacity=settings.EDU_RATE_BURST)
+
+GROUP_JOURNAL_ROWS = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_group_journal_rows",
+    documentation="Journal rows resolved during group sync by source (shared - taken from one group-wide fetch).",
+    labelnames=["source"],
+)
+
+__all__ = [
+    "GroupStudent",
+    "InvalidCredsError",
+    "JournalParser",
+    "ParseError",
+    "PollCost",
+    "SyncWindow",
+    "WatchState",
+    "academic_term",
+    "edu_rate_limiter",
+]
+
+HTTP_NOT_MODIFIED = 304
+# Ошибки загрузки и разбора одного журнала при синхронизации группы: достаются только его читателям
+JOURNAL_ERRORS = (
+    InvalidCredsError,
+    ParseError,
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+    orjson.JSONDecodeError,
+    KeyError,
+    TypeError,
+    ValueError,
+)
+SEPTEMBER = 9
+
+
+def academic_term(now: datetime) -> tuple[str, int]:
+    """Учебный год ("2025-2026") и семестр на дату. Январь (сессия) относится к первому семестру."""
+    year = f"{now.year}-{now.year + 1}" if now.month >= SEPTEMBER else f"{now.year - 1}-{now.year}"
+    return year, 1 if now.month >= SEPTEMBER or now.month == 1 else 2
+
+
+@dataclass(slots=True)
+class SyncWindow:
+    """
+    Окно инкрементальной синхронизации: загружаются только журналы текущего семестра, и в каждом
+    разбираются занятия не раньше его отметки. Журналы без отметки разбираются целиком.
+    """
+
+    since: dict[str, date] = field(default_factory=dict)  # journal code -> первая разбираемая дата
+
+    def cutoff(self, code: str) -> date | None:
+        return self.since.get(code)
+
+
+@dataclass(slots=True)
+class GroupStudent:
+    """Студент группы для общей загрузки журналов."""
+
+    user_id: int
+    username: str
+    password: str
+    edu_user_id: int | None = None
+    full_name: str | None = None
+    known_hashes: dict[str, str] = field(default_factory=dict)
+    window: SyncWindow | None = None
+
+
+@dataclass(slots=True)
+class WatchState:
+    """Что опрос в режиме наблюдения помнит между проходами: журналы семестра, их ETag и хэши содержимого."""
+
+    journals: list[dict[str, Any]] | None = None
+    listed_at: float = 0.0
+    etags: dict[str, str] = field(default_factory=dict)
+    hashes: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class PollCost:
+    """Стоимость одного опроса: запросы к edu-tpi, загруженные байты и журналы, которые не пришлось разбирать."""
+
+    requests: int = 0
+    downloaded: int = 0
+    not_modified: int = 0
+    unchanged: int = 0
 
 
 class JournalParser:
@@ -24,10 +114,19 @@ class JournalParser:
     JOURNALS_URL = f"{BASE_URL}/api/Journals/JournalList"
     JOURNAL_URL = f"{BASE_URL}/api/Journals/Journal"
 
+    LESSONS_DAYS = 730
+
+    def __init__(
+        self,
+        concurrency: int = settings.EDU_CONCURRENCY,
+        rate_limiter: TokenBucket | None = None,
+    ) -> None:
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter or edu_rate_limiter
+
     def parse_iso_date(self, s: str) -> date:
         """Парсит ISO дату из journalDates."""
-        s = s.replace("T000000", "T00:00:00")
-        return datetime.fromisoformat(s).date()
+        return parse_journal_date(s)
 
     def find_student_row(
         self,
@@ -55,197 +154,542 @@ class JournalParser:
 
     def get_student_lessons_last_days_from_journal(
         self,
-        journal_json: dict[str, Any],
+        journal_json: dict[str, Any] | CompiledJournal,
         *,
-        days: int = 730,
+        days: int = LESSONS_DAYS,
         student_id: int | None = None,
         fio: str | None = None,
         full_name: str | None = None,
     ) -> list[dict[str, Any]]:
         """
         Парсит занятия студента из одного журнала за последние `days` дней.
-        Возвращает list[dict] {lesson_date:date, hour_number:int, display_value:str, kind:str}.
+        Принимает ответ API или уже собранный CompiledJournal.
+        Возвращает list[dict] {lesson_date:date, hour_number:int, date_id:int, display_value:str, kind:str,
+        is_mark:bool, is_pass:bool}.
         """
-        data = journal_json["data"]
+        journal = journal_json if isinstance(journal_json, CompiledJournal) else CompiledJournal.from_json(journal_json)
+        student_row = journal.find_row(student_id=student_id, fio=fio, full_name=full_name)
 
-        journal_vals: list[dict[str, Any]] = data["journalVal"]
-        journal_data: list[dict[str, Any]] = data["journalData"]
-        journal_dates: list[dict[str, Any]] = data["journalDates"]
+        cutoff = datetime.now(timezone.utc).date() - timedelta(days=days)
+        return journal.lessons(student_row, since=cutoff)
 
-        val_by_id: dict[int, dict[str, Any]] = {
-            int(v["id"]): v
-            for v in journal_vals  # id значения -> объект значения
+    async def _get_bytes(
+        self,
+        url: str,
+        params: dict[str, str],
+        headers: dict[str, str],
+        semaphore: asyncio.Semaphore,
+    ) -> bytes:
+        """GET-запрос к API с учетом лимита параллельности и общего rate limit. Возвращает тело ответа."""
+        body, _ = await self._get_if_modified(url, params, headers, semaphore, None)
+        return body or b""
+
+    async def _get_if_modified(
+        self,
+        url: str,
+        params: dict[str, str],
+        headers: dict[str, str],
+        semaphore: asyncio.Semaphore,
+        etag: str | None,
+    ) -> tuple[bytes | None, str | None]:
+        """
+        Условный GET с If-None-Match. Возвращает (тело или None при 304, ETag ответа).
+        Повторы, дедлайн, circuit breaker и адаптивный лимит параллельности - в `edu_client`;
+        общий rate limit берется на каждую попытку, включая повторы.
+        """
+        http_unauthorized = 401
+        if etag:
+            headers = {**headers, "If-None-Match": etag}
+        endpoint = "journal_list" if url == self.JOURNALS_URL else "journal"
+        async with semaphore:
+            resp = await edu_client.request(
+                endpoint, "GET", url, rate_limiter=self.rate_limiter, params=params, headers=headers
+            )
+        if resp.status == http_unauthorized:
+            msg = "Invalid token"
+            raise TokenExpiredError(msg)
+        if resp.status == HTTP_NOT_MODIFIED:
+            return None, etag
+        resp.raise_for_status()
+        return resp.body, resp.headers.get("ETag")
+
+    async def _get_json(
+        self,
+        url: str,
+        params: dict[str, str],
+        headers: dict[str, str],
+        semaphore: asyncio.Semaphore,
+    ) -> dict[str, Any]:
+        """GET-запрос к API, ответ декодируется через orjson."""
+        return dict(orjson.loads(await self._get_bytes(url, params, headers, semaphore)))
+
+    async def _fetch_journal_list(
+        self,
+        headers: dict[str, str],
+        year: str,
+        sem: int,
+        semaphore: asyncio.Semaphore,
+    ) -> list[dict[str, Any]]:
+        """Получить список журналов студента за семестр."""
+        params = {
+            "prepID": "undefined",
+            "groupID": "undefined",
+            "typeJournal": "1",
+            "year": year,
+            "sem": str(sem),
         }
+        journals_json = await self._get_json(self.JOURNALS_URL, params, headers, semaphore)
+        return list(journals_json["data"]["returnList"])
 
-        student_row = self.find_student_row(
-            journal_data,
-            student_id=student_id,
-            fio=fio,
-            full_name=full_name,
+    async def _fetch_journal_lists(
+        self,
+        headers: dict[str, str],
+        semaphore: asyncio.Semaphore,
+        *,
+        current_only: bool = False,
+    ) -> list[dict[str, Any]]:
+        """Получить журналы студента за оба семестра текущего учебного года (или только за текущий семестр)."""
+        year, current = academic_term(datetime.now(timezone.utc))
+
+        journal_lists = await asyncio.gather(
+            *(
+                self._fetch_journal_list(headers, year, sem, semaphore)
+                for sem in ([current] if current_only else [1, 2])
+            ),
         )
+        return [j for journal_list in journal_lists for j in journal_list]
 
-        today = datetime.now(timezone.utc).date()
-        cutoff = today - timedelta(days=days)
+    def _journal_info(self, j: dict[str, Any], data: dict[str, Any]) -> dict[str, str] | None:
+        """Код, название и преподаватель журнала. None, если у журнала нет дисциплины."""
+        info = data.get("journalInfo", {})
+        discipline = (info.get("dis") or j.get("dis") or "").strip()
+        teacher_name = (info.get("teacherName") or j.get("prepodName") or "").strip()
 
-        lessons: list[dict[str, Any]] = []
+        if not discipline:
+            return None
 
-        for jd in journal_dates:
-            d = self.parse_iso_date(jd["date"])
-            if d < cutoff:
-                continue
+        return {
+            "code": str(int(j["id"])),
+            "name": discipline,
+            "teacher": teacher_name,
+        }
 
-            date_id = jd["dateID"]
-            key = str(date_id)
-            raw_cell = student_row.get(key)
-            if raw_cell is None:
-                continue
+    def _student_grades(  # noqa: PLR0913
+        self,
+        journal: dict[str, str],
+        data: dict[str, Any],
+        compiled: CompiledJournal,
+        student_row: dict[str, Any],
+        known_hashes: dict[str, str],
+        since: date | None = None,
+    ) -> dict[str, Any]:
+        """
+        Оценки студента из журнала с даты `since` (по умолчанию за LESSONS_DAYS дней).
+        Журнал без оценок в окне тоже возвращается: по его 'since' удаляются занятия, пропавшие из журнала.
+        """
+        content_hash = journal_content_hash(data, student_row)
+        if known_hashes.get(journal["code"]) == content_hash:
+            JOURNAL_HASH_LOOKUPS.labels(result="hit").inc()
+            return {"journal": journal, "grades": [], "hash": content_hash, "unchanged": True}
+        JOURNAL_HASH_LOOKUPS.labels(result="miss").inc()
+
+        cutoff = since or datetime.now(timezone.utc).date() - timedelta(days=self.LESSONS_DAYS)
+        lessons = compiled.lessons(student_row, since=cutoff)
+
+        grades = [
+            {
+                "date": lesson["lesson_date"].isoformat(),
+                "hour": lesson["hour_number"],
+                "lesson_id": lesson["date_id"],
+                "value": lesson["display_value"],
+                "type": lesson["kind"],
+                "is_mark": lesson["is_mark"],
+                "is_pass": lesson["is_pass"],
+                "comment": "",
+            }
+            for lesson in lessons
+        ]
+
+        # since - с какой даты разобран журнал: сохраненные занятия после нее, которых нет в grades, удалены
+        return {
+            "journal": journal,
+            "grades": grades,
+            "hash": content_hash,
+            "unchanged": False,
+            "since": cutoff.isoformat(),
+        }
 
-            try:
-                value_id = int(raw_cell)
-            except (TypeError, ValueError):
-                continue
+    async def _fetch_journal(
+        self,
+        headers: dict[str, str],
+        j: dict[str, Any],
+        semaphore: asyncio.Semaphore,
+        known_hashes: dict[str, str],
+        window: SyncWindow | None = None,
+    ) -> dict[str, Any] | None:
+        """
+        Загрузить и распарсить один журнал. Возвращает None, если журнал пустой или без дисциплины.
+        Если хэш содержимого совпал с `known_hashes`, журнал не парсится и помечается 'unchanged'.
+        """
+        j_params = {"journalID": str(int(j["id"]))}
+        raw = await self._get_bytes(self.JOURNAL_URL, j_params, headers, semaphore)
 
-            val_obj = val_by_id.get(value_id)
-            if val_obj is None:
-                continue
+        # Из матрицы всей группы оставляем только строку студента (первую)
+        data = decode_journal(raw)
+        del raw
+        if not data:
+            return None
 
-            is_mark = bool(val_obj.get("isMark"))
-            is_pass = bool(val_obj.get("isPass"))
+        journal = self._journal_info(j, data)
+        if journal is None:
+            return None
 
-            kind = "оценка" if is_mark else "посещаемость" if is_pass else ""
+        # Даты и значения разбираются один раз - и для хэша, и для парсинга
+        compiled = CompiledJournal(data)
+        student_row = compiled.find_row()  # строка студента (первая)
 
-            display_value = val_obj.get("value") or ""
+        since = window.cutoff(journal["code"]) if window else None
+        return self._student_grades(journal, data, compiled, student_row, known_hashes, since)
 
-            lessons.append(
-                {
-                    "lesson_date": d,
-                    "hour_number": int(jd["hourNumber"]),
-                    "display_value": display_value,
-                    "kind": kind,
-                }
-            )
+    async def _auth_headers(self, username: str, password: str) -> dict[str, str]:
+        token = await token_store.get_token(username, password)
+        return {"Authorization": f"Bearer {token.access_token}"}
 
-        lessons.sort(key=lambda x: (x["lesson_date"], x["hour_number"]))
-        return lessons
+    async def _parse_with_token(
+        self,
+        username: str,
+        password: str,
+        known_hashes: dict[str, str],
+        window: SyncWindow | None,
+    ) -> list[dict[str, Any] | None]:
+        """Загрузить все журналы студента с токеном из кэша."""
+        headers = await self._auth_headers(username, password)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        journals = await self._fetch_journal_lists(headers, semaphore, current_only=window is not None)
+
+        return await asyncio.gather(
+            *(self._fetch_journal(headers, j, semaphore, known_hashes, window) for j in journals)
+        )
 
-    async def parse_grades(self, username: str, password: str) -> list[dict[str, Any]]:  # noqa: C901, PLR0915
+    async def parse_grades(
+        self,
+        username: str,
+        password: str,
+        *,
+        known_hashes: dict[str, str] | None = None,
+        window: SyncWindow | None = None,
+    ) -> list[dict[str, Any]]:
         """
         Парсит оценки: list[{'journal': {'code': str, 'name': str, 'teacher': str},
-                             'grades': [{'date': str (iso), 'value': str, 'type': str, 'comment': str}]}]
+                             'grades': [{'date': str (iso), 'hour': int, 'lesson_id': int, 'value': str,
+                                         'type': str, 'is_mark': bool, 'is_pass': bool, 'comment': str}],
+                             'hash': str, 'unchanged': bool, 'since': str (iso)}]
+
+        known_hashes - хэши журналов с прошлой синхронизации (journal code -> hash). Журналы с тем же
+        содержимым не парсятся: приходят с 'unchanged': True и пустым 'grades'. 'since' - первая
+        разобранная дата журнала.
+
+        window - инкрементальная синхронизация (см. `SyncWindow`): только текущий семестр и только
+        занятия после отметки журнала. Пустой результат в этом режиме - не ошибка.
+
+        Списки журналов обоих семестров и сами журналы загружаются параллельно,
+        не более `concurrency` запросов одновременно и в рамках общего для процесса rate limit.
+        Access token берется из кэша и обновляется, только если API ответил 401.
         """
-        timeout = aiohttp.ClientTimeout(total=60)
+        known_hashes = known_hashes or {}
+        try:
+            results = await self._parse_with_token(username, password, known_hashes, window)
+        except TokenExpiredError:
+            # Токен из кэша отозван раньше срока - авторизуемся заново один раз
+            await token_store.invalidate(username, password)
+            results = await self._parse_with_token(username, password, known_hashes, window)
 
-        # Получить fingerprint
-        async with aiohttp.ClientSession(timeout=timeout) as session, session.get(self.FP_URL) as resp:
-            resp.raise_for_status()
-            fp_json = await resp.json()
-            fp = fp_json["data"]["randomIdentity"]
+        parsed_data = [result for result in results if result is not None]
 
-        # Получить token
-        token_data = {
-            "fingerprint": fp,
-            "userName": username,
-            "password": password,
-        }
-        http_ok = 200
-        async with aiohttp.ClientSession(timeout=timeout) as session:  # noqa: SIM117
-            async with session.post(self.AUTH_URL, json=token_data) as resp:
-                if resp.status != http_ok:
-                    msg = f"Auth failed: status {resp.status}"
-                    raise InvalidCredsError(msg)
-                try:
-                    token_json = await resp.json()
-                except json.JSONDecodeError as e:
-                    msg = "Invalid auth response"
-                    raise InvalidCredsError(msg) from e
-                if "data" not in token_json or "accessToken" not in token_json["data"]:
-                    msg = "No accessToken in auth response"
-                    raise InvalidCredsError(msg)
-                token = token_json["data"]["accessToken"]
-
-        headers = {"Authorization": f"Bearer {token}"}
-        async with aiohttp.ClientSession(
-            headers=headers,
-            timeout=timeout,  # Client с токеном
-        ) as client:
-            # Определить учебный год
-            now = datetime.now(timezone.utc)
-            september = 9
-            http_unauthorized = 401
-            year = f"{now.year}-{now.year + 1}" if now.month >= september else f"{now.year - 1}-{now.year}"
-
-            parsed_data: list[dict[str, Any]] = []
-
-            # Для обоих семестров
-            for sem in [1, 2]:
-                params = {
-                    "prepID": "undefined",
-                    "groupID": "undefined",
-                    "typeJournal": "1",
-                    "year": year,
-                    "sem": str(sem),
-                }
-                async with client.get(self.JOURNALS_URL, params=params) as resp:
-                    if resp.status == http_unauthorized:
-                        msg = "Invalid token"
-                        raise InvalidCredsError(msg)
-                    resp.raise_for_status()
-                    journals_json = await resp.json()
-
-                journals = journals_json["data"]["returnList"]
-
-                for j in journals:
-                    await asyncio.sleep(1)  # Rate limit
-
-                    journal_id = int(j["id"])
-
-                    # Получить журнал
-                    j_params = {"journalID": str(journal_id)}
-                    async with client.get(self.JOURNAL_URL, params=j_params) as resp:
-                        if resp.status == http_unauthorized:
-                            msg = "Invalid token"
-                            raise InvalidCredsError(msg)
-                        resp.raise_for_status()
-                        journal_json = await resp.json()
-
-                    data = journal_json.get("data")
-                    if not data:
-                        continue
-
-                    info = data.get("journalInfo", {})
-                    discipline = (info.get("dis") or j.get("dis") or "").strip()
-                    teacher_name = (info.get("teacherName") or j.get("prepodName") or "").strip()
-
-                    if not discipline:
-                        continue
-
-                    # Парсинг уроков (первый студент)
-                    lessons = self.get_student_lessons_last_days_from_journal(journal_json)
-
-                    grades = [
-                        {
-                            "date": lesson["lesson_date"].isoformat(),
-                            "value": lesson["display_value"],
-                            "type": lesson["kind"],
-                            "comment": "",
-                        }
-                        for lesson in lessons
-                    ]
-
-                    if grades:
-                        parsed_data.append(
-                            {
-                                "journal": {
-                                    "code": str(journal_id),
-                                    "name": discipline,
-                                    "teacher": teacher_name,
-                                },
-                                "grades": grades,
-                            }
-                        )
-
-            if not parsed_data:
+        if not parsed_data and window is None:
+            msg = "Не найдены предметы или оценки"
+            raise ParseError(msg)
+
+        return parsed_data
+
+    async def poll_recent(  # noqa: PLR0913
+        self,
+        username: str,
+        password: str,
+        state: WatchState,
+        cost: PollCost,
+        *,
+        days: int,
+        list_ttl: float,
+    ) -> list[dict[str, Any]]:
+        """
+        Дешевый опрос для режима наблюдения: только журналы текущего семестра и оценки за последние `days` дней.
+        Результат в формате `parse_grades`, но без журналов, которые не изменились, и без ParseError на пустой ответ.
+
+        Список журналов берется из `state` и перезапрашивается не чаще раза в `list_ttl` секунд. Журнал
+        запрашивается с If-None-Match (если edu-tpi отдал ETag) и не разбирается при 304 или совпавшем хэше.
+        `state` обновляется на месте; сохранять его можно только после записи оценок.
+        """
+        try:
+            return await self._poll_with_token(username, password, state, cost, days, list_ttl)
+        except TokenExpiredError:
+            await token_store.invalidate(username, password)
+            return await self._poll_with_token(username, password, state, cost, days, list_ttl)
+
+    async def _poll_with_token(  # noqa: PLR0913
+        self,
+        username: str,
+        password: str,
+        state: WatchState,
+        cost: PollCost,
+        days: int,
+        list_ttl: float,
+    ) -> list[dict[str, Any]]:
+        headers = await self._auth_headers(username, password)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        now = datetime.now(timezone.utc)
+        if state.journals is None or now.timestamp() - state.listed_at > list_ttl:
+            year, sem = academic_term(now)
+            state.journals = await self._fetch_journal_list(headers, year, sem, semaphore)
+            state.listed_at = now.timestamp()
+            cost.requests += 1
+
+        results = await asyncio.gather(
+            *(self._poll_journal(headers, j, semaphore, state, cost, days) for j in state.journals)
+        )
+        return [result for result in results if result is not None]
+
+    async def _poll_journal(  # noqa: PLR0913
+        self,
+        headers: dict[str, str],
+        j: dict[str, Any],
+        semaphore: asyncio.Semaphore,
+        state: WatchState,
+        cost: PollCost,
+        days: int,
+    ) -> dict[str, Any] | None:
+        """Опросить один журнал. None, если он не изменился с прошлого опроса или оценок в нем нет."""
+        code = str(int(j["id"]))
+        raw, etag = await self._get_if_modified(
+            self.JOURNAL_URL, {"journalID": code}, headers, semaphore, state.etags.get(code)
+        )
+        cost.requests += 1
+        if etag:
+            state.etags[code] = etag
+        if raw is None:
+            cost.not_modified += 1
+            return None
+        cost.downloaded += len(raw)
+
+        data = decode_journal(raw)
+        del raw
+        journal = self._journal_info(j, data) if data else None
+        if data is None or journal is None:
+            return None
+
+        compiled = CompiledJournal(data)
+        since = datetime.now(timezone.utc).date() - timedelta(days=days)
+        result = self._student_grades(journal, data, compiled, compiled.find_row(), state.hashes, since)
+        if result["unchanged"]:
+            cost.unchanged += 1
+            return None
+        return result
+
+    async def parse_group_grades(self, students: list[GroupStudent]) -> dict[int, list[dict[str, Any]] | Exception]:
+        """
+        Парсит оценки студентов одной группы, загружая каждый журнал один раз.
+
+        Списки журналов загружаются для каждого студента с его токеном. Каждый журнал из объединения
+        этих списков загружается один раз токеном любого студента, у которого он есть, и строки
+        раздаются студентам по edu_user_id (или ФИО). Если строки студента в журнале нет,
+        журнал загружается его собственным токеном, как в `parse_grades`. У каждого студента может быть
+        свое окно инкрементальной синхронизации (`GroupStudent.window`).
+
+        Возвращает user_id -> результат в формате `parse_grades` или исключение, с которым не удалось
+        получить оценки этого студента (ParseError, если оценок нет).
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results: dict[int, list[dict[str, Any]] | Exception] = {}
+
+        journal_lists = await asyncio.gather(
+            *(self._student_journal_lists(student, semaphore) for student in students),
+            return_exceptions=True,
+        )
+
+        # journal_id -> студенты, у которых есть этот журнал
+        readers: dict[int, list[tuple[GroupStudent, dict[str, str], dict[str, Any]]]] = {}
+        for student, listed in zip(students, journal_lists, strict=True):
+            if isinstance(listed, Exception):
+                results[student.user_id] = listed
+                continue
+            if isinstance(listed, BaseException):
+                raise listed
+            headers, journals = listed
+            results[student.user_id] = []
+            for j in journals:
+                readers.setdefault(int(j["id"]), []).append((student, headers, j))
+
+        await asyncio.gather(*(self._fan_out_journal(members, semaphore, results) for members in readers.values()))
+
+        windowed = {student.user_id for student in students if student.window is not None}
+        for user_id, parsed_data in results.items():
+            if isinstance(parsed_data, list) and not parsed_data and user_id not in windowed:
                 msg = "Не найдены предметы или оценки"
-                raise ParseError(msg)
+                results[user_id] = ParseError(msg)
+        return results
 
-            return parsed_data
+    async def _student_journal_lists(
+        self,
+        student: GroupStudent,
+        semaphore: asyncio.Semaphore,
+    ) -> tuple[dict[str, str], list[dict[str, Any]]]:
+        """Токен и журналы студента за оба семестра (за текущий, если у студента есть окно синхронизации)."""
+        current_only = student.window is not None
+        try:
+            headers = await self._auth_headers(student.username, student.password)
+            return headers, await self._fetch_journal_lists(headers, semaphore, current_only=current_only)
+        except TokenExpiredError:
+            await token_store.invalidate(student.username, student.password)
+            headers = await self._auth_headers(student.username, student.password)
+            return headers, await self._fetch_journal_lists(headers, semaphore, current_only=current_only)
+
+    async def _fan_out_journal(
+        self,
+        members: list[tuple[GroupStudent, dict[str, str], dict[str, Any]]],
+        semaphore: asyncio.Semaphore,
+        results: dict[int, list[dict[str, Any]] | Exception],
+    ) -> None:
+        """
+        Загрузить журнал один раз и разобрать строки всех студентов группы, у которых он есть.
+        Ошибка журнала записывается только его читателям, ошибка строки - только ее студенту:
+        остальные журналы и студенты группы синхронизируются дальше.
+        """
+        try:
+            data, j = await self._fetch_shared_journal(members, semaphore)
+            journal = self._journal_info(j, data) if data else None
+            if data is None or journal is None:
+                return
+            compiled = CompiledJournal(data)
+        except JOURNAL_ERRORS as e:
+            logger.warning(f"group journal failed | journal_id: {members[0][2].get('id')} | error: {e!r}")
+            for student, _, _ in members:
+                _add_result(results, student, e)
+            return
+
+        unresolved = []
+        for member in members:
+            student = member[0]
+            try:
+                student_row = self._group_student_row(compiled, student, len(members))
+                if student_row is None:
+                    unresolved.append(member)
+                    continue
+                since = student.window.cutoff(journal["code"]) if student.window else None
+                result = self._student_grades(journal, data, compiled, student_row, student.known_hashes, since)
+            except JOURNAL_ERRORS as e:
+                _add_result(results, student, e)
+                continue
+            GROUP_JOURNAL_ROWS.labels(source="shared").inc()
+            _add_result(results, student, result)
+        del data, compiled
+
+        # Строки студента нет в общем ответе - загружаем журнал его токеном
+        GROUP_JOURNAL_ROWS.labels(source="own").inc(len(unresolved))
+        own_results: list[dict[str, Any] | None | BaseException] = await asyncio.gather(
+            *(
+                self._fetch_own_journal(student, headers, student_j, semaphore)
+                for student, headers, student_j in unresolved
+            ),
+            return_exceptions=True,
+        )
+        for (student, _, _), own_result in zip(unresolved, own_results, strict=True):
+            _add_result(results, student, own_result)
+
+    async def _fetch_shared_journal(
+        self,
+        members: list[tuple[GroupStudent, dict[str, str], dict[str, Any]]],
+        semaphore: asyncio.Semaphore,
+    ) -> tuple[dict[str, Any] | None, dict[str, Any]]:
+        """
+        Загрузить журнал целиком токеном первого студента, чей токен еще действует.
+        На 401 токен студента обновляется один раз; к следующему студенту переходим, только если
+        авторизоваться заново не удалось.
+        """
+        error: InvalidCredsError | None = None
+        for student, headers, j in members:
+            j_params = {"journalID": str(int(j["id"]))}
+            try:
+                raw = await self._get_bytes_reauth(student, headers, self.JOURNAL_URL, j_params, semaphore)
+            except InvalidCredsError as e:
+                error = e
+                continue
+            return orjson.loads(raw).get("data") or None, j
+        raise error or TokenExpiredError("Invalid token")
+
+    async def _fetch_own_journal(
+        self,
+        student: GroupStudent,
+        headers: dict[str, str],
+        j: dict[str, Any],
+        semaphore: asyncio.Semaphore,
+    ) -> dict[str, Any] | None:
+        """`_fetch_journal` токеном студента; на 401 токен обновляется один раз."""
+        try:
+            return await self._fetch_journal(headers, j, semaphore, student.known_hashes, student.window)
+        except TokenExpiredError:
+            await token_store.invalidate(student.username, student.password)
+            headers = await self._auth_headers(student.username, student.password)
+            return await self._fetch_journal(headers, j, semaphore, student.known_hashes, student.window)
+
+    async def _get_bytes_reauth(
+        self,
+        student: GroupStudent,
+        headers: dict[str, str],
+        url: str,
+        params: dict[str, str],
+        semaphore: asyncio.Semaphore,
+    ) -> bytes:
+        """`_get_bytes` токеном студента; на 401 токен обновляется один раз."""
+        try:
+            return await self._get_bytes(url, params, headers, semaphore)
+        except TokenExpiredError:
+            await token_store.invalidate(student.username, student.password)
+            headers = await self._auth_headers(student.username, student.password)
+            return await self._get_bytes(url, params, headers, semaphore)
+
+    def _group_student_row(
+        self,
+        compiled: CompiledJournal,
+        student: GroupStudent,
+        readers: int,
+    ) -> dict[str, Any] | None:
+        """Строка студента в общем журнале: по edu_user_id, затем по ФИО. None, если не нашлась."""
+        if student.edu_user_id is not None and (row := compiled.rows_by_id.get(str(student.edu_user_id))):
+            return row
+        if student.full_name:
+            for row in compiled.rows:
+                if row.get("fio") == student.full_name:
+                    return row
+        # Журнал с одной строкой у единственного студента - это его строка, как и в parse_grades
+        if readers == 1 and len(compiled.rows) == 1:
+            return compiled.rows[0]
+        return None
+
+
+def _add_result(
+    results: dict[int, list[dict[str, Any]] | Exception],
+    student: GroupStudent,
+    result: dict[str, Any] | BaseException | None,
+) -> None:
+    """Добавить результат разбора журнала студенту; первая ошибка заменяет все его результаты."""
+    current = results[student.user_id]
+    if isinstance(current, Exception) or result is None:
+        return
+    if isinstance(result, Exception):
+        results[student.user_id] = result
+    elif isinstance(result, BaseException):
+        raise result
+    else:
+        current.append(result)
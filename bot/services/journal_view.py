@@ -0,0 +1,188 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from itertools import pairwise
+from typing import Any
+
+import orjson
+
+from bot.services.api_client import ParseError
+
+MARK_KIND = "оценка"
+ATTENDANCE_KIND = "посещаемость"
+
+# Все, кроме journalData, нужно целиком; из journalData - только строка студента
+JOURNAL_SHARED_KEYS = ("journalInfo", "journalDates", "journalVal")
+
+
+def parse_journal_date(s: str) -> date:
+    """Парсит ISO дату из journalDates ("2025-09-01T000000" и обычный ISO формат)."""
+    try:
+        return date.fromisoformat(s[:10])
+    except ValueError:
+        return datetime.fromisoformat(s.replace("T000000", "T00:00:00")).date()
+
+
+def decode_journal(raw: bytes, *, student_id: int | None = None) -> dict[str, Any] | None:
+    """
+    Декодирует тело ответа /api/Journals/Journal и оставляет от "data" только journalInfo, journalDates,
+    journalVal и строку одного студента (первую, если student_id не указан).
+    Матрица оценок всей группы освобождается сразу после разбора и не живет, пока идет синхронизация.
+    Возвращает None, если в ответе нет "data".
+    """
+    data = orjson.loads(raw).get("data")
+    if not data:
+        return None
+
+    rows: list[dict[str, Any]] = data.get("journalData") or []
+    if student_id is None:
+        student_rows = rows[:1]
+    else:
+        student_rows = [row for row in rows if str(row.get("id")) == str(student_id)][:1]
+
+    journal = {key: data[key] for key in JOURNAL_SHARED_KEYS if key in data}
+    journal["journalData"] = student_rows
+    return journal
+
+
+class CompiledJournal:
+    """
+    Журнал edu-tpi, подготовленный для быстрых выборок по студентам.
+
+    Даты journalDates разбираются один раз и сортируются по (дата, пара), строки journalData
+    индексируются по id студента, journalVal - по id значения. Выборка занятий за период - это
+    бинарный поиск по датам и проход только по нужным столбцам.
+    """
+
+    __slots__ = ("_rows_by_id", "date_ids", "date_keys", "dates", "hours", "rows", "values")
+
+    def __init__(self, data: dict[str, Any]) -> None:
+        journal_dates: list[dict[str, Any]] = data.get("journalDates", [])
+
+        # На одну дату обычно приходится несколько пар - дата разбирается один раз
+        parsed_dates: dict[str, date] = {}
+        self.dates: list[date] = []
+        self.hours: list[int] = []
+        self.date_ids: list[int] = []
+        self.date_keys: list[str] = []
+        for jd in journal_dates:
+            raw_date = jd["date"]
+            d = parsed_dates.get(raw_date)
+            if d is None:
+                d = parsed_dates[raw_date] = parse_journal_date(raw_date)
+            date_id = jd["dateID"]
+            self.dates.append(d)
+            self.hours.append(int(jd["hourNumber"]))
+            self.date_ids.append(int(date_id))
+            self.date_keys.append(str(date_id))
+
+        # API отдает занятия по порядку, сортировка нужна только если это не так
+        order = list(zip(self.dates, self.hours, strict=True))
+        if any(a > b for a, b in pairwise(order)):
+            idx = sorted(range(len(order)), key=order.__getitem__)
+            self.dates = [self.dates[i] for i in idx]
+            self.hours = [self.hours[i] for i in idx]
+            self.date_ids = [self.date_ids[i] for i in idx]
+            self.date_keys = [self.date_keys[i] for i in idx]
+
+        self.rows: list[dict[str, Any]] = data.get("journalData", [])
+        self._rows_by_id: dict[str, dict[str, Any]] | None = None
+
+        # id значения -> (отображаемое значение, вид, isMark, isPass)
+        self.values: dict[int, tuple[str, str, bool, bool]] = {}
+        for v in data.get("journalVal", []):
+            is_mark = bool(v.get("isMark"))
+            is_pass = bool(v.get("isPass"))
+            kind = MARK_KIND if is_mark else ATTENDANCE_KIND if is_pass else ""
+            self.values[int(v["id"])] = (v.get("value") or "", kind, is_mark, is_pass)
+
+    @property
+    def rows_by_id(self) -> dict[str, dict[str, Any]]:
+        """Индекс id студента -> строка journalData, строится при первом обращении."""
+        if self._rows_by_id is None:
+            self._rows_by_id = {}
+            for row in self.rows:
+                self._rows_by_id.setdefault(str(row.get("id")), row)
+        return self._rows_by_id
+
+    @classmethod
+    def from_json(cls, journal_json: dict[str, Any]) -> CompiledJournal:
+        """Собрать из ответа /api/Journals/Journal."""
+        return cls(journal_json["data"])
+
+    def find_row(
+        self,
+        *,
+        student_id: int | None = None,
+        fio: str | None = None,
+        full_name: str | None = None,
+    ) -> dict[str, Any]:
+        """
+        Ищет строку студента: только по id - через индекс, с ФИО - перебором, как и раньше.
+        Если параметры не указаны, возвращает первую строку (предполагаем одного студента).
+        """
+        if fio is None and full_name is None:
+            if student_id is not None and (row := self.rows_by_id.get(str(student_id))) is not None:
+                return row
+        else:
+            for row in self.rows:
+                if student_id is not None and str(row.get("id")) == str(student_id):
+                    return row
+                if fio is not None and row.get("fio") == fio:
+                    return row
+                if full_name is not None and row.get("fullName") == full_name:
+                    return row
+        if student_id is None and fio is None and full_name is None and self.rows:
+            return self.rows[0]
+        msg = "Студент не найден в journalData"
+        raise ParseError(msg)
+
+    def date_slice(self, since: date | None = None, until: date | None = None) -> range:
+        """Индексы занятий с датой в [since, until] (включительно)."""
+        start = bisect_left(self.dates, since) if since is not None else 0
+        stop = bisect_right(self.dates, until) if until is not None else len(self.dates)
+        return range(start, stop)
+
+    def lessons(
+        self,
+        row: dict[str, Any],
+        since: date | None = None,
+        until: date | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Занятия студента за период, отсортированные по (дата, пара).
+        Возвращает list[dict] {lesson_date:date, hour_number:int, date_id:int, display_value:str, kind:str,
+        is_mark:bool, is_pass:bool}.
+        """
+        lessons: list[dict[str, Any]] = []
+        values = self.values
+        dates, hours, date_ids, date_keys = self.dates, self.hours, self.date_ids, self.date_keys
+
+        for i in self.date_slice(since, until):
+            raw_cell = row.get(date_keys[i])
+            if raw_cell is None:
+                continue
+
+            try:
+                value_id = int(raw_cell)
+            except (TypeError, ValueError):
+                continue
+
+            value = values.get(value_id)
+            if value is None:
+                continue
+
+            display_value, kind, is_mark, is_pass = value
+            lessons.append(
+                {
+                    "lesson_date": dates[i],
+                    "hour_number": hours[i],
+                    "date_id": date_ids[i],
+                    "display_value": display_value,
+                    "kind": kind,
+                    "is_mark": is_mark,
+                    "is_pass": is_pass,
+                }
+            )
+
+        return lessons
@@ -1,10 +1,12 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.database.models import Journal
+from bot.database.models.base import user_journal_association
 
 if TYPE_CHECKING:
     from sqlalchemy.ext.asyncio import AsyncSession
@@ -29,6 +31,39 @@ class JournalsService:
         await session.refresh(journal)
         return journal
 
+    @classmethod
+    async def upsert_many(
+        cls,
+        session: AsyncSession,
+        journals: list[dict[str, Any]],
+    ) -> None:
+        """Создать предметы или обновить их название и преподавателя одним запросом. Без commit.
+        journals: list[{'id': int, 'name': str, 'teacher_name': str, 'type': str}]
+        """
+        if not journals:
+            return
+        stmt = insert(Journal).values(journals)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Journal.id],
+            set_={"name": stmt.excluded.name, "teacher_name": stmt.excluded.teacher_name},
+        )
+        await session.execute(stmt)
+
+    @classmethod
+    async def attach_user(
+        cls,
+        session: AsyncSession,
+        user_id: int,
+        journal_ids: list[int],
+    ) -> None:
+        """Связать пользователя с его предметами. Без commit."""
+        if not journal_ids:
+            return
+        stmt = insert(user_journal_association).values(
+            [{"user_id": user_id, "journal_id": journal_id} for journal_id in journal_ids],
+        )
+        await session.execute(stmt.on_conflict_do_nothing())
+
     @classmethod
     async def get_by_user(
         cls,
@@ -0,0 +1,345 @@
+from __future__ import annotations
+import asyncio
+import html
+import time
+from contextlib import suppress
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import TYPE_CHECKING, Any
+
+import prometheus_client
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter
+from cachetools import TTLCache
+from loguru import logger
+from redis.exceptions import RedisError
+from sqlalchemy import insert, select, update
+
+from bot.core.config import METRICS_PREFIX, settings
+from bot.core.loader import i18n, redis_client
+from bot.database.database import sessionmaker
+from bot.database.models import Notification, User
+from bot.database.models.notification import NotificationKind, NotificationStatus
+from bot.utils.misc import utcnow
+from bot.utils.rate_limit import GCRALimiter, RateLimit, TokenBucket
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from datetime import datetime
+
+    from aiogram import Bot
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+NOTIFICATIONS_SENT = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_notifications_sent",
+    documentation="Total outbox messages by kind and result (sent, flood_wait, retry, failed, blocked, lost).",
+    labelnames=["kind", "result"],
+)
+NOTIFICATION_RETRY_AFTER = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_notification_retry_after",
+    documentation="Total Telegram flood-wait (RetryAfter) responses while sending notifications.",
+)
+
+# Telegram: ~30 сообщений в секунду на бота и ~1 в секунду в один чат
+CHAT_BUCKETS_MAXSIZE = 50_000
+# Время, на которое реплика забирает пачку: если она упадет, сообщения снова станут доступны.
+# Пока пачка отправляется, аренда продлевается каждую треть срока
+CLAIM_LEASE = timedelta(minutes=5)
+# Ключ общего для всех реплик лимита бота в Redis
+GLOBAL_LIMIT_KEY = "notify:global"
+RETRY_BASE = 30
+ERROR_MAX_LENGTH = 500
+
+
+def grades_text(rows: Iterable[dict[str, Any]], journal_names: dict[int, str], locale: str | None) -> str | None:
+    """Текст уведомления о новых и измененных оценках (строки в формате `grade_row`). None, если сообщать не о чем."""
+    lines = [
+        f"• {html.escape(journal_names.get(row['journal_id'], ''))}: <b>{html.escape(row['value'])}</b> "
+        f"({row['date']:%d.%m.%Y})"
+        for row in sorted(rows, key=lambda row: (row["date"], row["hour_number"]))
+        if row["value"]
+    ]
+    if not lines:
+        return None
+    return "\n".join([i18n.gettext("notification.grades", locale=locale or None), *lines])
+
+
+async def enqueue(
+    session: AsyncSession,
+    messages: Iterable[tuple[int, NotificationKind, str]],
+    send_after: Any = None,
+) -> int:
+    """Добавить сообщения (user_id, вид, текст) в outbox. Без commit: пишется в транзакции вызывающего."""
+    send_after = send_after or utcnow()
+    rows = [
+        {
+            "user_id": user_id,
+            "kind": kind,
+            "text": text,
+            "status": NotificationStatus.PENDING,
+            "attempts": 0,
+            "send_after": send_after,
+        }
+        for user_id, kind, text in messages
+    ]
+    if rows:
+        await session.execute(insert(Notification), rows)
+    return len(rows)
+
+
+async def enqueue_grade_changes(
+    session: AsyncSession,
+    user_id: int,
+    rows: list[dict[str, Any]],
+    journal_names: dict[int, str],
+) -> bool:
+    """
+    Поставить уведомление о новых и измененных оценках, если пользователь их включил.
+    Первая синхронизация пользователя (last_sync пуст) загружает всю историю, о ней не сообщается.
+    """
+    if not rows:
+        return False
+    query = select(User.notification_enabled, User.last_sync, User.language_code).where(User.id == user_id)
+    user = (await session.execute(query)).one_or_none()
+    if user is None or not user.notification_enabled or user.last_sync is None:
+        return False
+
+    text = grades_text(rows, journal_names, user.language_code)
+    if text is None:
+        return False
+    return bool(await enqueue(session, [(user_id, NotificationKind.GRADES, text)]))
+
+
+@dataclass(slots=True)
+class _Lease:
+    """Аренда забранной пачки: срок, записанный в send_after, и сообщения, которые реплика еще держит."""
+
+    until: datetime
+    owned: set[int]
+
+
+class NotificationDispatcher:
+    """Отправка outbox в Telegram с учетом его лимитов.
+
+    Пачки забираются через `FOR UPDATE SKIP LOCKED` с арендой на CLAIM_LEASE, которая продлевается,
+    пока пачка отправляется. Продление идет по сравнению со своим сроком аренды: сообщение, которое
+    успела забрать другая реплика, этой уже не отправляется. Дубль возможен, только если реплика упадет
+    между отправкой и записью результата. Перед каждой отправкой берется токен общего лимита бота
+    (`global_rate` в секунду на все реплики, GCRA в Redis) и лимита чата (одно сообщение в
+    `chat_interval` секунд). На RetryAfter
+    вся отправка останавливается на указанное Telegram время, сообщение возвращается в очередь без
+    потери попытки. Прочие ошибки повторяются с экспоненциальной задержкой до `max_attempts` раз.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = sessionmaker,
+        *,
+        global_rate: float = settings.NOTIFY_GLOBAL_RATE,
+        chat_interval: float = settings.NOTIFY_CHAT_INTERVAL,
+        concurrency: int = settings.NOTIFY_CONCURRENCY,
+        batch_size: int = settings.NOTIFY_BATCH_SIZE,
+        poll_interval: float = settings.NOTIFY_POLL_INTERVAL,
+        max_attempts: int = settings.NOTIFY_MAX_ATTEMPTS,
+        limiter: GCRALimiter | None = None,
+    ) -> None:
+        self.session_factory = session_factory
+        self.chat_interval = chat_interval
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+
+        self._global = limiter or GCRALimiter(redis_client)
+        self._global_limit = RateLimit(interval=1 / global_rate)
+        # Если Redis недоступен, общий лимит держится хотя бы в пределах процесса
+        self._global_fallback = TokenBucket(rate=global_rate, capacity=1)
+        self._chats: TTLCache[int, TokenBucket] = TTLCache(maxsize=CHAT_BUCKETS_MAXSIZE, ttl=max(60, chat_interval))
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._paused_until = 0.0
+        self._runner: asyncio.Task[None] | None = None
+        self._stopping = asyncio.Event()
+
+    def start(self, bot: Bot) -> None:
+        if self._runner is None or self._runner.done():
+            self._stopping.clear()
+            self._runner = asyncio.create_task(self.run_forever(bot))
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._runner is not None:
+            self._runner.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._runner
+            self._runner = None
+
+    async def run_forever(self, bot: Bot) -> None:
+        logger.info("notification dispatcher started")
+        while not self._stopping.is_set():
+            try:
+                sent = await self.dispatch(bot)
+            except Exception:  # noqa: BLE001
+                logger.exception("notification dispatch failed")
+                sent = 0
+            # Полная пачка - вероятно, очередь не пуста: следующая сразу
+            if sent < self.batch_size:
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+        logger.info("notification dispatcher stopped")
+
+    async def dispatch(self, bot: Bot) -> int:
+        """Забрать и отправить одну пачку. Возвращает размер пачки."""
+        async with self.session_factory() as session:
+            claimed, lease = await self.claim(session)
+        if not claimed:
+            return 0
+
+        keeper = asyncio.create_task(self._keep_lease(lease))
+        try:
+            outcomes = await asyncio.gather(*(self._deliver(bot, notification, lease) for notification in claimed))
+        finally:
+            keeper.cancel()
+            with suppress(asyncio.CancelledError):
+                await keeper
+
+        async with self.session_factory() as session:
+            await self._save(session, outcomes)
+        return len(claimed)
+
+    async def claim(self, session: AsyncSession) -> tuple[list[Notification], _Lease]:
+        """Взять до `batch_size` готовых к отправке сообщений в аренду."""
+        now = utcnow()
+        until = now + CLAIM_LEASE
+        due = (
+            select(Notification.id)
+            .where(Notification.status == NotificationStatus.PENDING, Notification.send_after <= now)
+            .order_by(Notification.send_after, Notification.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(Notification)
+            .where(Notification.id.in_(due.scalar_subquery()))
+            .values(send_after=until)
+            .returning(Notification)
+            .execution_options(synchronize_session=False)
+        )
+        result = await session.execute(stmt)
+        claimed = list(result.scalars())
+        await session.commit()
+        return claimed, _Lease(until=until, owned={notification.id for notification in claimed})
+
+    async def _keep_lease(self, lease: _Lease) -> None:
+        """Продлевать аренду пачки, пока она отправляется. Перехваченные сообщения убираются из `lease.owned`."""
+        while lease.owned:
+            await asyncio.sleep(CLAIM_LEASE.total_seconds() / 3)
+            ids = list(lease.owned)
+            until = utcnow() + CLAIM_LEASE
+            stmt = (
+                update(Notification)
+                .where(
+                    Notification.id.in_(ids),
+                    Notification.status == NotificationStatus.PENDING,
+                    Notification.send_after == lease.until,
+                )
+                .values(send_after=until)
+                .returning(Notification.id)
+                .execution_options(synchronize_session=False)
+            )
+            try:
+                async with self.session_factory() as session:
+                    kept = set((await session.execute(stmt)).scalars())
+                    await session.commit()
+            except Exception:  # noqa: BLE001
+                logger.exception("notification lease extension failed")
+                continue
+            lost = set(ids) - kept
+            if lost:
+                logger.warning(f"notification lease lost | messages: {len(lost)}")
+            lease.owned -= lost
+            lease.until = until
+
+    async def _wait_global(self) -> None:
+        try:
+            await self._global.wait(GLOBAL_LIMIT_KEY, self._global_limit)
+        except RedisError as e:
+            logger.warning(f"notification global limit is local, redis unavailable | error: {e!r}")
+            await self._global_fallback.acquire()
+
+    async def _wait_turn(self, chat_id: int) -> None:
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = TokenBucket(rate=1 / self.chat_interval, capacity=1)
+        await chat.acquire()
+        await self._wait_global()
+
+    async def _deliver(
+        self,
+        bot: Bot,
+        notification: Notification,
+        lease: _Lease,
+    ) -> tuple[Notification, str, str | None]:
+        """(сообщение, результат: sent / flood_wait / retry / blocked / lost, ошибка)."""
+        # Ждём очереди чата до семафора: несколько сообщений одному чату не держат слоты отправки во сне
+        await self._wait_turn(notification.user_id)
+        async with self._semaphore:
+            if notification.id not in lease.owned:
+                # Аренду перехватила другая реплика - сообщение отправит она
+                return notification, "lost", None
+            try:
+                await bot.send_message(chat_id=notification.user_id, text=notification.text)
+            except TelegramRetryAfter as e:
+                NOTIFICATION_RETRY_AFTER.inc()
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                logger.warning(f"telegram flood wait | retry_after: {e.retry_after}")
+                return notification, "flood_wait", str(e.retry_after)
+            except TelegramForbiddenError as e:
+                return notification, "blocked", str(e)
+            except TelegramAPIError as e:
+                return notification, "retry", str(e)
+        return notification, "sent", None
+
+    async def _save(self, session: AsyncSession, outcomes: list[tuple[Notification, str, str | None]]) -> None:
+        now = utcnow()
+        sent_ids = []
+        for notification, outcome, error in outcomes:
+            if outcome == "lost":
+                NOTIFICATIONS_SENT.labels(kind=notification.kind.value, result="lost").inc()
+                continue
+            if outcome == "sent":
+                sent_ids.append(notification.id)
+                NOTIFICATIONS_SENT.labels(kind=notification.kind.value, result="sent").inc()
+                continue
+
+            values: dict[str, Any]
+            if outcome == "flood_wait":
+                # Не ошибка сообщения: повторить после паузы, попытку не засчитывать
+                values = {"send_after": now + timedelta(seconds=int(error or 0))}
+            elif outcome == "retry" and notification.attempts + 1 < self.max_attempts:
+                values = {
+                    "send_after": now + timedelta(seconds=RETRY_BASE * 2**notification.attempts),
+                    "attempts": notification.attempts + 1,
+                    "error": (error or "")[:ERROR_MAX_LENGTH],
+                }
+            else:
+                values = {
+                    "status": NotificationStatus.FAILED,
+                    "attempts": notification.attempts + 1,
+                    "error": (error or "")[:ERROR_MAX_LENGTH],
+                }
+            await session.execute(update(Notification).where(Notification.id == notification.id).values(**values))
+            result = "failed" if outcome == "retry" and "status" in values else outcome
+            NOTIFICATIONS_SENT.labels(kind=notification.kind.value, result=result).inc()
+
+        if sent_ids:
+            await session.execute(
+                update(Notification)
+                .where(Notification.id.in_(sent_ids))
+                .values(status=NotificationStatus.SENT, sent_at=now)
+            )
+        await session.commit()
+
+
+notification_dispatcher = NotificationDispatcher()
@@ -0,0 +1,223 @@
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from contextlib import suppress
+from datetime import timedelta
+from typing import TYPE_CHECKING
+
+import prometheus_client
+from loguru import logger
+from sqlalchemy import or_, select
+
+from bot.core.config import METRICS_PREFIX, settings
+from bot.database.database import sessionmaker
+from bot.database.models import User
+from bot.database.models.sync_log import SyncStatus, SyncType
+from bot.services.group_sync import plan_group_syncs, sync_group
+from bot.services.journal_parser import JournalParser
+from bot.services.sync import SyncResult, record_sync, sync_user
+from bot.utils.misc import utcnow
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+SYNCED_USERS = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_sync_users",
+    documentation="Total background user syncs by sync type and status.",
+    labelnames=["sync_type", "status"],
+)
+SYNC_DURATION = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_sync_duration",
+    documentation="Histogram of background user sync time by sync type (in seconds).",
+    labelnames=["sync_type"],
+    unit="seconds",
+    buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300),
+)
+SYNC_IN_PROGRESS = prometheus_client.Gauge(
+    name=f"{METRICS_PREFIX}_sync_in_progress",
+    documentation="Gauge of user syncs currently running.",
+)
+SYNC_MODES = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_sync_modes",
+    documentation="Total background user syncs started by mode (full, incremental).",
+    labelnames=["mode"],
+)
+SYNC_THROUGHPUT = prometheus_client.Gauge(
+    name=f"{METRICS_PREFIX}_sync_users_per_minute",
+    documentation="Users synced during the last minute.",
+)
+
+THROUGHPUT_WINDOW = 60
+
+
+class SyncScheduler:
+    """Фоновый планировщик синхронизации оценок всех авторизованных пользователей.
+
+    Каждый проход выбирает пользователей, которым пора синхронизироваться, начиная с самых давно
+    синхронизированных. Обычно синхронизация инкрементальная (только текущий семестр и свежие даты,
+    см. `sync_windows`); раз в `full_interval` она полная, чтобы поймать исправления задним числом.
+    Пользователи одной группы синхронизируются вместе (см. `sync_group`).
+    Одновременно выполняется не больше `concurrency` синхронизаций на процесс. Частые опросы
+    режима наблюдения идут отдельным ярусом (см. `WatchScheduler`).
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = sessionmaker,
+        parser: JournalParser | None = None,
+        *,
+        interval: int = settings.SYNC_INTERVAL,
+        full_interval: int = settings.SYNC_FULL_INTERVAL,
+        tick: int = settings.SYNC_TICK,
+        concurrency: int = settings.SYNC_CONCURRENCY,
+        batch_size: int = settings.SYNC_BATCH_SIZE,
+        group_sharing: bool = settings.SYNC_GROUP_SHARING,
+    ) -> None:
+        self.session_factory = session_factory
+        self.parser = parser or JournalParser()
+        self.interval = timedelta(seconds=interval)
+        self.full_interval = timedelta(seconds=full_interval)
+        self.tick_interval = tick
+        self.batch_size = batch_size
+        self.group_sharing = group_sharing
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._in_flight: set[int] = set()
+        self._tasks: set[asyncio.Task[list[SyncResult]]] = set()
+        self._completed: deque[float] = deque()
+        self._runner: asyncio.Task[None] | None = None
+        self._stopping = asyncio.Event()
+
+    @property
+    def users_per_minute(self) -> int:
+        """Сколько пользователей синхронизировано за последнюю минуту."""
+        border = time.monotonic() - THROUGHPUT_WINDOW
+        while self._completed and self._completed[0] < border:
+            self._completed.popleft()
+        return len(self._completed)
+
+    def start(self) -> None:
+        """Запустить планировщик фоновой задачей в текущем event loop."""
+        if self._runner is None or self._runner.done():
+            self._stopping.clear()
+            self._runner = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        """Остановить планировщик и отменить незавершенные синхронизации."""
+        self._stopping.set()
+        if self._runner is not None:
+            self._runner.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._runner
+            self._runner = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def run_forever(self) -> None:
+        logger.info("sync scheduler started")
+        while not self._stopping.is_set():
+            try:
+                await self.tick()
+            except Exception:  # noqa: BLE001
+                logger.exception("sync scheduler tick failed")
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.tick_interval)
+        logger.info("sync scheduler stopped")
+
+    async def tick(self) -> int:
+        """Один проход планировщика. Возвращает количество пользователей, для которых запущена синхронизация."""
+        SYNC_THROUGHPUT.set(self.users_per_minute)
+
+        limit = self.batch_size - len(self._in_flight)
+        if limit <= 0:
+            return 0
+
+        async with self.session_factory() as session:
+            due = await self.fetch_due(session, limit)
+
+        # Полные и инкрементальные синхронизации одной группы идут отдельно: у них разные списки журналов
+        planned = [
+            (user_ids, full)
+            for full in (True, False)
+            for user_ids in plan_group_syncs(
+                (user_id, group_id if self.group_sharing else None)
+                for user_id, group_id, user_full in due
+                if user_full is full
+            )
+        ]
+
+        for user_ids, full in planned:
+            SYNC_MODES.labels(mode="full" if full else "incremental").inc(len(user_ids))
+            self._in_flight.update(user_ids)
+            task = asyncio.create_task(self._sync(user_ids, SyncType.AUTO, full=full))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        return len(due)
+
+    async def fetch_due(self, session: AsyncSession, limit: int) -> list[tuple[int, int | None, bool]]:
+        """Пользователи, которым пора синхронизироваться: (user_id, group_id, нужна ли полная синхронизация)."""
+        now = utcnow()
+
+        full = or_(User.last_full_sync.is_(None), User.last_full_sync < now - self.full_interval)
+        query = (
+            select(User.id, User.group_id, full.label("full"))
+            .where(
+                User.is_authenticated.is_(True),
+                User.edu_login_encrypted.is_not(None),
+                or_(User.last_sync.is_(None), User.last_sync < now - self.interval),
+            )
+            .order_by(User.last_sync.asc().nulls_first())
+            .limit(limit)
+        )
+        if self._in_flight:
+            query = query.where(User.id.not_in(self._in_flight))
+
+        result = await session.execute(query)
+        return [(user_id, group_id, bool(full)) for user_id, group_id, full in result.tuples()]
+
+    async def _sync(self, user_ids: list[int], sync_type: SyncType, *, full: bool = True) -> list[SyncResult]:
+        try:
+            async with self._semaphore:
+                SYNC_IN_PROGRESS.inc(len(user_ids))
+                started_at = time.monotonic()
+                try:
+                    async with self.session_factory() as session:
+                        if len(user_ids) == 1:
+                            results = [await sync_user(session, user_ids[0], sync_type, self.parser, full=full)]
+                        else:
+                            results = await sync_group(session, user_ids, sync_type, self.parser, full=full)
+                except Exception as e:  # noqa: BLE001
+                    logger.exception(f"unexpected sync error | user_ids: {user_ids}")
+                    results = await self._record_failed(user_ids, sync_type, e)
+                finally:
+                    SYNC_IN_PROGRESS.dec(len(user_ids))
+                    SYNC_DURATION.labels(sync_type=sync_type.value).observe(time.monotonic() - started_at)
+
+            finished_at = time.monotonic()
+            for result in results:
+                SYNCED_USERS.labels(sync_type=sync_type.value, status=result.status.value).inc()
+                self._completed.append(finished_at)
+            SYNC_THROUGHPUT.set(self.users_per_minute)
+            return results
+        finally:
+            self._in_flight.difference_update(user_ids)
+
+    async def _record_failed(self, user_ids: list[int], sync_type: SyncType, error: Exception) -> list[SyncResult]:
+        """
+        Записать упавшую синхронизацию как FAILED в новой сессии (старая могла остаться в упавшей транзакции).
+        Так last_sync сдвигается всегда и пользователи не становятся due на каждом тике.
+        """
+        results = [SyncResult(user_id=user_id, status=SyncStatus.FAILED, message=repr(error)) for user_id in user_ids]
+        try:
+            async with self.session_factory() as session:
+                for result in results:
+                    await record_sync(session, result, sync_type)
+        except Exception:  # noqa: BLE001
+            logger.exception(f"failed to record sync error | user_ids: {user_ids}")
+        return results
+
+
+sync_scheduler = SyncScheduler()
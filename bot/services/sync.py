@@ -0,0 +1,180 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import TYPE_CHECKING, Any
+
+from loguru import logger
+from sqlalchemy import select
+
+from bot.cache.redis import clear_cache
+from bot.core.config import settings
+from bot.database.models import User
+from bot.database.models.sync_log import SyncStatus, SyncType
+from bot.services.api_client import ParseError
+from bot.services.grades import GradesService
+from bot.services.journal_hash import journal_hashes
+from bot.services.journal_parser import JOURNAL_ERRORS, JournalParser, SyncWindow
+from bot.services.journals import JournalsService
+from bot.services.notifications import enqueue_grade_changes
+from bot.services.sync_logs import SyncLogsService
+from bot.services.users import get_edu_credentials, get_user_context, update_last_sync, update_watch_mode_last_sync
+from bot.utils.misc import utcnow
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@dataclass(slots=True)
+class SyncResult:
+    user_id: int
+    status: SyncStatus
+    new_grades: int = 0
+    updated_grades: int = 0
+    message: str | None = None
+
+
+async def store_grades(session: AsyncSession, user_id: int, parsed_data: list[dict[str, Any]]) -> tuple[int, int]:
+    """
+    Сохранить результат `JournalParser.parse_grades` одной транзакцией. Возвращает (новых, измененных) оценок.
+    Журналы, помеченные парсером как неизмененные, пропускаются целиком.
+    """
+    parsed_data = [item for item in parsed_data if not item.get("unchanged")]
+    if not parsed_data:
+        return 0, 0
+
+    journals = {
+        int(item["journal"]["code"]): {
+            "id": int(item["journal"]["code"]),
+            "name": item["journal"]["name"],
+            "teacher_name": item["journal"]["teacher"],
+            "type": "",
+        }
+        for item in parsed_data
+    }
+    await JournalsService.upsert_many(session, list(journals.values()))
+    await JournalsService.attach_user(session, user_id, list(journals))
+    changes: list[dict[str, Any]] = []
+    counts = await GradesService.sync_bulk(session, user_id, parsed_data, changes=changes)
+    # Уведомление пишется в той же транзакции, что и оценки: ни одно изменение не потеряется и не задвоится
+    await enqueue_grade_changes(
+        session, user_id, changes, {journal_id: journal["name"] for journal_id, journal in journals.items()}
+    )
+    await session.commit()
+    return counts
+
+
+def error_result(user_id: int, error: Exception) -> SyncResult:
+    """Результат синхронизации, которую прервала ошибка парсинга или edu-tpi."""
+    if isinstance(error, ParseError):
+        return SyncResult(user_id=user_id, status=SyncStatus.SUCCESS, message=str(error))
+    logger.warning(f"sync failed | user_id: {user_id} | error: {error!r}")
+    return SyncResult(user_id=user_id, status=SyncStatus.FAILED, message=repr(error))
+
+
+async def sync_windows(
+    session: AsyncSession,
+    user_ids: list[int],
+    overlap_days: int = settings.SYNC_INCREMENTAL_OVERLAP_DAYS,
+) -> dict[int, SyncWindow | None]:
+    """
+    Окна инкрементальной синхронизации пользователей. Журнал разбирается с даты его последней оценки
+    или последней синхронизации (что раньше) минус `overlap_days` - так ловятся оценки, выставленные
+    задним числом за последние дни. None - пользователь еще не синхронизировался, нужна полная синхронизация.
+    """
+    last_dates = await GradesService.last_dates(session, user_ids)
+    result = await session.execute(select(User.id, User.last_sync).where(User.id.in_(user_ids)))
+    last_syncs = dict(result.tuples())
+
+    windows: dict[int, SyncWindow | None] = {}
+    overlap = timedelta(days=overlap_days)
+    for user_id in user_ids:
+        last_sync = last_syncs.get(user_id)
+        if last_sync is None:
+            windows[user_id] = None
+            continue
+        synced_on = last_sync.date()
+        windows[user_id] = SyncWindow(
+            since={code: min(last_date, synced_on) - overlap for code, last_date in last_dates[user_id].items()}
+        )
+    return windows
+
+
+async def apply_parsed(
+    session: AsyncSession,
+    user_id: int,
+    parsed_data: list[dict[str, Any]],
+    *,
+    full: bool = True,
+) -> SyncResult:
+    """
+    Сохранить распарсенные оценки и хэши журналов пользователя.
+    Хэш описывает весь журнал, поэтому после инкрементальной синхронизации (разобрана только часть дат)
+    он не сохраняется: иначе полная синхронизация пропустила бы исправления в старых датах.
+    """
+    new_count, updated_count = await store_grades(session, user_id, parsed_data)
+    # Хэши сохраняются только после commit, иначе упавшая запись пропустила бы журнал навсегда
+    if full:
+        await journal_hashes.save(
+            user_id,
+            {item["journal"]["code"]: item["hash"] for item in parsed_data if not item["unchanged"]},
+        )
+    if new_count:
+        await clear_cache(get_user_context, user_id)
+    return SyncResult(
+        user_id=user_id,
+        status=SyncStatus.SUCCESS,
+        new_grades=new_count,
+        updated_grades=updated_count,
+    )
+
+
+async def record_sync(session: AsyncSession, result: SyncResult, sync_type: SyncType, *, full: bool = True) -> None:
+    """Записать лог синхронизации и время последней (и последней полной, если она удалась) синхронизации."""
+    await SyncLogsService.create(
+        session,
+        user_id=result.user_id,
+        sync_type=sync_type,
+        status=result.status,
+        new_grades_count=result.new_grades,
+        updated_grades_count=result.updated_grades,
+        message=result.message,
+    )
+
+    now = utcnow()
+    await update_last_sync(session, result.user_id, now, full=full and result.status == SyncStatus.SUCCESS)
+    if sync_type == SyncType.WATCH_MODE:
+        await update_watch_mode_last_sync(session, result.user_id, now)
+
+
+async def sync_user(
+    session: AsyncSession,
+    user_id: int,
+    sync_type: SyncType = SyncType.MANUAL,
+    parser: JournalParser | None = None,
+    *,
+    full: bool = True,
+) -> SyncResult:
+    """
+    Синхронизировать оценки пользователя с edu-tpi и записать лог синхронизации.
+    full=False - инкрементальная синхронизация (см. `sync_windows`), если пользователь уже синхронизировался.
+    """
+    parser = parser or JournalParser()
+    window = None if full else (await sync_windows(session, [user_id]))[user_id]
+    full = window is None
+
+    username, password = await get_edu_credentials(session, user_id)
+    if not username or not password:
+        result = SyncResult(user_id=user_id, status=SyncStatus.FAILED, message="No edu credentials")
+    else:
+        # Страница техработ вместо JSON или изменившийся ответ - такая же неудачная синхронизация:
+        # без лога и last_sync пользователь стал бы due на каждом тике планировщика
+        try:
+            known_hashes = await journal_hashes.load(user_id)
+            parsed_data = await parser.parse_grades(username, password, known_hashes=known_hashes, window=window)
+        except JOURNAL_ERRORS as e:
+            result = error_result(user_id, e)
+        else:
+            result = await apply_parsed(session, user_id, parsed_data, full=full)
+
+    await record_sync(session, result, sync_type, full=full)
+    return result
@@ -5,7 +5,7 @@ from sqlalchemy import desc, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.database.models import SyncLog
-from bot.database.models.sync_logs import SyncStatus
+from bot.database.models.sync_log import SyncStatus, SyncType
 
 if TYPE_CHECKING:
     from sqlalchemy.ext.asyncio import AsyncSession
@@ -15,20 +15,25 @@ class SyncLogsService:
     """Сервис для работы с логами синхронизации (SyncLogs)."""
 
     @classmethod
-    async def create(
+    async def create(  # noqa: PLR0913
         cls,
         session: AsyncSession,
         user_id: int,
-        status: str,
-        error_msg: str | None = None,
-        grades_count: int = 0,
+        sync_type: SyncType,
+        status: SyncStatus,
+        new_grades_count: int = 0,
+        updated_grades_count: int = 0,
+        message: str | None = None,
     ) -> SyncLog:
         """Создать лог синхронизации."""
+        max_message_length = 500
         log = SyncLog(
             user_id=user_id,
-            status=status,
-            error_msg=error_msg,
-            grades_count=grades_count,
+            sync_type=sync_type,
+            status=status.value,
+            new_grades_count=new_grades_count,
+            updated_grades_count=updated_grades_count,
+            message=message[:max_message_length] if message else None,
         )
         session.add(log)
         await session.commit()
@@ -61,7 +66,7 @@ class SyncLogsService:
         """Получить логи с ошибками пользователя."""
         query = (
             select(SyncLog)  # Запрос
-            .filter_by(user_id=user_id, status=SyncStatus.FAILED)
+            .filter_by(user_id=user_id, status=SyncStatus.FAILED.value)
             .order_by(desc(SyncLog.created_at))
         )
         result = await session.execute(query)
@@ -0,0 +1,149 @@
+from __future__ import annotations
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import time
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any
+
+import orjson
+from cachetools import LRUCache
+from cryptography.fernet import Fernet, InvalidToken
+from loguru import logger
+
+from bot.core.config import settings
+from bot.core.loader import redis_client
+from bot.services.api_client import InvalidCredsError, auth_post, get_fingerprint
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+# Токен считается истекшим немного раньше срока, чтобы не отправлять запросы с почти мертвым токеном
+EXPIRY_MARGIN = 60
+
+
+@dataclass(slots=True)
+class EduToken:
+    access_token: str
+    fingerprint: str
+    expires_at: float  # unix timestamp
+
+    @property
+    def is_expired(self) -> bool:
+        return time.time() >= self.expires_at - EXPIRY_MARGIN
+
+
+def _jwt_expires_at(access_token: str) -> float | None:
+    """Достает claim `exp` из JWT без проверки подписи. Возвращает None, если токен не JWT."""
+    parts = access_token.split(".")
+    jwt_parts = 3
+    if len(parts) != jwt_parts:
+        return None
+    payload = parts[1] + "=" * (-len(parts[1]) % 4)
+    try:
+        claims = orjson.loads(base64.urlsafe_b64decode(payload))
+    except (binascii.Error, ValueError):
+        return None
+    exp = claims.get("exp") if isinstance(claims, dict) else None
+    return float(exp) if isinstance(exp, int | float) else None
+
+
+class TokenStore:
+    """Кэш access token'ов edu-tpi: L1 в памяти процесса и L2 в Redis.
+
+    Ключ - HMAC пары логин/пароль на ENCRYPTION_KEY, поэтому неверный пароль никогда не попадет на чужой
+    токен, а пароли нельзя подобрать по ключам из Redis без ключа шифрования.
+    Токен и fingerprint хранятся до истечения срока, конкурентные обновления одного ключа
+    объединяются в один запрос к /api/tokenauth.
+    """
+
+    def __init__(
+        self,
+        redis: Redis = redis_client,
+        namespace: str = "edu_token",
+        l1_maxsize: int = 10_000,
+    ) -> None:
+        self.redis = redis
+        self.namespace = namespace
+        self._l1: LRUCache[str, EduToken] = LRUCache(maxsize=l1_maxsize)
+        self._inflight: dict[str, asyncio.Task[EduToken]] = {}
+        self._fernet = Fernet(settings.ENCRYPTION_KEY.encode())
+        self._key_secret = settings.ENCRYPTION_KEY.encode()
+
+    def _key(self, username: str, password: str) -> str:
+        digest = hmac.new(self._key_secret, f"{username}\0{password}".encode(), hashlib.sha256).hexdigest()
+        return f"{self.namespace}:{digest}"
+
+    async def get_token(self, username: str, password: str) -> EduToken:
+        """Вернуть действующий токен пользователя, при необходимости авторизовавшись заново."""
+        key = self._key(username, password)
+
+        token = self._l1.get(key)
+        if token is not None and not token.is_expired:
+            return token
+
+        token = await self._load(key)
+        if token is not None and not token.is_expired:
+            self._l1[key] = token
+            return token
+
+        return await self._refresh(key, username, password, token)
+
+    async def invalidate(self, username: str, password: str) -> None:
+        """Сбросить токен (например, после 401). Следующий get_token авторизуется заново."""
+        key = self._key(username, password)
+        token = self._l1.pop(key, None)
+        await self.redis.delete(key)
+        if token is not None:
+            # fingerprint переживает токен: следующая авторизация обойдется без лишнего запроса
+            self._l1[key] = EduToken(access_token="", fingerprint=token.fingerprint, expires_at=0)
+
+    async def _refresh(self, key: str, username: str, password: str, stale: EduToken | None) -> EduToken:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._authenticate(key, username, password, stale))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _authenticate(self, key: str, username: str, password: str, stale: EduToken | None) -> EduToken:
+        fingerprint = stale.fingerprint if stale and stale.fingerprint else ""
+        if fingerprint:
+            try:
+                auth_data = await auth_post(username, password, fingerprint)
+            except InvalidCredsError:
+                # fingerprint мог устареть - пробуем с новым
+                logger.debug("edu-tpi auth with cached fingerprint failed, requesting a new one")
+                fingerprint = ""
+        if not fingerprint:
+            fingerprint = await get_fingerprint()
+            auth_data = await auth_post(username, password, fingerprint)
+
+        access_token = str(auth_data["accessToken"])
+        expires_at = _jwt_expires_at(access_token) or time.time() + settings.EDU_TOKEN_TTL
+        token = EduToken(access_token=access_token, fingerprint=fingerprint, expires_at=expires_at)
+
+        await self._store(key, token)
+        return token
+
+    async def _load(self, key: str) -> EduToken | None:
+        raw = await self.redis.get(key)
+        if raw is None:
+            return self._l1.get(key)
+        try:
+            data: dict[str, Any] = orjson.loads(self._fernet.decrypt(raw))
+        except (InvalidToken, orjson.JSONDecodeError):
+            return None
+        return EduToken(**data)
+
+    async def _store(self, key: str, token: EduToken) -> None:
+        self._l1[key] = token
+        ttl = int(token.expires_at - time.time())
+        if ttl <= 0:
+            return
+        await self.redis.set(key, self._fernet.encrypt(orjson.dumps(asdict(token))), ex=ttl)
+
+
+token_store = TokenStore()
@@ -0,0 +1,421 @@
+from __future__ import annotations
+import asyncio
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+import aiohttp
+import prometheus_client
+from loguru import logger
+
+from bot.core.config import METRICS_PREFIX, settings
+from bot.services.http_client import get_http_session
+
+if TYPE_CHECKING:
+    from multidict import CIMultiDictProxy
+
+    from bot.utils.rate_limit import TokenBucket
+
+# Statuses that mean "edu-tpi is struggling", not "the request is wrong": retried and counted as failures
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+BREAKER_CLOSED = 0
+BREAKER_HALF_OPEN = 1
+BREAKER_OPEN = 2
+
+UPSTREAM_REQUESTS = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_upstream_requests",
+    documentation="Total edu-tpi request attempts by endpoint and result (ok, error, timeout, rejected).",
+    labelnames=["endpoint", "result"],
+)
+UPSTREAM_LATENCY = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_upstream_latency",
+    documentation="Histogram of edu-tpi request attempt time by endpoint (in seconds).",
+    labelnames=["endpoint"],
+    unit="seconds",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30),
+)
+UPSTREAM_RETRIES = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_upstream_retries",
+    documentation="Total edu-tpi retries by endpoint and result (retried, budget_exhausted, deadline).",
+    labelnames=["endpoint", "result"],
+)
+UPSTREAM_BREAKER_STATE = prometheus_client.Gauge(
+    name=f"{METRICS_PREFIX}_upstream_breaker_state",
+    documentation="Circuit breaker state of an edu-tpi endpoint (0 - closed, 1 - half-open, 2 - open).",
+    labelnames=["endpoint"],
+)
+UPSTREAM_CONCURRENCY_LIMIT = prometheus_client.Gauge(
+    name=f"{METRICS_PREFIX}_upstream_concurrency_limit",
+    documentation="Current adaptive concurrency limit of an edu-tpi endpoint.",
+    labelnames=["endpoint"],
+)
+UPSTREAM_IN_FLIGHT = prometheus_client.Gauge(
+    name=f"{METRICS_PREFIX}_upstream_in_flight",
+    documentation="edu-tpi requests of an endpoint currently in flight.",
+    labelnames=["endpoint"],
+)
+
+
+class UpstreamUnavailableError(aiohttp.ClientError):
+    """edu-tpi was not asked at all (open circuit); handled wherever network errors already are."""
+
+
+@dataclass(slots=True)
+class UpstreamResponse:
+    status: int
+    body: bytes
+    headers: CIMultiDictProxy[str]
+    request_info: aiohttp.RequestInfo
+
+    def raise_for_status(self) -> None:
+        http_bad_request = 400
+        if self.status >= http_bad_request:
+            raise aiohttp.ClientResponseError(
+                self.request_info,
+                (),
+                status=self.status,
+                message=f"edu-tpi responded {self.status}",
+                headers=self.headers,
+            )
+
+
+@dataclass(frozen=True, slots=True)
+class BreakerPermit:
+    """Ticket for one allowed call; the breaker only trusts outcomes of the state that issued it."""
+
+    generation: int
+    probe: bool = False
+
+
+class CircuitBreaker:
+    """Stops calling an endpoint after `failure_threshold` failures in a row.
+
+    While open, calls are rejected right away; after `reset_timeout` seconds one probe is let through
+    (half-open) and only its outcome closes or reopens the circuit. Calls started under an earlier state
+    (e.g. still in flight when the circuit opened) are ignored when they finish.
+    """
+
+    def __init__(self, endpoint: str, failure_threshold: int, reset_timeout: float) -> None:
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = BREAKER_CLOSED
+        self._generation = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        UPSTREAM_BREAKER_STATE.labels(endpoint=endpoint).set(self.state)
+
+    def _set_state(self, state: int) -> None:
+        if state != self.state:
+            logger.warning(f"edu-tpi circuit {('closed', 'half-open', 'open')[state]} | endpoint: {self.endpoint}")
+            self._generation += 1
+        self.state = state
+        UPSTREAM_BREAKER_STATE.labels(endpoint=self.endpoint).set(state)
+
+    def _trip(self) -> None:
+        self._opened_at = time.monotonic()
+        self._set_state(BREAKER_OPEN)
+
+    def allow(self) -> BreakerPermit | None:
+        """A permit to call the endpoint, or None while the circuit is open (or the probe is taken)."""
+        if self.state == BREAKER_OPEN:
+            if time.monotonic() < self._opened_at + self.reset_timeout:
+                return None
+            self._set_state(BREAKER_HALF_OPEN)
+        if self.state == BREAKER_HALF_OPEN:
+            if self._probing:
+                return None
+            self._probing = True
+            return BreakerPermit(self._generation, probe=True)
+        return BreakerPermit(self._generation)
+
+    def record(self, permit: BreakerPermit, ok: bool | None) -> None:
+        """Outcome of a permitted call; None - no verdict (cancelled), only frees the half-open probe."""
+        if permit.probe:
+            self._probing = False
+            if ok is None:
+                return
+            if ok:
+                self._failures = 0
+                self._set_state(BREAKER_CLOSED)
+            else:
+                self._trip()
+            return
+
+        if ok is None or permit.generation != self._generation:
+            return
+        if ok:
+            self._failures = 0
+            return
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            self._failures = 0
+            self._trip()
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit of an endpoint.
+
+    Every fast successful call raises the limit by 1/limit (about +1 per round of calls), a failure or
+    a call slower than `latency_target` multiplies it by `decrease` - at most once per `latency_target`
+    seconds, so one slow burst is not punished many times. Callers over the limit wait in FIFO order.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        endpoint: str,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        latency_target: float,
+        decrease: float = 0.7,
+    ) -> None:
+        self.endpoint = endpoint
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.decrease = decrease
+
+        self.limit = float(initial)
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self._decreased_at = 0.0
+        self._report()
+
+    def _report(self) -> None:
+        UPSTREAM_CONCURRENCY_LIMIT.labels(endpoint=self.endpoint).set(int(self.limit))
+        UPSTREAM_IN_FLIGHT.labels(endpoint=self.endpoint).set(self.in_flight)
+
+    async def acquire(self) -> None:
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self._report()
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over right before the cancellation: pass it on
+                self.release(None, None)
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, latency: float | None, ok: bool | None) -> None:
+        """Free a slot and adapt the limit; ok=None - no verdict (cancelled)."""
+        self.in_flight -= 1
+        if ok and latency is not None and latency <= self.latency_target:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        elif ok is not None:
+            now = time.monotonic()
+            if now - self._decreased_at >= self.latency_target:
+                self._decreased_at = now
+                self.limit = max(self.minimum, self.limit * self.decrease)
+
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+        self._report()
+
+
+class RetryBudget:
+    """Retries allowed as a share of requests: each request deposits `ratio`, each retry spends 1.
+
+    `min_per_second` retries are always allowed, so a quiet process can still retry. The budget is
+    shared by all endpoints: when edu-tpi is down, retries cannot multiply the load on it.
+    """
+
+    def __init__(self, ratio: float, min_per_second: float = 1.0, capacity: float = 100.0) -> None:
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.min_per_second)
+        self._updated_at = now
+
+    def deposit(self) -> None:
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        self._refill()
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class UpstreamClient:
+    """edu-tpi HTTP calls with a circuit breaker and an adaptive concurrency limit per endpoint.
+
+    Each request has a deadline for all of its attempts; every attempt is also capped by `attempt_timeout`.
+    Connection errors, timeouts and RETRYABLE_STATUSES are retried up to `max_retries` times with full jitter
+    backoff, within the shared `RetryBudget` and the deadline. Other statuses are returned to the caller.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        *,
+        deadline: float = settings.EDU_REQUEST_DEADLINE,
+        attempt_timeout: float = settings.EDU_ATTEMPT_TIMEOUT,
+        max_retries: int = settings.EDU_RETRY_MAX,
+        retry_base: float = 0.5,
+        retry_max: float = 8.0,
+        budget: RetryBudget | None = None,
+        breaker_failures: int = settings.EDU_BREAKER_FAILURES,
+        breaker_reset: float = settings.EDU_BREAKER_RESET,
+        limit_initial: int = settings.EDU_LIMIT_INITIAL,
+        limit_min: int = settings.EDU_LIMIT_MIN,
+        limit_max: int = settings.EDU_LIMIT_MAX,
+        latency_target: float = settings.EDU_LATENCY_TARGET,
+    ) -> None:
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.budget = budget or RetryBudget(ratio=settings.EDU_RETRY_BUDGET)
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+        self.limit_initial = limit_initial
+        self.limit_min = limit_min
+        self.limit_max = limit_max
+        self.latency_target = latency_target
+
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._limits: dict[str, AdaptiveLimit] = {}
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        if endpoint not in self._breakers:
+            self._breakers[endpoint] = CircuitBreaker(endpoint, self.breaker_failures, self.breaker_reset)
+        return self._breakers[endpoint]
+
+    def limit(self, endpoint: str) -> AdaptiveLimit:
+        if endpoint not in self._limits:
+            self._limits[endpoint] = AdaptiveLimit(
+                endpoint, self.limit_initial, self.limit_min, self.limit_max, self.latency_target
+            )
+        return self._limits[endpoint]
+
+    async def request(
+        self,
+        endpoint: str,
+        method: str,
+        url: str,
+        *,
+        deadline: float | None = None,
+        rate_limiter: TokenBucket | None = None,
+        **kwargs: Any,
+    ) -> UpstreamResponse:
+        """
+        Call edu-tpi; `endpoint` names the breaker and limit, kwargs go to `ClientSession.request`.
+        `rate_limiter` is acquired before every attempt, so retries stay within the caller's rate limit.
+        """
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + (deadline or self.deadline)
+        self.budget.deposit()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await self._attempt(endpoint, method, url, give_up_at - loop.time(), rate_limiter, kwargs)
+            except UpstreamUnavailableError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                delay = self._retry_delay(endpoint, attempt, give_up_at - loop.time())
+                if delay is None:
+                    raise
+            else:
+                if response.status not in RETRYABLE_STATUSES:
+                    return response
+                delay = self._retry_delay(endpoint, attempt, give_up_at - loop.time())
+                if delay is None:
+                    return response
+            await asyncio.sleep(delay)
+
+    def _retry_delay(self, endpoint: str, attempt: int, remaining: float) -> float | None:
+        """Backoff before the next attempt, or None if the request should give up now."""
+        if attempt > self.max_retries:
+            return None
+        delay = random.uniform(0, min(self.retry_max, self.retry_base * 2**attempt))  # noqa: S311
+        if delay >= remaining:
+            UPSTREAM_RETRIES.labels(endpoint=endpoint, result="deadline").inc()
+            return None
+        if not self.budget.withdraw():
+            UPSTREAM_RETRIES.labels(endpoint=endpoint, result="budget_exhausted").inc()
+            return None
+        UPSTREAM_RETRIES.labels(endpoint=endpoint, result="retried").inc()
+        return delay
+
+    async def _attempt(  # noqa: PLR0913
+        self,
+        endpoint: str,
+        method: str,
+        url: str,
+        remaining: float,
+        rate_limiter: TokenBucket | None,
+        kwargs: dict[str, Any],
+    ) -> UpstreamResponse:
+        breaker = self.breaker(endpoint)
+        if remaining <= 0:
+            UPSTREAM_REQUESTS.labels(endpoint=endpoint, result="timeout").inc()
+            raise asyncio.TimeoutError
+        permit = breaker.allow()
+        if permit is None:
+            UPSTREAM_REQUESTS.labels(endpoint=endpoint, result="rejected").inc()
+            msg = f"edu-tpi circuit is open | endpoint: {endpoint}"
+            raise UpstreamUnavailableError(msg)
+
+        limit = self.limit(endpoint)
+        ok: bool | None = None
+        acquired = False
+        started_at = time.monotonic()
+        try:
+            if rate_limiter is not None:
+                await asyncio.wait_for(rate_limiter.acquire(), remaining)
+            await asyncio.wait_for(limit.acquire(), remaining - (time.monotonic() - started_at))
+            acquired = True
+            timeout = min(self.attempt_timeout, remaining - (time.monotonic() - started_at))
+            started_at = time.monotonic()
+            async with get_http_session().request(
+                method, url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs
+            ) as resp:
+                body = await resp.read()
+                response = UpstreamResponse(resp.status, body, resp.headers, resp.request_info)
+        except asyncio.TimeoutError:
+            ok = False
+            UPSTREAM_REQUESTS.labels(endpoint=endpoint, result="timeout").inc()
+            raise
+        except aiohttp.ClientError:
+            ok = False
+            UPSTREAM_REQUESTS.labels(endpoint=endpoint, result="error").inc()
+            raise
+        else:
+            ok = response.status not in RETRYABLE_STATUSES
+            UPSTREAM_REQUESTS.labels(endpoint=endpoint, result="ok" if ok else "error").inc()
+            return response
+        finally:
+            latency = time.monotonic() - started_at
+            if acquired:
+                UPSTREAM_LATENCY.labels(endpoint=endpoint).observe(latency)
+                limit.release(latency, ok)
+            # Waiting for our own limits is not the endpoint's fault: such a timeout gives no verdict
+            breaker.record(permit, ok if acquired else None)
+
+
+edu_client = UpstreamClient()
@@ -1,19 +1,21 @@
 from __future__ import annotations
+import datetime  # noqa: TC003 - RowSerializer разбирает аннотации UserRow через get_type_hints
 import logging
-from typing import TYPE_CHECKING
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, NamedTuple
 
 from cryptography.fernet import Fernet, InvalidToken
-from sqlalchemy import func, select, update
+from sqlalchemy import exists, func, select, update
 
-from bot.cache.redis import build_key, cached, clear_cache
+from bot.cache.redis import build_key, cached, cached_many, clear_cache
+from bot.cache.serialization import RowSerializer
 from bot.core.config import settings
-from bot.database.models import User
+from bot.database.database import sessionmaker
+from bot.database.models import Grade, User
 
 logger = logging.getLogger(__name__)
 
 if TYPE_CHECKING:
-    from datetime import datetime
-
     from aiogram.types import User as tg_User
     from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -32,10 +34,51 @@ async def add_user(
     session.add(new_user)
     await session.commit()
     await clear_cache(user_exists, user.id)
+    await clear_cache(get_user_context, user.id)
     return new_user
 
 
-@cached(key_builder=lambda session, user_id: build_key(user_id))
+@dataclass(slots=True)
+class UserContext:
+    """Все, что нужно middlewares и хендлерам почти каждого апдейта, одной выборкой из users."""
+
+    user_id: int
+    exists: bool = False
+    language_code: str | None = None
+    is_authenticated: bool = False
+    is_admin: bool = False
+    full_name: str | None = None
+    has_grades: bool = False
+
+
+@cached(key_builder=lambda session, user_id: build_key(user_id), local=True)
+async def get_user_context(session: AsyncSession, user_id: int) -> UserContext:
+    """Загрузить контекст пользователя одним запросом. Для незарегистрированного пользователя exists=False."""
+    query = select(
+        User.language_code,
+        User.is_authenticated,
+        User.is_admin,
+        User.full_name,
+        exists().where(Grade.user_id == User.id).label("has_grades"),
+    ).where(User.id == user_id)
+
+    result = await session.execute(query)
+    row = result.one_or_none()
+
+    if row is None:
+        return UserContext(user_id=user_id)
+    return UserContext(
+        user_id=user_id,
+        exists=True,
+        language_code=row.language_code,
+        is_authenticated=bool(row.is_authenticated),
+        is_admin=bool(row.is_admin),
+        full_name=row.full_name,
+        has_grades=bool(row.has_grades),
+    )
+
+
+@cached(key_builder=lambda session, user_id: build_key(user_id), local=True)
 async def user_exists(session: AsyncSession, user_id: int) -> bool:
     """Checks if the user is in the database."""
     query = select(User.id).filter_by(id=user_id).limit(1)
@@ -56,7 +99,7 @@ async def get_full_name(session: AsyncSession, user_id: int) -> str:
     return full_name or ""
 
 
-@cached(key_builder=lambda session, user_id: build_key(user_id))
+@cached(key_builder=lambda session, user_id: build_key(user_id), local=True)
 async def get_language_code(session: AsyncSession, user_id: int) -> str:
     query = select(User.language_code).filter_by(id=user_id)
 
@@ -76,6 +119,7 @@ async def set_language_code(
     await session.execute(stmt)
     await session.commit()
     await clear_cache(get_language_code, user_id)
+    await clear_cache(get_user_context, user_id)
 
 
 async def set_user_data(  # noqa: PLR0913
@@ -102,6 +146,7 @@ async def set_user_data(  # noqa: PLR0913
     await session.execute(stmt)
     await session.commit()
     await clear_cache(is_authorized, user_id)
+    await clear_cache(get_user_context, user_id)
 
 
 @cached(key_builder=lambda session, user_id: build_key(user_id))
@@ -119,16 +164,49 @@ async def set_is_admin(session: AsyncSession, user_id: int, is_admin: bool) -> N
 
     await session.execute(stmt)
     await session.commit()
-
-
-@cached(key_builder=lambda session: build_key())
-async def get_all_users(session: AsyncSession) -> list[User]:
-    query = select(User)
+    await clear_cache(get_user_context, user_id)
+
+
+class UserRow(NamedTuple):
+    """Колонки таблицы users без ORM-состояния: так список пользователей компактно хранится в кэше."""
+
+    id: int
+    language_code: str | None
+    edu_login_encrypted: str | None
+    edu_password_encrypted: str | None
+    edu_user_id: int | None
+    group_id: int | None
+    group_name: str | None
+    full_name: str | None
+    is_authenticated: bool
+    notification_enabled: bool
+    morning_notification_enabled: bool
+    morning_notification_time: datetime.time | None
+    watch_mode_expires_at: datetime.datetime | None
+    watch_mode_last_sync_at: datetime.datetime | None
+    last_sync: datetime.datetime | None
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+    is_admin: bool
+
+
+@cached(
+    key_builder=lambda session: build_key(),
+    serializer=RowSerializer(
+        UserRow,
+        codec=settings.CACHE_COMPRESSION,
+        compress_threshold=settings.CACHE_COMPRESS_THRESHOLD,
+    ),
+    lock=True,
+    stale_ttl=60,
+    session_factory=sessionmaker,
+)
+async def get_all_users(session: AsyncSession) -> list[UserRow]:
+    query = select(*(getattr(User, name) for name in UserRow._fields))
 
     result = await session.execute(query)
 
-    users = result.scalars()
-    return list(users)
+    return [UserRow._make(row) for row in result.tuples()]
 
 
 @cached(key_builder=lambda session: build_key())
@@ -141,7 +219,7 @@ async def get_admins_ids(session: AsyncSession) -> list[int]:
     return list(admin_ids)
 
 
-@cached(key_builder=lambda session: build_key())
+@cached(key_builder=lambda session: build_key(), lock=True, stale_ttl=60, session_factory=sessionmaker)
 async def get_user_count(session: AsyncSession) -> int:
     query = select(func.count()).select_from(User)
 
@@ -151,6 +229,25 @@ async def get_user_count(session: AsyncSession) -> int:
     return int(count)
 
 
+def _decrypt_credentials(
+    user_id: int,
+    login_encrypted: str | None,
+    password_encrypted: str | None,
+) -> tuple[str | None, str | None]:
+    if not login_encrypted or not password_encrypted:
+        return None, None
+
+    fernet = Fernet(settings.ENCRYPTION_KEY.encode())
+    username = None
+    password = None
+    try:
+        username = fernet.decrypt(login_encrypted.encode()).decode()
+        password = fernet.decrypt(password_encrypted.encode()).decode()
+    except InvalidToken:
+        logger.warning("Failed to decrypt edu credentials for user_id=%d", user_id)
+    return username, password
+
+
 @cached(key_builder=lambda session, user_id: build_key(user_id))
 async def get_edu_credentials(session: AsyncSession, user_id: int) -> tuple[str | None, str | None]:
     """Получить расшифрованные edu credentials пользователя."""
@@ -159,18 +256,27 @@ async def get_edu_credentials(session: AsyncSession, user_id: int) -> tuple[str
     result = await session.execute(query)
     row = result.fetchone()
 
-    if not row or not row[0] or not row[1]:
+    if not row:
         return None, None
+    return _decrypt_credentials(user_id, row[0], row[1])
 
-    fernet = Fernet(settings.ENCRYPTION_KEY.encode())
-    username = None
-    password = None
-    try:
-        username = fernet.decrypt(row[0].encode()).decode()
-        password = fernet.decrypt(row[1].encode()).decode()
-    except InvalidToken:
-        logger.warning("Failed to decrypt edu credentials for user_id=%d", user_id)
-    return username, password
+
+@cached_many(get_edu_credentials)
+async def get_edu_credentials_many(
+    session: AsyncSession,
+    user_ids: list[int],
+) -> dict[int, tuple[str | None, str | None]]:
+    """Получить расшифрованные edu credentials нескольких пользователей одним запросом.
+    Кэш общий с get_edu_credentials.
+    """
+    query = select(User.id, User.edu_login_encrypted, User.edu_password_encrypted).where(User.id.in_(user_ids))
+
+    result = await session.execute(query)
+
+    credentials: dict[int, tuple[str | None, str | None]] = dict.fromkeys(user_ids, (None, None))
+    for user_id, login_encrypted, password_encrypted in result.tuples():
+        credentials[user_id] = _decrypt_credentials(user_id, login_encrypted, password_encrypted)
+    return credentials
 
 
 async def set_edu_credentials(session: AsyncSession, user_id: int, username: str, password: str) -> None:
@@ -199,9 +305,19 @@ async def is_authorized(session: AsyncSession, user_id: int) -> bool:
     return bool(is_authenticated)
 
 
-async def update_last_sync(session: AsyncSession, user_id: int, timestamp: datetime) -> None:
-    """Обновить время последней синхронизации."""
-    stmt = update(User).where(User.id == user_id).values(last_sync=timestamp)
+async def update_last_sync(
+    session: AsyncSession, user_id: int, timestamp: datetime.datetime, *, full: bool = True
+) -> None:
+    """Обновить время последней синхронизации (и последней полной, если синхронизация была полной)."""
+    values = {"last_sync": timestamp, "last_full_sync": timestamp} if full else {"last_sync": timestamp}
+    stmt = update(User).where(User.id == user_id).values(**values)
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def update_watch_mode_last_sync(session: AsyncSession, user_id: int, timestamp: datetime.datetime) -> None:
+    """Обновить время последней синхронизации в режиме наблюдения."""
+    stmt = update(User).where(User.id == user_id).values(watch_mode_last_sync_at=timestamp)
     await session.execute(stmt)
     await session.commit()
 
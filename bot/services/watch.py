@@ -0,0 +1,320 @@
+from __future__ import annotations
+import asyncio
+import time
+from contextlib import suppress
+from datetime import timedelta
+from typing import TYPE_CHECKING, cast
+
+import orjson
+import prometheus_client
+from loguru import logger
+from sqlalchemy import func, or_, select, update
+
+from bot.cache.redis import clear_cache
+from bot.core.config import METRICS_PREFIX, settings
+from bot.core.loader import redis_client
+from bot.database.database import sessionmaker
+from bot.database.models import User
+from bot.database.models.sync_log import SyncStatus, SyncType
+from bot.services.journal_parser import JOURNAL_ERRORS, JournalParser, PollCost, WatchState
+from bot.services.sync import SyncResult, error_result, store_grades
+from bot.services.sync_logs import SyncLogsService
+from bot.services.users import get_edu_credentials, get_user_context, update_watch_mode_last_sync
+from bot.utils.misc import utcnow
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+WATCH_POLLS = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_watch_polls",
+    documentation="Total watch mode polls by result (changed, unchanged, failed).",
+    labelnames=["result"],
+)
+WATCH_POLL_REQUESTS = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_watch_poll_requests",
+    documentation="Histogram of edu-tpi requests made by one watch mode poll.",
+    buckets=(1, 2, 5, 10, 15, 20, 30, 50),
+)
+WATCH_POLL_BYTES = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_watch_poll_bytes",
+    documentation="Histogram of bytes downloaded by one watch mode poll.",
+    unit="bytes",
+    buckets=(0, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000),
+)
+WATCH_POLL_DURATION = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_watch_poll_duration",
+    documentation="Histogram of one watch mode poll time (in seconds).",
+    unit="seconds",
+    buckets=(0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+)
+WATCH_JOURNALS_SKIPPED = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_watch_journals_skipped",
+    documentation="Total journals a watch mode poll did not parse, by reason (not_modified, unchanged).",
+    labelnames=["reason"],
+)
+WATCHERS = prometheus_client.Gauge(
+    name=f"{METRICS_PREFIX}_watchers",
+    documentation="Users currently in watch mode.",
+)
+WATCH_EXPIRED = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_watch_expired",
+    documentation="Total watch modes turned off because they expired.",
+)
+
+
+class WatchStateStore:
+    """Состояние опросов режима наблюдения в Redis (см. `WatchState`). Живет не дольше самого режима."""
+
+    def __init__(
+        self,
+        redis: Redis = redis_client,
+        namespace: str = "watch",
+        ttl: int = settings.SYNC_WATCH_DURATION,
+    ) -> None:
+        self.redis = redis
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.namespace}:{user_id}"
+
+    async def load(self, user_id: int) -> WatchState:
+        raw = cast("bytes | None", await self.redis.get(self._key(user_id)))
+        if raw is None:
+            return WatchState()
+        data = orjson.loads(raw)
+        return WatchState(
+            journals=data["journals"],
+            listed_at=data["listed_at"],
+            etags=data["etags"],
+            hashes=data["hashes"],
+        )
+
+    async def save(self, user_id: int, state: WatchState) -> None:
+        payload = {
+            "journals": state.journals,
+            "listed_at": state.listed_at,
+            "etags": state.etags,
+            "hashes": state.hashes,
+        }
+        await self.redis.set(self._key(user_id), orjson.dumps(payload), ex=self.ttl)
+
+    async def clear(self, *user_ids: int) -> None:
+        if user_ids:
+            await self.redis.delete(*(self._key(user_id) for user_id in user_ids))
+
+
+watch_states = WatchStateStore()
+
+
+async def poll_user(  # noqa: PLR0913
+    session: AsyncSession,
+    user_id: int,
+    parser: JournalParser,
+    cost: PollCost,
+    *,
+    days: int = settings.SYNC_WATCH_DAYS,
+    list_ttl: int = settings.SYNC_WATCH_LIST_TTL,
+    states: WatchStateStore = watch_states,
+) -> SyncResult:
+    """
+    Опросить оценки пользователя в режиме наблюдения (см. `JournalParser.poll_recent`).
+    Обновляет только watch_mode_last_sync_at: полная синхронизация идет по своему расписанию.
+    Лог синхронизации пишется, только если что-то изменилось или опрос не удался.
+    """
+    username, password = await get_edu_credentials(session, user_id)
+    if not username or not password:
+        result = SyncResult(user_id=user_id, status=SyncStatus.FAILED, message="No edu credentials")
+    else:
+        # Любая ошибка опроса пишет FAILED и сдвигает watch_mode_last_sync_at, иначе опрос повторялся бы каждый тик
+        try:
+            state = await states.load(user_id)
+            parsed_data = await parser.poll_recent(username, password, state, cost, days=days, list_ttl=list_ttl)
+        except JOURNAL_ERRORS as e:
+            result = error_result(user_id, e)
+        else:
+            new_count, updated_count = await store_grades(session, user_id, parsed_data)
+            # Состояние сохраняется только после commit, иначе 304 или совпавший хэш скрыли бы незаписанные оценки
+            state.hashes.update({item["journal"]["code"]: item["hash"] for item in parsed_data})
+            await states.save(user_id, state)
+            if new_count:
+                await clear_cache(get_user_context, user_id)
+            result = SyncResult(
+                user_id=user_id,
+                status=SyncStatus.SUCCESS,
+                new_grades=new_count,
+                updated_grades=updated_count,
+            )
+
+    if result.status != SyncStatus.SUCCESS or result.new_grades or result.updated_grades:
+        await SyncLogsService.create(
+            session,
+            user_id=user_id,
+            sync_type=SyncType.WATCH_MODE,
+            status=result.status,
+            new_grades_count=result.new_grades,
+            updated_grades_count=result.updated_grades,
+            message=result.message,
+        )
+    await update_watch_mode_last_sync(session, user_id, utcnow())
+    return result
+
+
+async def set_watch_mode(session: AsyncSession, user_id: int, duration: timedelta | None) -> None:
+    """Включить режим наблюдения на `duration` (первый опрос - на ближайшем проходе) или выключить (None)."""
+    expires_at = utcnow() + duration if duration is not None else None
+    stmt = update(User).where(User.id == user_id).values(watch_mode_expires_at=expires_at, watch_mode_last_sync_at=None)
+    await session.execute(stmt)
+    await session.commit()
+    if duration is None:
+        await watch_states.clear(user_id)
+
+
+class WatchScheduler:
+    """Отдельный ярус частых и дешевых опросов для пользователей в режиме наблюдения (например, в сессию).
+
+    Раз в `interval` секунд каждый наблюдающий опрашивается через `poll_user`: только журналы текущего
+    семестра и оценки за последние `days` дней, с условными запросами и без разбора неизмененных журналов.
+    У яруса свой лимит параллельности, поэтому наблюдающие не ждут очереди полной синхронизации и не
+    занимают ее слоты. Истекший режим выключается на каждом проходе.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = sessionmaker,
+        parser: JournalParser | None = None,
+        *,
+        interval: int = settings.SYNC_WATCH_INTERVAL,
+        tick: int = settings.SYNC_WATCH_TICK,
+        concurrency: int = settings.SYNC_WATCH_CONCURRENCY,
+    ) -> None:
+        self.session_factory = session_factory
+        self.parser = parser or JournalParser()
+        self.interval = timedelta(seconds=interval)
+        self.tick_interval = tick
+        self.concurrency = concurrency
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._in_flight: set[int] = set()
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._runner: asyncio.Task[None] | None = None
+        self._stopping = asyncio.Event()
+
+    def start(self) -> None:
+        if self._runner is None or self._runner.done():
+            self._stopping.clear()
+            self._runner = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._runner is not None:
+            self._runner.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._runner
+            self._runner = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def run_forever(self) -> None:
+        logger.info("watch scheduler started")
+        while not self._stopping.is_set():
+            try:
+                await self.tick()
+            except Exception:  # noqa: BLE001
+                logger.exception("watch scheduler tick failed")
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.tick_interval)
+        logger.info("watch scheduler stopped")
+
+    async def tick(self) -> int:
+        """Один проход: выключить истекшие режимы и запустить опросы, которым пора. Возвращает число опросов."""
+        async with self.session_factory() as session:
+            await self.expire(session)
+            due = await self.fetch_due(session)
+
+        for user_id in due:
+            self._in_flight.add(user_id)
+            task = asyncio.create_task(self._poll(user_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return len(due)
+
+    async def expire(self, session: AsyncSession) -> int:
+        """Выключить режим наблюдения, срок которого истек."""
+        stmt = (
+            update(User)
+            .where(User.watch_mode_expires_at <= utcnow())
+            .values(watch_mode_expires_at=None, watch_mode_last_sync_at=None)
+            .returning(User.id)
+        )
+        expired = list((await session.execute(stmt)).scalars())
+        await session.commit()
+        if expired:
+            await watch_states.clear(*expired)
+            WATCH_EXPIRED.inc(len(expired))
+            logger.info(f"watch mode expired | users: {len(expired)}")
+        return len(expired)
+
+    async def fetch_due(self, session: AsyncSession) -> list[int]:
+        """Наблюдающие, которым пора на опрос, - самые давно опрошенные первыми, не больше свободных слотов."""
+        now = utcnow()
+        watching = (
+            User.watch_mode_expires_at > now,
+            User.is_authenticated.is_(True),
+            User.edu_login_encrypted.is_not(None),
+        )
+        WATCHERS.set((await session.execute(select(func.count()).where(*watching))).scalar_one())
+
+        # Не больше, чем опросов успеет начаться до следующего прохода: остальные подождут в БД, а не в памяти
+        limit = self.concurrency * 2 - len(self._in_flight)
+        if limit <= 0:
+            return []
+        query = (
+            select(User.id)
+            .where(
+                *watching,
+                or_(
+                    User.watch_mode_last_sync_at.is_(None),
+                    User.watch_mode_last_sync_at < now - self.interval,
+                ),
+            )
+            .order_by(User.watch_mode_last_sync_at.asc().nulls_first())
+            .limit(limit)
+        )
+        if self._in_flight:
+            query = query.where(User.id.not_in(self._in_flight))
+        return list((await session.execute(query)).scalars())
+
+    async def _poll(self, user_id: int) -> None:
+        try:
+            async with self._semaphore:
+                cost = PollCost()
+                started_at = time.monotonic()
+                try:
+                    async with self.session_factory() as session:
+                        result = await poll_user(session, user_id, self.parser, cost)
+                except Exception:  # noqa: BLE001
+                    logger.exception(f"unexpected watch poll error | user_id: {user_id}")
+                    outcome = "failed"
+                else:
+                    if result.status != SyncStatus.SUCCESS:
+                        outcome = "failed"
+                    elif result.new_grades or result.updated_grades:
+                        outcome = "changed"
+                    else:
+                        outcome = "unchanged"
+                finally:
+                    WATCH_POLL_DURATION.observe(time.monotonic() - started_at)
+
+            WATCH_POLLS.labels(result=outcome).inc()
+            WATCH_POLL_REQUESTS.observe(cost.requests)
+            WATCH_POLL_BYTES.observe(cost.downloaded)
+            WATCH_JOURNALS_SKIPPED.labels(reason="not_modified").inc(cost.not_modified)
+            WATCH_JOURNALS_SKIPPED.labels(reason="unchanged").inc(cost.unchanged)
+        finally:
+            self._in_flight.discard(user_id)
+
+
+watch_scheduler = WatchScheduler()
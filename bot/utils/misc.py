@@ -1,2 +1,10 @@
+from datetime import datetime, timezone
+
+
 def n_(msg: str) -> str:
     return msg
+
+
+def utcnow() -> datetime:
+    """Текущее время UTC без tzinfo - в таком виде время хранится в колонках DateTime."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
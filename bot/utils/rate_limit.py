@@ -0,0 +1,154 @@
+from __future__ import annotations
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from cachetools import TTLCache
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+# Local limiter state is only a shortcut; anything older than this is asked from Redis again
+LOCAL_STATE_TTL = 60
+
+
+class TokenBucket:
+    """Asynchronous token bucket limiter.
+
+    Refills `rate` tokens per second up to `capacity`. Waiters are served in FIFO order,
+    so one instance can be shared by every coroutine of the process to enforce a global limit.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        if rate <= 0:
+            msg = "rate must be positive"
+            raise ValueError(msg)
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """Wait until `tokens` are available and take them."""
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Take `tokens` without waiting, return False if the bucket is empty."""
+        if self._lock.locked():
+            return False
+        self._refill()
+        if self._tokens < tokens:
+            return False
+        self._tokens -= tokens
+        return True
+
+
+# GCRA on the Redis clock. KEYS[1] - theoretical arrival time (TAT, ms) of the limited key.
+# ARGV: emission interval (ms), burst, lease - extra tokens to reserve for the caller's local fast path.
+# Returns {tokens taken, retry after (ms)}: {0, retry_after} when rejected.
+GCRA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local lease = tonumber(ARGV[3])
+
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+local allow_at = tat + interval - interval * burst
+if now < allow_at then
+    return {0, allow_at - now}
+end
+
+local take = math.min(math.floor((now - allow_at) / interval) + 1, lease + 1)
+local new_tat = tat + interval * take
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return {take, 0}
+"""
+
+
+@dataclass(slots=True)
+class RateLimit:
+    interval: float  # seconds between requests at the sustained rate
+    burst: int = 1  # requests allowed back to back
+
+
+@dataclass(slots=True)
+class _LocalState:
+    tokens: int = 0  # reserved in Redis, usable without asking it again
+    expires_at: float = 0.0  # tokens after this moment are no longer covered by the reservation
+    blocked_until: float = 0.0
+
+
+class GCRALimiter:
+    """Rate limiter shared by every replica through a GCRA Lua script in Redis.
+
+    The local fast path answers without a Redis round trip when it can do so exactly:
+    a key that Redis rejected stays rejected locally until its retry time, and a key with spare
+    capacity reserves up to `lease` extra tokens in Redis that this process then spends locally
+    within one interval. Keys are expected to be namespaced by the caller (e.g. handler key and chat).
+    """
+
+    def __init__(self, redis: Redis, lease: int = 0, local_maxsize: int = 10_000) -> None:
+        self.redis = redis
+        self.lease = lease
+        self._script = redis.register_script(GCRA_SCRIPT)
+        self._local: TTLCache[str, _LocalState] = TTLCache(maxsize=local_maxsize, ttl=LOCAL_STATE_TTL)
+
+    def check_local(self, key: str) -> bool | None:
+        """True/False when the local state decides, None when Redis has to be asked."""
+        state = self._local.get(key)
+        if state is None:
+            return None
+        now = time.monotonic()
+        if now < state.blocked_until:
+            return False
+        if state.tokens > 0 and now < state.expires_at:
+            state.tokens -= 1
+            return True
+        return None
+
+    async def acquire(self, key: str, limit: RateLimit) -> tuple[bool, str]:
+        """(allowed, decided by: "local" or "redis")."""
+        local = self.check_local(key)
+        if local is not None:
+            return local, "local"
+
+        interval_ms = max(1, int(limit.interval * 1000))
+        taken, retry_after_ms = await self._script(keys=[key], args=[interval_ms, limit.burst, self.lease])
+
+        now = time.monotonic()
+        state = self._local.setdefault(key, _LocalState())
+        if not taken:
+            state.tokens = 0
+            state.blocked_until = now + int(retry_after_ms) / 1000
+            return False, "redis"
+        state.tokens = int(taken) - 1
+        state.expires_at = now + limit.interval
+        return True, "redis"
+
+    async def wait(self, key: str, limit: RateLimit) -> None:
+        """Wait until `key` lets one request through; waiters of one process are not ordered.
+
+        Rejected waiters sleep until the retry time plus a random share of one interval, so they do not
+        all come back to Redis at the same moment for the single slot that opens.
+        """
+        while True:
+            allowed, _ = await self.acquire(key, limit)
+            if allowed:
+                return
+            state = self._local.get(key)
+            delay = state.blocked_until - time.monotonic() if state is not None else limit.interval
+            await asyncio.sleep(max(delay, 0.001) + random.uniform(0, limit.interval))  # noqa: S311
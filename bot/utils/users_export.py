@@ -1,24 +1,93 @@
 from __future__ import annotations
 import csv
+import gzip
 import io
+import tempfile
 from datetime import datetime, timezone
+from typing import IO, TYPE_CHECKING, Any, Literal
 
-from aiogram.types import BufferedInputFile
+import orjson
+from aiogram.types import InputFile
+from sqlalchemy import select
 
 from bot.database.models import User
 
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, AsyncIterator, Sequence
 
-async def convert_users_to_csv(users: list[User]) -> BufferedInputFile:
-    """Export all users in csv file."""
-    columns = User.__table__.columns
-    data = [[getattr(user, column.name) for column in columns] for user in users]
+    from aiogram import Bot
+    from sqlalchemy import Row
+    from sqlalchemy.ext.asyncio import AsyncSession
 
-    s = io.StringIO()
-    csv.writer(s).writerow(columns)
-    csv.writer(s).writerows(data)
-    s.seek(0)
+ExportFormat = Literal["csv", "jsonl"]
+EXPORT_FORMATS: tuple[ExportFormat, ...] = ("csv", "jsonl")
 
-    return BufferedInputFile(
-        file=s.getvalue().encode("utf-8"),
-        filename=f"users_{datetime.now(timezone.utc).strftime('%Y.%m.%d_%H.%M')}.csv",
-    )
+EXPORT_BATCH_SIZE = 1000  # rows fetched from the server-side cursor at a time
+SPOOL_MAX_SIZE = 8 * 1024 * 1024  # compressed bytes kept in memory before the export spills to disk
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def parse_export_format(value: str | None) -> ExportFormat:
+    """Export format named in the command arguments; csv when it is missing or unknown."""
+    requested = (value or "").strip().lower()
+    for export_format in EXPORT_FORMATS:
+        if requested == export_format:
+            return export_format
+    return "csv"
+
+
+class SpooledInputFile(InputFile):
+    """Uploads an already written (spooled) temporary file in chunks."""
+
+    def __init__(self, file: IO[bytes], filename: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> None:
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.file = file
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:  # noqa: ARG002
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
+
+
+async def stream_users(session: AsyncSession, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[Sequence[Row[Any]]]:
+    """All users in batches from a server-side cursor, so only one batch is held in memory."""
+    query = select(*User.__table__.columns).execution_options(yield_per=batch_size)
+    result = await session.stream(query)
+    async for partition in result.partitions():
+        yield partition
+
+
+def _jsonl(rows: Sequence[Row[Any]]) -> list[str]:
+    return [orjson.dumps(row._asdict(), option=orjson.OPT_APPEND_NEWLINE).decode() for row in rows]
+
+
+async def export_users(
+    session: AsyncSession,
+    spool: IO[bytes],
+    export_format: ExportFormat = "csv",
+) -> tuple[SpooledInputFile, int]:
+    """Write all users gzip-compressed into `spool` batch by batch. Returns the upload file and the row count."""
+    count = 0
+    with (
+        gzip.GzipFile(fileobj=spool, mode="wb") as compressed,
+        io.TextIOWrapper(compressed, encoding="utf-8", newline="") as out,
+    ):
+        writer = csv.writer(out)
+        if export_format == "csv":
+            writer.writerow(User.__table__.columns)
+
+        async for rows in stream_users(session):
+            if export_format == "jsonl":
+                out.writelines(_jsonl(rows))
+            else:
+                writer.writerows(rows)
+            count += len(rows)
+            out.flush()
+
+    filename = f"users_{datetime.now(timezone.utc).strftime('%Y.%m.%d_%H.%M')}.{export_format}.gz"
+    return SpooledInputFile(spool, filename=filename), count
+
+
+def spooled_export_file() -> IO[bytes]:
+    """Temporary file for an export: in memory while small, on disk once it grows past SPOOL_MAX_SIZE."""
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode="w+b")
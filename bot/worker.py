@@ -0,0 +1,46 @@
+"""Standalone background sync worker.
+
+Runs the same schedulers (regular sync and watch mode) as the bot process without polling Telegram updates:
+    python -m bot.worker
+
+Set SYNC_ENABLED=False for the bot itself when the worker is deployed, so users are not synced twice.
+"""
+
+from __future__ import annotations
+
+import prometheus_client
+import uvloop
+from loguru import logger
+
+from bot.cache.local import cache_invalidator
+from bot.core.config import settings
+from bot.services.http_client import close_http_session, setup_http_session
+from bot.services.scheduler import sync_scheduler
+from bot.services.watch import watch_scheduler
+
+
+async def main() -> None:
+    logger.add(
+        "logs/sync_worker.log",
+        level="DEBUG",
+        format="{time} | {level} | {module}:{function}:{line} | {message}",
+        rotation="100 KB",
+        compression="zip",
+    )
+
+    prometheus_client.start_http_server(settings.SYNC_METRICS_PORT)
+
+    await setup_http_session()
+    cache_invalidator.start()
+    watch_scheduler.start()
+    try:
+        await sync_scheduler.run_forever()
+    finally:
+        await watch_scheduler.stop()
+        await sync_scheduler.stop()
+        await close_http_session()
+        await cache_invalidator.stop()
+
+
+if __name__ == "__main__":
+    uvloop.run(main())
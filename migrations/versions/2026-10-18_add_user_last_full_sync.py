@@ -0,0 +1,26 @@
+"""Add users.last_full_sync for incremental syncs
+
+Revision ID: 2026_10_18_last_full_sync
+Revises: 2026_10_18_morning_digest
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2026_10_18_last_full_sync'
+down_revision: Union[str, None] = '2026_10_18_morning_digest'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('last_full_sync', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'last_full_sync')
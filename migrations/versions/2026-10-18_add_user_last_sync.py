@@ -0,0 +1,28 @@
+"""Add users.last_sync for the background sync scheduler
+
+Revision ID: 2026_10_18_last_sync
+Revises: 217e8389fd0e
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2026_10_18_last_sync'
+down_revision: Union[str, None] = '217e8389fd0e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('last_sync', sa.DateTime(), nullable=True))
+    op.create_index('idx_last_sync', 'users', ['last_sync'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_last_sync', table_name='users')
+    op.drop_column('users', 'last_sync')
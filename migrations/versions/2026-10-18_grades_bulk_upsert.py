@@ -0,0 +1,50 @@
+"""Grades: hour_number, natural unique key for bulk upsert, per-user primary key
+
+Revision ID: 2026_10_18_grades_upsert
+Revises: 2026_10_18_last_sync
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2026_10_18_grades_upsert'
+down_revision: Union[str, None] = '2026_10_18_last_sync'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('grades', sa.Column('hour_number', sa.SmallInteger(), server_default=sa.text('1'), nullable=False))
+    # Existing rows have no hour: number lessons of the same day in dateID order to keep the new key unique
+    op.execute(
+        """
+        UPDATE grades AS g SET hour_number = numbered.rn
+        FROM (
+            SELECT id, user_id, row_number() OVER (PARTITION BY user_id, journal_id, date ORDER BY id) AS rn
+            FROM grades
+        ) AS numbered
+        WHERE g.id = numbered.id AND g.user_id = numbered.user_id
+        """
+    )
+    op.alter_column('grades', 'hour_number', server_default=None)
+    op.create_unique_constraint(
+        'uq_user_journal_date_hour', 'grades', ['user_id', 'journal_id', 'date', 'hour_number']
+    )
+
+    # dateID is shared by every student of a group, so it identifies a grade only together with user_id
+    op.drop_constraint('grades_id_key', 'grades', type_='unique')
+    op.drop_constraint('grades_pkey', 'grades', type_='primary')
+    op.create_primary_key('grades_pkey', 'grades', ['id', 'user_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('grades_pkey', 'grades', type_='primary')
+    op.create_primary_key('grades_pkey', 'grades', ['id'])
+    op.create_unique_constraint('grades_id_key', 'grades', ['id'])
+    op.drop_constraint('uq_user_journal_date_hour', 'grades', type_='unique')
+    op.drop_column('grades', 'hour_number')
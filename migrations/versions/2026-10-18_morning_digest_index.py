@@ -0,0 +1,32 @@
+"""Morning digest cohort index
+
+Revision ID: 2026_10_18_morning_digest
+Revises: 2026_10_18_notifications
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2026_10_18_morning_digest'
+down_revision: Union[str, None] = '2026_10_18_notifications'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'idx_morning_notification_time',
+        'users',
+        ['morning_notification_time'],
+        unique=False,
+        postgresql_where=sa.text('morning_notification_enabled'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_morning_notification_time', table_name='users')
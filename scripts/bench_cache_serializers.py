@@ -0,0 +1,178 @@
+"""Micro-benchmark: cache serializers on realistic user and grade payloads.
+
+Usage:
+    python scripts/bench_cache_serializers.py [users] [grades]
+
+Compares PickleSerializer, JSONSerializer and RowSerializer (with every available codec)
+by encoded size, serialize and deserialize time. When SQLAlchemy is installed the pickle
+baseline pickles ORM User/Grade instances, as get_all_users did before RowSerializer.
+"""
+
+import sys
+
+sys.path.insert(0, ".")
+import base64
+import datetime
+import random
+import timeit
+from typing import Any, NamedTuple
+
+from bot.cache.serialization import (
+    AbstractSerializer,
+    JSONSerializer,
+    PickleSerializer,
+    RowSerializer,
+    available_codec,
+)
+
+NUMBER = 50
+
+
+class UserRow(NamedTuple):
+    """Same fields as bot.services.users.UserRow (importing it needs the bot settings)."""
+
+    id: int
+    language_code: str | None
+    edu_login_encrypted: str | None
+    edu_password_encrypted: str | None
+    edu_user_id: int | None
+    group_id: int | None
+    group_name: str | None
+    full_name: str | None
+    is_authenticated: bool
+    notification_enabled: bool
+    morning_notification_enabled: bool
+    morning_notification_time: datetime.time | None
+    watch_mode_expires_at: datetime.datetime | None
+    watch_mode_last_sync_at: datetime.datetime | None
+    last_sync: datetime.datetime | None
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+    is_admin: bool
+
+
+class GradeRow(NamedTuple):
+    id: int
+    user_id: int
+    journal_id: int
+    date: datetime.date
+    hour_number: int
+    value: str
+    number_value: int | None
+    is_mark: bool
+    is_pass: bool
+    is_valid_pass: bool
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+
+
+def fernet_token(rnd: random.Random) -> str:
+    """A string shaped like a Fernet token of a short secret (unique per user, like the real ones)."""
+    return base64.urlsafe_b64encode(b"\x80" + rnd.randbytes(87)).decode()
+
+
+def synthetic_users(count: int, rnd: random.Random) -> list[UserRow]:
+    now = datetime.datetime(2026, 10, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+    users = []
+    for index in range(count):
+        authenticated = rnd.random() < 0.8  # noqa: PLR2004
+        users.append(
+            UserRow(
+                id=100_000_000 + index * 37,
+                language_code=rnd.choice(["ru", "en", None]),
+                edu_login_encrypted=fernet_token(rnd) if authenticated else None,
+                edu_password_encrypted=fernet_token(rnd) if authenticated else None,
+                edu_user_id=rnd.randrange(10_000, 99_999) if authenticated else None,
+                group_id=rnd.randrange(1, 300) if authenticated else None,
+                group_name=f"ИС-{rnd.randrange(21, 26)}-{rnd.randrange(1, 4)}" if authenticated else None,
+                full_name="Иванов Иван Иванович" if authenticated else None,
+                is_authenticated=authenticated,
+                notification_enabled=True,
+                morning_notification_enabled=rnd.random() < 0.5,  # noqa: PLR2004
+                morning_notification_time=datetime.time(rnd.randrange(6, 10), 0),
+                watch_mode_expires_at=None,
+                watch_mode_last_sync_at=None,
+                last_sync=now - datetime.timedelta(minutes=rnd.randrange(0, 600)),
+                created_at=now - datetime.timedelta(days=rnd.randrange(0, 700)),
+                updated_at=now,
+                is_admin=index == 0,
+            )
+        )
+    return users
+
+
+def synthetic_grades(count: int, rnd: random.Random) -> list[GradeRow]:
+    now = datetime.datetime(2026, 10, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+    grades = []
+    for index in range(count):
+        value = rnd.choice(["5", "4", "3", "2", "н", "у"])
+        is_mark = value.isdigit()
+        grades.append(
+            GradeRow(
+                id=5_000_000 + index,
+                user_id=100_000_000,
+                journal_id=rnd.randrange(1000, 1040),
+                date=datetime.date(2026, 9, 1) + datetime.timedelta(days=index // 4),
+                hour_number=index % 4 + 1,
+                value=value,
+                number_value=int(value) if is_mark else None,
+                is_mark=is_mark,
+                is_pass=not is_mark,
+                is_valid_pass=value == "у",
+                created_at=now,
+                updated_at=now,
+            )
+        )
+    return grades
+
+
+def as_orm(name: str, rows: list[Any]) -> list[Any] | None:
+    """ORM instances with the same column values, or None without SQLAlchemy."""
+    try:
+        from bot.database.models import Grade, User  # noqa: PLC0415
+    except ImportError:
+        return None
+    model = {"users": User, "grades": Grade}[name]
+    return [model(**row._asdict()) for row in rows]
+
+
+def as_json(rows: list[Any]) -> list[dict[str, Any]]:
+    return [row._asdict() for row in rows]
+
+
+def measure(label: str, serializer: AbstractSerializer, value: Any) -> None:
+    raw = serializer.serialize(value)
+    dump = timeit.timeit(lambda: serializer.serialize(value), number=NUMBER) / NUMBER
+    load = timeit.timeit(lambda: serializer.deserialize(raw), number=NUMBER) / NUMBER
+    sys.stdout.write(f"  {label:<22} {len(raw):>10,} B   dump {dump * 1e3:8.2f} ms   load {load * 1e3:8.2f} ms\n")
+
+
+def bench(name: str, rows: list[Any]) -> None:
+    row_type = type(rows[0])
+    sys.stdout.write(f"{name}: {len(rows)} rows\n")
+
+    orm = as_orm(name, rows)
+    if orm is not None:
+        measure("pickle (ORM objects)", PickleSerializer(), orm)
+    measure("pickle (tuples)", PickleSerializer(), rows)
+    measure("json (dicts)", JSONSerializer(), as_json(rows))
+
+    for codec in ("none", "zlib", "zstd", "lz4"):
+        if available_codec(codec) != codec:
+            sys.stdout.write(f"  rows+{codec:<17} not installed\n")
+            continue
+        serializer = RowSerializer(row_type, codec=codec)
+        assert serializer.deserialize(serializer.serialize(rows)) == rows  # noqa: S101
+        measure(f"rows+{codec}", serializer, rows)
+
+
+def main() -> None:
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    grades = int(sys.argv[2]) if len(sys.argv) > 2 else 2000  # noqa: PLR2004
+    rnd = random.Random(0)  # noqa: S311
+    bench("users", synthetic_users(users, rnd))
+    bench("grades", synthetic_grades(grades, rnd))
+
+
+if __name__ == "__main__":
+    main()
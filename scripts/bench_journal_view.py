@@ -0,0 +1,148 @@
+"""Micro-benchmark: legacy journal parsing vs CompiledJournal.
+
+Usage:
+    python scripts/bench_journal_view.py [journal.json ...]
+
+Without arguments a synthetic journal is generated (30 students x 120 lessons).
+Pass saved /api/Journals/Journal responses to benchmark on recorded payloads.
+"""
+
+import sys
+
+sys.path.insert(0, ".")
+import random
+import timeit
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+from bot.services.journal_view import CompiledJournal
+
+DAYS = 730
+NUMBER = 200
+
+
+def synthetic_journal(students: int = 30, lessons: int = 120, seed: int = 0) -> dict[str, Any]:
+    rnd = random.Random(seed)  # noqa: S311
+    values = [
+        {"id": 1, "value": "5", "isMark": True, "isPass": False},
+        {"id": 2, "value": "4", "isMark": True, "isPass": False},
+        {"id": 3, "value": "3", "isMark": True, "isPass": False},
+        {"id": 4, "value": "н", "isMark": False, "isPass": True},
+    ]
+    # Две пары в день, в хронологическом порядке, как в ответах API
+    start = datetime.now(timezone.utc).date() - timedelta(days=lessons // 2)
+    dates = [
+        {"dateID": 1000 + i, "date": f"{start + timedelta(days=i // 2)}T000000", "hourNumber": i % 2 + 1}
+        for i in range(lessons)
+    ]
+    rows = []
+    for s in range(students):
+        row: dict[str, Any] = {"id": 500 + s, "fio": f"Student {s}", "fullName": f"Student {s} Full"}
+        for jd in dates:
+            if rnd.random() < 0.4:  # noqa: PLR2004
+                row[str(jd["dateID"])] = rnd.choice(values)["id"]
+        rows.append(row)
+    return {"data": {"journalVal": values, "journalData": rows, "journalDates": dates}}
+
+
+def legacy_lessons(journal_json: dict[str, Any], student_id: int | None = None) -> list[dict[str, Any]]:
+    """Реализация до CompiledJournal - эталон для сравнения результатов."""
+    data = journal_json["data"]
+    val_by_id = {int(v["id"]): v for v in data["journalVal"]}
+
+    student_row = data["journalData"][0]
+    if student_id is not None:
+        student_row = next(row for row in data["journalData"] if str(row.get("id")) == str(student_id))
+
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=DAYS)
+    lessons = []
+    for jd in data["journalDates"]:
+        d = datetime.fromisoformat(jd["date"].replace("T000000", "T00:00:00")).date()
+        if d < cutoff:
+            continue
+        raw_cell = student_row.get(str(jd["dateID"]))
+        if raw_cell is None:
+            continue
+        try:
+            value_id = int(raw_cell)
+        except (TypeError, ValueError):
+            continue
+        val_obj = val_by_id.get(value_id)
+        if val_obj is None:
+            continue
+        is_mark = bool(val_obj.get("isMark"))
+        is_pass = bool(val_obj.get("isPass"))
+        lessons.append(
+            {
+                "lesson_date": d,
+                "hour_number": int(jd["hourNumber"]),
+                "date_id": int(jd["dateID"]),
+                "display_value": val_obj.get("value") or "",
+                "kind": "оценка" if is_mark else "посещаемость" if is_pass else "",
+                "is_mark": is_mark,
+                "is_pass": is_pass,
+            }
+        )
+    lessons.sort(key=lambda x: (x["lesson_date"], x["hour_number"]))
+    return lessons
+
+
+def compiled_lessons(journal: CompiledJournal, cutoff: date, student_id: int | None = None) -> list[dict[str, Any]]:
+    return journal.lessons(journal.find_row(student_id=student_id), since=cutoff)
+
+
+def bench(name: str, journal_json: dict[str, Any]) -> None:
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=DAYS)
+    student_ids = [row.get("id") for row in journal_json["data"]["journalData"]]
+
+    compiled = CompiledJournal.from_json(journal_json)
+    for student_id in student_ids:
+        assert legacy_lessons(journal_json, student_id) == compiled_lessons(compiled, cutoff, student_id)  # noqa: S101
+
+    # Один студент на журнал (текущая синхронизация)
+    legacy_one = timeit.timeit(lambda: legacy_lessons(journal_json), number=NUMBER)
+    compiled_one = timeit.timeit(
+        lambda: compiled_lessons(CompiledJournal.from_json(journal_json), cutoff),
+        number=NUMBER,
+    )
+
+    # Все студенты журнала: журнал собирается один раз
+    def legacy_all() -> None:
+        for student_id in student_ids:
+            legacy_lessons(journal_json, student_id)
+
+    def compiled_all() -> None:
+        journal = CompiledJournal.from_json(journal_json)
+        for student_id in student_ids:
+            compiled_lessons(journal, cutoff, student_id)
+
+    legacy_group = timeit.timeit(legacy_all, number=NUMBER // 10)
+    compiled_group = timeit.timeit(compiled_all, number=NUMBER // 10)
+
+    sys.stdout.write(f"{name}: {len(student_ids)} students, {len(journal_json['data']['journalDates'])} lessons\n")
+    sys.stdout.write(
+        f"  one student   legacy {legacy_one / NUMBER * 1e6:9.1f} us   "
+        f"compiled {compiled_one / NUMBER * 1e6:9.1f} us   "
+        f"x{legacy_one / compiled_one:.1f}\n"
+    )
+    sys.stdout.write(
+        f"  all students  legacy {legacy_group / (NUMBER // 10) * 1e3:9.2f} ms   "
+        f"compiled {compiled_group / (NUMBER // 10) * 1e3:9.2f} ms   "
+        f"x{legacy_group / compiled_group:.1f}\n"
+    )
+
+
+def main() -> None:
+    paths = sys.argv[1:]
+    if not paths:
+        bench("synthetic", synthetic_journal())
+        return
+    for path in paths:
+        bench(path, orjson.loads(Path(path).read_bytes()))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ sys.path.insert(0, ".")
 import asyncio
 from contextlib import suppress
 
+from bot.services.http_client import close_http_session
 from bot.services.journal_parser import InvalidCredsError, JournalParser, ParseError
 
 
@@ -11,6 +12,7 @@ async def main() -> None:
     parser = JournalParser()
     with suppress(InvalidCredsError, ParseError, Exception):
         await parser.parse_grades("dummy", "dummy")
+    await close_http_session()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,4 @@
+import os
+
+# Settings are read on import; the only required one is enough for the modules under test
+os.environ.setdefault("BOT_TOKEN", "42:test")
@@ -0,0 +1,86 @@
+from __future__ import annotations
+from datetime import date
+
+from bot.services.grades import StoredGrade, diff_grades
+
+USER_ID = 1
+JOURNAL_ID = 10
+
+
+def parsed(*grades: tuple[int, str, int, str], since: str = "2026-09-01") -> list[dict]:
+    return [
+        {
+            "journal": {"code": str(JOURNAL_ID), "name": "Математика", "teacher": ""},
+            "grades": [
+                {"lesson_id": lesson_id, "date": day, "hour": hour, "value": value, "is_mark": True, "is_pass": False}
+                for lesson_id, day, hour, value in grades
+            ],
+            "hash": "",
+            "unchanged": False,
+            "since": since,
+        }
+    ]
+
+
+def stored(day: str, hour: int, value: str) -> StoredGrade:
+    return (JOURNAL_ID, date.fromisoformat(day), hour, value, True, False)
+
+
+def test_unchanged_grade_is_not_written() -> None:
+    diff = diff_grades(USER_ID, parsed((1, "2026-10-01", 1, "5")), {1: stored("2026-10-01", 1, "5")})
+
+    assert diff.rows == []
+    assert diff.stale == []
+    assert (diff.new_count, diff.updated_count) == (0, 0)
+
+
+def test_lesson_moved_to_another_date_and_hour_is_reinserted() -> None:
+    diff = diff_grades(USER_ID, parsed((1, "2026-10-02", 3, "5")), {1: stored("2026-10-01", 1, "5")})
+
+    assert diff.stale == [1]
+    assert [(row["id"], row["date"], row["hour_number"]) for row in diff.rows] == [(1, date(2026, 10, 2), 3)]
+    assert (diff.new_count, diff.updated_count) == (0, 1)
+    # Значение не изменилось - уведомлять не о чем
+    assert diff.notify == []
+
+
+def test_slot_given_to_another_lesson_frees_it_first() -> None:
+    # Занятия 1 и 2 поменялись местами
+    existing = {1: stored("2026-10-01", 1, "5"), 2: stored("2026-10-01", 2, "4")}
+    diff = diff_grades(USER_ID, parsed((1, "2026-10-01", 2, "5"), (2, "2026-10-01", 1, "4")), existing)
+
+    assert sorted(diff.stale) == [1, 2]
+    assert sorted(row["id"] for row in diff.rows) == [1, 2]
+
+
+def test_lesson_deleted_upstream_is_deleted_only_inside_parsed_range() -> None:
+    existing = {
+        1: stored("2026-10-01", 1, "5"),
+        2: stored("2026-10-05", 1, "4"),
+        3: stored("2026-08-20", 1, "3"),  # раньше since: парсер эту дату не разбирал
+    }
+    diff = diff_grades(USER_ID, parsed((1, "2026-10-01", 1, "5")), existing)
+
+    assert diff.stale == [2]
+    assert diff.updated_count == 1
+
+
+def test_new_and_changed_grades_are_notified() -> None:
+    diff = diff_grades(
+        USER_ID,
+        parsed((1, "2026-10-01", 1, "4"), (2, "2026-10-02", 1, "5")),
+        {1: stored("2026-10-01", 1, "5")},
+    )
+
+    assert sorted(row["id"] for row in diff.notify) == [1, 2]
+    assert (diff.new_count, diff.updated_count) == (1, 1)
+
+
+def test_all_grades_in_window_removed_deletes_them() -> None:
+    # Парсер возвращает журнал и без оценок в окне: по его since удаляются пропавшие занятия
+    existing = {1: stored("2026-10-01", 1, "5"), 2: stored("2026-08-20", 1, "3")}
+    diff = diff_grades(USER_ID, parsed(since="2026-09-15"), existing)
+
+    assert diff.rows == []
+    assert diff.stale == [1]
+    assert (diff.new_count, diff.updated_count) == (0, 1)
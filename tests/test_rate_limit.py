@@ -0,0 +1,109 @@
+from __future__ import annotations
+import asyncio
+from typing import Any
+
+import pytest
+
+from bot.utils import rate_limit
+from bot.utils.rate_limit import GCRALimiter, RateLimit
+
+LIMIT = RateLimit(interval=0.5, burst=2)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class ScriptedRedis:
+    """Answers the GCRA script with prepared {taken, retry after (ms)} replies."""
+
+    def __init__(self, *replies: tuple[int, int]) -> None:
+        self.replies = list(replies)
+        self.calls: list[dict[str, Any]] = []
+
+    def register_script(self, _script: str) -> ScriptedRedis:
+        return self
+
+    async def __call__(self, keys: list[str], args: list[Any]) -> list[int]:
+        self.calls.append({"keys": keys, "args": args})
+        taken, retry_after_ms = self.replies.pop(0)
+        return [taken, retry_after_ms]
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+def limiter(redis: ScriptedRedis, lease: int = 0) -> GCRALimiter:
+    return GCRALimiter(redis, lease=lease)  # type: ignore[arg-type]
+
+
+def test_script_gets_interval_burst_and_lease() -> None:
+    redis = ScriptedRedis((1, 0))
+
+    assert asyncio.run(limiter(redis, lease=3).acquire("chat:1", LIMIT)) == (True, "redis")
+    assert redis.calls == [{"keys": ["chat:1"], "args": [500, 2, 3]}]
+
+
+@pytest.mark.usefixtures("clock")
+def test_unknown_key_asks_redis() -> None:
+    assert limiter(ScriptedRedis()).check_local("chat:1") is None
+
+
+def test_rejected_key_stays_rejected_locally_until_retry_after(clock: Clock) -> None:
+    redis = ScriptedRedis((0, 300), (1, 0))
+    gcra = limiter(redis)
+
+    assert asyncio.run(gcra.acquire("chat:1", LIMIT)) == (False, "redis")
+    assert asyncio.run(gcra.acquire("chat:1", LIMIT)) == (False, "local")
+    clock.now += 0.299
+    assert gcra.check_local("chat:1") is False
+
+    clock.now += 0.001
+    assert asyncio.run(gcra.acquire("chat:1", LIMIT)) == (True, "redis")
+    assert len(redis.calls) == 2  # noqa: PLR2004
+
+
+@pytest.mark.usefixtures("clock")
+def test_leased_tokens_are_spent_locally_within_one_interval() -> None:
+    redis = ScriptedRedis((3, 0), (1, 0))
+    gcra = limiter(redis, lease=2)
+
+    assert asyncio.run(gcra.acquire("chat:1", LIMIT)) == (True, "redis")
+    assert gcra.check_local("chat:1") is True
+    assert gcra.check_local("chat:1") is True
+    # Lease spent: the next request is Redis' decision again
+    assert gcra.check_local("chat:1") is None
+    assert asyncio.run(gcra.acquire("chat:1", LIMIT)) == (True, "redis")
+
+
+def test_lease_expires_after_one_interval(clock: Clock) -> None:
+    gcra = limiter(ScriptedRedis((3, 0)), lease=2)
+
+    asyncio.run(gcra.acquire("chat:1", LIMIT))
+    clock.now += LIMIT.interval
+    assert gcra.check_local("chat:1") is None
+
+
+def test_wait_sleeps_past_retry_after_with_jitter(clock: Clock, monkeypatch: pytest.MonkeyPatch) -> None:
+    slept: list[float] = []
+
+    async def sleep(delay: float) -> None:
+        slept.append(delay)
+        clock.now += delay
+
+    monkeypatch.setattr(rate_limit.asyncio, "sleep", sleep)
+    monkeypatch.setattr(rate_limit.random, "uniform", lambda low, high: (low + high) / 2)
+    redis = ScriptedRedis((0, 200), (1, 0))
+
+    asyncio.run(limiter(redis).wait("notify:global", LIMIT))
+
+    assert slept == [pytest.approx(0.2 + LIMIT.interval / 2)]
+    assert len(redis.calls) == 2  # noqa: PLR2004
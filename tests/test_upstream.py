@@ -0,0 +1,191 @@
+from __future__ import annotations
+import asyncio
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any
+
+import pytest
+
+from bot.services import upstream
+from bot.services.upstream import (
+    BREAKER_CLOSED,
+    BREAKER_HALF_OPEN,
+    BREAKER_OPEN,
+    AdaptiveLimit,
+    BreakerPermit,
+    CircuitBreaker,
+    RetryBudget,
+    UpstreamClient,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+RESET_TIMEOUT = 30
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(upstream, "time", clock)
+    return clock
+
+
+def allowed(breaker: CircuitBreaker) -> BreakerPermit:
+    permit = breaker.allow()
+    assert permit is not None
+    return permit
+
+
+def tripped(clock: Clock, threshold: int = 2) -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=threshold, reset_timeout=RESET_TIMEOUT)
+    for _ in range(threshold):
+        breaker.record(allowed(breaker), ok=False)
+    clock.now += RESET_TIMEOUT
+    return breaker
+
+
+@pytest.mark.usefixtures("clock")
+def test_breaker_opens_after_threshold() -> None:
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=RESET_TIMEOUT)
+    for _ in range(2):
+        breaker.record(allowed(breaker), ok=False)
+    assert breaker.state == BREAKER_CLOSED
+
+    breaker.record(allowed(breaker), ok=False)
+    assert breaker.state == BREAKER_OPEN
+    assert breaker.allow() is None
+
+
+@pytest.mark.usefixtures("clock")
+def test_success_resets_consecutive_failures() -> None:
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=RESET_TIMEOUT)
+    breaker.record(allowed(breaker), ok=False)
+    breaker.record(allowed(breaker), ok=True)
+    breaker.record(allowed(breaker), ok=False)
+
+    assert breaker.state == BREAKER_CLOSED
+
+
+def test_only_half_open_probe_closes_breaker(clock: Clock) -> None:
+    breaker = tripped(clock)
+
+    probe = allowed(breaker)
+    assert probe.probe
+    assert breaker.state == BREAKER_HALF_OPEN
+    # The probe is taken: everyone else is still rejected
+    assert breaker.allow() is None
+
+    breaker.record(probe, ok=True)
+    assert breaker.state == BREAKER_CLOSED
+
+
+def test_failed_probe_reopens_breaker(clock: Clock) -> None:
+    breaker = tripped(clock)
+
+    breaker.record(allowed(breaker), ok=False)
+    assert breaker.state == BREAKER_OPEN
+    assert breaker.allow() is None
+
+
+def test_cancelled_probe_frees_the_probe_slot(clock: Clock) -> None:
+    breaker = tripped(clock)
+
+    breaker.record(allowed(breaker), ok=None)
+    assert breaker.state == BREAKER_HALF_OPEN
+    assert allowed(breaker).probe
+
+
+def test_stale_generation_outcomes_are_ignored(clock: Clock) -> None:
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=RESET_TIMEOUT)
+    # Still in flight while the circuit opens
+    stale = [allowed(breaker) for _ in range(4)]
+    breaker.record(stale[0], ok=False)
+    breaker.record(stale[1], ok=False)
+    assert breaker.state == BREAKER_OPEN
+
+    # A late success from before the trip must not close the open or half-open circuit
+    breaker.record(stale[2], ok=True)
+    assert breaker.state == BREAKER_OPEN
+    clock.now += RESET_TIMEOUT
+    probe = allowed(breaker)
+    breaker.record(stale[2], ok=True)
+    assert breaker.state == BREAKER_HALF_OPEN
+
+    breaker.record(probe, ok=True)
+    # A late failure from before the trip does not count towards the new circuit
+    breaker.record(stale[3], ok=False)
+    breaker.record(allowed(breaker), ok=False)
+    assert breaker.state == BREAKER_CLOSED
+
+
+@pytest.mark.usefixtures("clock")
+def test_adaptive_limit_grows_on_fast_success_and_shrinks_on_failure() -> None:
+    limit = AdaptiveLimit("test", initial=4, minimum=1, maximum=8, latency_target=1.0, decrease=0.5)
+
+    asyncio.run(limit.acquire())
+    limit.release(0.1, ok=True)
+    assert limit.limit == pytest.approx(4.25)
+
+    asyncio.run(limit.acquire())
+    limit.release(0.1, ok=False)
+    assert limit.limit == pytest.approx(2.125)
+    # Decreased at most once per latency_target
+    asyncio.run(limit.acquire())
+    limit.release(5.0, ok=True)
+    assert limit.limit == pytest.approx(2.125)
+    assert limit.in_flight == 0
+
+
+@pytest.mark.usefixtures("clock")
+def test_retry_budget_is_spent_and_refilled_by_requests() -> None:
+    budget = RetryBudget(ratio=0.5, min_per_second=0, capacity=1)
+
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+class FailingResponse:
+    status = 503
+    headers: dict[str, str] = {}  # noqa: RUF012
+    request_info = None
+
+    async def read(self) -> bytes:
+        return b""
+
+
+class FailingSession:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    @asynccontextmanager
+    async def request(self, *_args: Any, **_kwargs: Any) -> AsyncIterator[FailingResponse]:
+        self.calls += 1
+        yield FailingResponse()
+
+
+def test_exhausted_budget_stops_retries(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = FailingSession()
+    monkeypatch.setattr(upstream, "get_http_session", lambda: session)
+    client = UpstreamClient(
+        max_retries=5,
+        retry_base=0.001,
+        retry_max=0.001,
+        budget=RetryBudget(ratio=0, min_per_second=0, capacity=1),
+    )
+
+    response = asyncio.run(client.request("test", "GET", "https://edu.example"))
+
+    assert response.status == 503  # noqa: PLR2004
+    # One retry from the budget, then the request gives up despite max_retries
+    assert session.calls == 2  # noqa: PLR2004